@@ -0,0 +1,30 @@
+"""Add barcode product cache
+
+Revision ID: 004
+Revises: 003
+Create Date: 2026-10-18
+
+"""
+from alembic import op
+import sqlalchemy as sa
+from sqlalchemy.dialects import postgresql
+
+# revision identifiers, used by Alembic.
+revision = '004'
+down_revision = '003'
+branch_labels = None
+depends_on = None
+
+
+def upgrade() -> None:
+    # Shared tier of the barcode product cache, used when Redis is not configured
+    op.create_table(
+        'barcodecacheentry',
+        sa.Column('barcode', sa.String(), primary_key=True),
+        sa.Column('item', postgresql.JSONB(), nullable=True),
+        sa.Column('expires_at', sa.DateTime(), nullable=False, index=True),
+    )
+
+
+def downgrade() -> None:
+    op.drop_table('barcodecacheentry')
@@ -0,0 +1,125 @@
+"""Add expiration alerts and their scheduler shards
+
+Revision ID: 010
+Revises: 009
+Create Date: 2026-10-18
+
+"""
+from alembic import op
+import sqlalchemy as sa
+from sqlalchemy.dialects import postgresql
+
+# revision identifiers, used by Alembic.
+revision = '010'
+down_revision = '009'
+branch_labels = None
+depends_on = None
+
+# Must match SHARD_LOCK in app.models.expiration_alert
+SHARD_LOCK = 10010
+
+# Keeps alert rows current between scheduler runs. The shard lock is held
+# shared until the write commits, so the scheduler's exclusive lock waits
+# for writes that read the old covered_until, and its scan then sees them.
+FUNCTION = f"""
+CREATE FUNCTION expirationalert_track() RETURNS trigger LANGUAGE plpgsql AS $$
+DECLARE
+    shard_id integer;
+    covered date;
+BEGIN
+    SELECT id INTO shard_id FROM expirationalertshard WHERE NEW.owner_id BETWEEN lo AND hi;
+    IF shard_id IS NULL THEN
+        RETURN NULL;
+    END IF;
+    PERFORM pg_advisory_xact_lock_shared({SHARD_LOCK}, shard_id);
+    SELECT covered_until INTO covered FROM expirationalertshard WHERE id = shard_id;
+    IF NEW.expiration_date <= covered THEN
+        INSERT INTO expirationalert (food_item_id, owner_id, expiration_date)
+        VALUES (NEW.id, NEW.owner_id, NEW.expiration_date)
+        ON CONFLICT (food_item_id) DO UPDATE
+        SET owner_id = EXCLUDED.owner_id, expiration_date = EXCLUDED.expiration_date, notified_at = NULL;
+    ELSIF TG_OP = 'UPDATE' THEN
+        DELETE FROM expirationalert WHERE food_item_id = NEW.id;
+    END IF;
+    RETURN NULL;
+END
+$$
+"""
+
+TRIGGERS = [
+    ('expirationalert_insert', 'INSERT', 'NEW.expiration_date IS NOT NULL AND NEW.owner_id IS NOT NULL'),
+    (
+        'expirationalert_update',
+        'UPDATE OF expiration_date, owner_id',
+        'NEW.owner_id IS NOT NULL AND (OLD.expiration_date, OLD.owner_id) '
+        'IS DISTINCT FROM (NEW.expiration_date, NEW.owner_id)',
+    ),
+]
+
+
+def upgrade() -> None:
+    op.create_table(
+        'expirationalert',
+        sa.Column(
+            'food_item_id',
+            postgresql.UUID(as_uuid=True),
+            sa.ForeignKey('fooditem.id', ondelete='CASCADE'),
+            primary_key=True,
+        ),
+        sa.Column('owner_id', postgresql.UUID(as_uuid=True), nullable=False),
+        sa.Column('expiration_date', sa.Date(), nullable=False),
+        sa.Column('notified_at', sa.DateTime(), nullable=True),
+    )
+    op.create_index(
+        'ix_expirationalert_owner_id_expiration_date',
+        'expirationalert',
+        ['owner_id', 'expiration_date', 'food_item_id'],
+    )
+    op.create_index(
+        'ix_expirationalert_pending',
+        'expirationalert',
+        ['owner_id', 'expiration_date'],
+        postgresql_where=sa.text('notified_at IS NULL'),
+    )
+    # Rows are created by the scheduler (EXPIRATION_ALERT_SHARDS)
+    op.create_table(
+        'expirationalertshard',
+        sa.Column('id', sa.Integer(), primary_key=True),
+        sa.Column('lo', postgresql.UUID(as_uuid=True), nullable=False),
+        sa.Column('hi', postgresql.UUID(as_uuid=True), nullable=False),
+        sa.Column('covered_until', sa.Date(), nullable=True),
+        sa.Column('scanned_until', sa.Date(), nullable=True),
+        sa.Column('last_run_at', sa.DateTime(), nullable=True),
+        sa.Column('claimed_by', sa.String(), nullable=True),
+        sa.Column('claimed_until', sa.DateTime(), nullable=True),
+    )
+    op.execute(FUNCTION)
+    for name, event, condition in TRIGGERS:
+        op.execute(
+            f"CREATE TRIGGER {name} AFTER {event} ON fooditem FOR EACH ROW "
+            f"WHEN ({condition}) EXECUTE FUNCTION expirationalert_track()"
+        )
+    with op.get_context().autocommit_block():
+        op.create_index(
+            'ix_fooditem_expiration_date_id',
+            'fooditem',
+            ['expiration_date', 'id'],
+            postgresql_where=sa.text('expiration_date IS NOT NULL'),
+            postgresql_concurrently=True,
+            if_not_exists=True,
+        )
+
+
+def downgrade() -> None:
+    with op.get_context().autocommit_block():
+        op.drop_index(
+            'ix_fooditem_expiration_date_id',
+            table_name='fooditem',
+            postgresql_concurrently=True,
+            if_exists=True,
+        )
+    for name, _, _ in TRIGGERS:
+        op.execute(f"DROP TRIGGER IF EXISTS {name} ON fooditem")
+    op.execute("DROP FUNCTION IF EXISTS expirationalert_track()")
+    op.drop_table('expirationalertshard')
+    op.drop_table('expirationalert')
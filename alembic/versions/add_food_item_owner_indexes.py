@@ -0,0 +1,49 @@
+"""Add owner-scoped food item indexes
+
+Revision ID: 006
+Revises: 005
+Create Date: 2026-10-18
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+# revision identifiers, used by Alembic.
+revision = '006'
+down_revision = '005'
+branch_labels = None
+depends_on = None
+
+INDEXES = [
+    ('ix_fooditem_owner_id_added_at', ['owner_id', 'added_at', 'id'], None),
+    ('ix_fooditem_owner_id_category', ['owner_id', 'category', 'added_at', 'id'], None),
+    ('ix_fooditem_owner_id_barcode', ['owner_id', 'barcode'], None),
+    # Only rows with an expiration date can ever be "expiring soon"
+    ('ix_fooditem_owner_id_expiration_date', ['owner_id', 'expiration_date', 'id'],
+     sa.text('expiration_date IS NOT NULL')),
+]
+
+
+def upgrade() -> None:
+    # Build without locking writes on a large fooditem table
+    with op.get_context().autocommit_block():
+        for name, columns, where in INDEXES:
+            op.create_index(
+                name,
+                'fooditem',
+                columns,
+                postgresql_where=where,
+                postgresql_concurrently=True,
+                if_not_exists=True,
+            )
+
+
+def downgrade() -> None:
+    with op.get_context().autocommit_block():
+        for name, _, _ in INDEXES:
+            op.drop_index(
+                name,
+                table_name='fooditem',
+                postgresql_concurrently=True,
+                if_exists=True,
+            )
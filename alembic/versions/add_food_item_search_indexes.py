@@ -0,0 +1,43 @@
+"""Add food item search indexes
+
+Revision ID: 008
+Revises: 007
+Create Date: 2026-10-18
+
+"""
+from alembic import op
+
+# revision identifiers, used by Alembic.
+revision = '008'
+down_revision = '007'
+branch_labels = None
+depends_on = None
+
+# Must match SEARCH_DOCUMENT / SEARCH_VECTOR in app.models.food_item, or the
+# planner cannot use the indexes
+DOCUMENT = "(name || ' ' || coalesce(category, ''))"
+VECTOR = f"to_tsvector('english'::regconfig, {DOCUMENT})"
+
+# btree_gin lets owner_id lead the GIN indexes, so a search only visits the
+# owner's entries
+INDEXES = [
+    ('ix_fooditem_owner_id_search_trgm', f"owner_id, {DOCUMENT} gin_trgm_ops"),
+    ('ix_fooditem_owner_id_search_tsv', f"owner_id, ({VECTOR})"),
+]
+
+
+def upgrade() -> None:
+    op.execute("CREATE EXTENSION IF NOT EXISTS pg_trgm")
+    op.execute("CREATE EXTENSION IF NOT EXISTS btree_gin")
+    # Build without locking writes on a large fooditem table
+    with op.get_context().autocommit_block():
+        for name, expression in INDEXES:
+            op.execute(
+                f"CREATE INDEX CONCURRENTLY IF NOT EXISTS {name} ON fooditem USING gin ({expression})"
+            )
+
+
+def downgrade() -> None:
+    with op.get_context().autocommit_block():
+        for name, _ in INDEXES:
+            op.execute(f"DROP INDEX CONCURRENTLY IF EXISTS {name}")
@@ -0,0 +1,102 @@
+"""Add trigger-maintained per-owner food item stats
+
+Revision ID: 007
+Revises: 006
+Create Date: 2026-10-18
+
+"""
+from alembic import op
+import sqlalchemy as sa
+from sqlalchemy.dialects import postgresql
+
+# revision identifiers, used by Alembic.
+revision = '007'
+down_revision = '006'
+branch_labels = None
+depends_on = None
+
+
+def apply(*sources: str) -> str:
+    """
+    Statement adding the net change in count and quantity of each
+    (owner, category, expiration date) group, given transition tables as
+    '+new_rows' / '-old_rows'. Groups are upserted in key order so that
+    concurrent statements lock them in the same order, and groups whose net
+    change is zero (e.g. a rename) are not touched.
+    """
+    rows = " UNION ALL ".join(
+        f"SELECT owner_id, category, expiration_date, {sign}1 AS n, {sign}COALESCE(quantity, 0) AS q "
+        f"FROM {table}"
+        for sign, table in ((source[0], source[1:]) for source in sources)
+    )
+    return f"""
+    INSERT INTO fooditemstats AS s (owner_id, category, expiration_date, item_count, total_quantity)
+    SELECT owner_id, COALESCE(category, ''), COALESCE(expiration_date, 'infinity'), sum(n), sum(q)
+    FROM ({rows}) AS delta
+    WHERE owner_id IS NOT NULL
+    GROUP BY 1, 2, 3
+    HAVING sum(n) <> 0 OR sum(q) <> 0
+    ORDER BY 1, 2, 3
+    ON CONFLICT (owner_id, category, expiration_date) DO UPDATE
+    SET item_count = s.item_count + EXCLUDED.item_count,
+        total_quantity = s.total_quantity + EXCLUDED.total_quantity;
+    """
+
+
+FUNCTION = f"""
+CREATE FUNCTION fooditemstats_apply() RETURNS trigger LANGUAGE plpgsql AS $$
+BEGIN
+    IF TG_OP = 'INSERT' THEN
+        {apply('+new_rows')}
+    ELSIF TG_OP = 'UPDATE' THEN
+        {apply('-old_rows', '+new_rows')}
+    ELSE
+        {apply('-old_rows')}
+    END IF;
+    IF TG_OP IN ('UPDATE', 'DELETE') THEN
+        DELETE FROM fooditemstats s
+        USING old_rows o
+        WHERE s.owner_id = o.owner_id
+          AND s.category = COALESCE(o.category, '')
+          AND s.expiration_date = COALESCE(o.expiration_date, 'infinity')
+          AND s.item_count = 0;
+    END IF;
+    RETURN NULL;
+END
+$$
+"""
+
+# Statement-level, so a bulk write touches each group once rather than
+# once per row
+TRIGGERS = [
+    ('fooditemstats_insert', 'INSERT', 'REFERENCING NEW TABLE AS new_rows'),
+    ('fooditemstats_update', 'UPDATE', 'REFERENCING OLD TABLE AS old_rows NEW TABLE AS new_rows'),
+    ('fooditemstats_delete', 'DELETE', 'REFERENCING OLD TABLE AS old_rows'),
+]
+
+
+def upgrade() -> None:
+    op.create_table(
+        'fooditemstats',
+        sa.Column('owner_id', postgresql.UUID(as_uuid=True), sa.ForeignKey('user.id'), primary_key=True),
+        sa.Column('category', sa.String(), primary_key=True),
+        sa.Column('expiration_date', sa.Date(), primary_key=True),
+        sa.Column('item_count', sa.Integer(), nullable=False),
+        sa.Column('total_quantity', sa.BigInteger(), nullable=False),
+    )
+    op.execute(FUNCTION)
+    # Creating the triggers blocks writes to fooditem until this migration
+    # commits, so the backfill below cannot miss or double count a row
+    for name, event, referencing in TRIGGERS:
+        op.execute(
+            f"CREATE TRIGGER {name} AFTER {event} ON fooditem {referencing} "
+            "FOR EACH STATEMENT EXECUTE FUNCTION fooditemstats_apply()"
+        )
+    op.execute(apply('+fooditem'))
+
+
+def downgrade() -> None:
+    for name, _, _ in TRIGGERS:
+        op.execute(f"DROP TRIGGER IF EXISTS {name} ON fooditem")
+    op.execute("DROP FUNCTION IF EXISTS fooditemstats_apply()")
+    op.drop_table('fooditemstats')
@@ -0,0 +1,113 @@
+"""Add food item versions, updated_at and tombstones for delta sync
+
+Revision ID: 009
+Revises: 008
+Create Date: 2026-10-18
+
+"""
+from alembic import op
+import sqlalchemy as sa
+from sqlalchemy.dialects import postgresql
+
+# revision identifiers, used by Alembic.
+revision = '009'
+down_revision = '008'
+branch_labels = None
+depends_on = None
+
+# Every write to an owner's items takes the next value of the owner's
+# counter. The counter row stays locked until the writing transaction ends,
+# so an owner's versions become visible in commit order and a client that
+# has seen everything up to version N only ever needs the changes above N.
+BUMP = """
+    INSERT INTO fooditemversion AS v (owner_id, version) VALUES ({owner}, 1)
+    ON CONFLICT (owner_id) DO UPDATE SET version = v.version + 1
+    RETURNING v.version
+"""
+
+FUNCTIONS = [
+    f"""
+CREATE FUNCTION fooditem_bump_version() RETURNS trigger LANGUAGE plpgsql AS $$
+BEGIN
+    IF NEW.owner_id IS NOT NULL THEN
+        {BUMP.format(owner='NEW.owner_id')} INTO NEW.change_id;
+    END IF;
+    IF TG_OP = 'UPDATE' THEN
+        NEW.updated_at := now();
+    END IF;
+    RETURN NEW;
+END
+$$
+""",
+    f"""
+CREATE FUNCTION fooditem_add_tombstone() RETURNS trigger LANGUAGE plpgsql AS $$
+DECLARE
+    new_version bigint;
+BEGIN
+    IF OLD.owner_id IS NOT NULL THEN
+        {BUMP.format(owner='OLD.owner_id')} INTO new_version;
+        INSERT INTO fooditemtombstone (id, owner_id, change_id, deleted_at)
+        VALUES (OLD.id, OLD.owner_id, new_version, now());
+    END IF;
+    RETURN NULL;
+END
+$$
+""",
+]
+
+TRIGGERS = [
+    ('fooditem_bump_version', 'BEFORE INSERT OR UPDATE', 'fooditem_bump_version()'),
+    ('fooditem_add_tombstone', 'AFTER DELETE', 'fooditem_add_tombstone()'),
+]
+
+
+def upgrade() -> None:
+    op.create_table(
+        'fooditemversion',
+        sa.Column('owner_id', postgresql.UUID(as_uuid=True), sa.ForeignKey('user.id'), primary_key=True),
+        sa.Column('version', sa.BigInteger(), nullable=False, server_default='0'),
+        sa.Column('pruned_version', sa.BigInteger(), nullable=False, server_default='0'),
+    )
+    op.create_table(
+        'fooditemtombstone',
+        sa.Column('id', postgresql.UUID(as_uuid=True), primary_key=True),
+        sa.Column('owner_id', postgresql.UUID(as_uuid=True), nullable=False),
+        sa.Column('change_id', sa.BigInteger(), nullable=False),
+        sa.Column('deleted_at', sa.DateTime(), nullable=False, index=True),
+    )
+    op.create_index(
+        'ix_fooditemtombstone_owner_id_change_id', 'fooditemtombstone', ['owner_id', 'change_id']
+    )
+    # Constant defaults, so neither column rewrites the table. Existing rows
+    # get version 0, i.e. they are part of every full sync.
+    op.add_column('fooditem', sa.Column('updated_at', sa.DateTime(), server_default=sa.func.now()))
+    op.add_column('fooditem', sa.Column('change_id', sa.BigInteger(), nullable=False, server_default='0'))
+    for function in FUNCTIONS:
+        op.execute(function)
+    for name, when, function in TRIGGERS:
+        op.execute(f"CREATE TRIGGER {name} {when} ON fooditem FOR EACH ROW EXECUTE FUNCTION {function}")
+    with op.get_context().autocommit_block():
+        op.create_index(
+            'ix_fooditem_owner_id_change_id',
+            'fooditem',
+            ['owner_id', 'change_id'],
+            postgresql_concurrently=True,
+            if_not_exists=True,
+        )
+
+
+def downgrade() -> None:
+    with op.get_context().autocommit_block():
+        op.drop_index(
+            'ix_fooditem_owner_id_change_id',
+            table_name='fooditem',
+            postgresql_concurrently=True,
+            if_exists=True,
+        )
+    for name, _, function in TRIGGERS:
+        op.execute(f"DROP TRIGGER IF EXISTS {name} ON fooditem")
+        op.execute(f"DROP FUNCTION IF EXISTS {function}")
+    op.drop_column('fooditem', 'change_id')
+    op.drop_column('fooditem', 'updated_at')
+    op.drop_table('fooditemtombstone')
+    op.drop_table('fooditemversion')
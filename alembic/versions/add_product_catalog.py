@@ -0,0 +1,40 @@
+"""Add local product catalog
+
+Revision ID: 005
+Revises: 004
+Create Date: 2026-10-18
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+# revision identifiers, used by Alembic.
+revision = '005'
+down_revision = '004'
+branch_labels = None
+depends_on = None
+
+
+def upgrade() -> None:
+    # Offline copy of Open Food Facts, loaded by app.commands.import_products
+    op.create_table(
+        'product',
+        sa.Column('barcode', sa.String(), primary_key=True),
+        sa.Column('name', sa.String(), nullable=True),
+        sa.Column('category', sa.String(), nullable=True),
+        sa.Column('image_url', sa.String(), nullable=True),
+        sa.Column('last_modified', sa.BigInteger(), nullable=True),
+    )
+    op.create_table(
+        'productimport',
+        sa.Column('source', sa.String(), primary_key=True),
+        sa.Column('records_done', sa.BigInteger(), nullable=False, server_default='0'),
+        sa.Column('rows_loaded', sa.BigInteger(), nullable=False, server_default='0'),
+        sa.Column('completed', sa.Boolean(), nullable=False, server_default=sa.false()),
+        sa.Column('updated_at', sa.DateTime(), nullable=True, server_default=sa.func.now()),
+    )
+
+
+def downgrade() -> None:
+    op.drop_table('productimport')
+    op.drop_table('product')
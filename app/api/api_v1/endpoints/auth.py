@@ -1,63 +1,140 @@
 from datetime import timedelta
-from typing import Any
+from typing import Any, Dict, Optional
+from uuid import UUID
 
-from fastapi import APIRouter, Body, Depends, HTTPException
+from fastapi import APIRouter, Body, Depends, HTTPException, Response
+from fastapi.concurrency import run_in_threadpool
 from fastapi.security import OAuth2PasswordRequestForm
-from sqlalchemy.orm import Session
+from sqlalchemy.ext.asyncio import AsyncSession
 
 from app import crud, models, schemas
 from app.api import deps
 from app.core import security
 from app.core.config import settings
-from app.core.security import get_password_hash
+from app.core.executor import ExecutorSaturated
+from app.core.principal import Principal
+from app.core.revocation import RevocationStoreFull, revocation_store
 
 router = APIRouter()
 
 
+def _token_response(user: models.User) -> Dict[str, Any]:
+    access_token_expires = timedelta(minutes=settings.ACCESS_TOKEN_EXPIRE_MINUTES)
+    claims = Principal.from_user(user).claims() if settings.JWT_EMBED_CLAIMS else None
+    return {
+        "access_token": security.create_access_token(
+            user.id, expires_delta=access_token_expires, claims=claims
+        ),
+        "refresh_token": security.create_refresh_token(user.id),
+        "token_type": "bearer",
+        "expires_in": int(access_token_expires.total_seconds()),
+    }
+
+
 @router.post("/login", response_model=schemas.Token)
-def login_access_token(
-    db: Session = Depends(deps.get_db), form_data: OAuth2PasswordRequestForm = Depends()
+async def login_access_token(
+    db: AsyncSession = Depends(deps.get_async_db), form_data: OAuth2PasswordRequestForm = Depends()
 ) -> Any:
     """
     OAuth2 compatible token login, get an access token for future requests
     """
-    user = crud.user.authenticate(
-        db, email=form_data.username, password=form_data.password
-    )
+    user = await crud.async_user.get_by_email(db, email=form_data.username)
     if not user:
         raise HTTPException(status_code=400, detail="Incorrect email or password")
-    elif not crud.user.is_active(user):
+    try:
+        verified, new_hash = await security.verify_and_update_password(
+            form_data.password, user.hashed_password
+        )
+    except ExecutorSaturated:
+        raise HTTPException(status_code=429, detail="Too many login attempts in progress, try again later")
+    if not verified:
+        raise HTTPException(status_code=400, detail="Incorrect email or password")
+    elif not crud.async_user.is_active(user):
         raise HTTPException(status_code=400, detail="Inactive user")
-    access_token_expires = timedelta(minutes=settings.ACCESS_TOKEN_EXPIRE_MINUTES)
-    return {
-        "access_token": security.create_access_token(
-            user.id, expires_delta=access_token_expires
-        ),
-        "token_type": "bearer",
-    }
+    if new_hash:
+        # The stored hash uses an outdated cost; upgrade it transparently
+        user = await crud.async_user.update(db, db_obj=user, obj_in={"hashed_password": new_hash})
+    return _token_response(user)
+
+
+@router.post("/refresh", response_model=schemas.Token)
+async def refresh_access_token(
+    db: AsyncSession = Depends(deps.get_async_db), refresh_token: str = Body(..., embed=True)
+) -> Any:
+    """
+    Exchange a refresh token for a new access and refresh token. Refresh
+    tokens are single use, and the user is checked against the database.
+    """
+    token_data = deps.decode_token(refresh_token, token_type="refresh")
+    user = await crud.async_user.get(db, id=UUID(token_data.sub))
+    if not user:
+        raise HTTPException(status_code=404, detail="User not found")
+    elif not crud.async_user.is_active(user):
+        raise HTTPException(status_code=400, detail="Inactive user")
+    try:
+        # Two concurrent refreshes both pass decode_token; only one consumes it
+        consumed = await run_in_threadpool(revocation_store.consume_token, token_data.jti, token_data.exp)
+    except RevocationStoreFull:
+        raise HTTPException(status_code=503, detail="Cannot revoke tokens right now, try again later")
+    if not consumed:
+        raise HTTPException(status_code=403, detail="Could not validate credentials")
+    return _token_response(user)
+
+
+@router.post("/logout", status_code=204)
+async def logout(
+    token: Optional[str] = Depends(deps.optional_oauth2_scheme),
+    refresh_token: Optional[str] = Body(None, embed=True),
+) -> Response:
+    """
+    Revoke the refresh token and the current access token. Either one
+    authenticates the call, so a client whose access token has expired can
+    still revoke its refresh token; an expired access token needs no
+    revocation and is then ignored.
+    """
+    if not token and not refresh_token:
+        raise HTTPException(status_code=401, detail="Not authenticated")
+    tokens = []
+    if refresh_token:
+        tokens.append(deps.decode_token(refresh_token, token_type="refresh"))
+    if token:
+        try:
+            tokens.append(deps.decode_token(token))
+        except HTTPException:
+            if not tokens:
+                raise
+    for token_data in tokens:
+        if token_data.jti is None:
+            continue  # issued before tokens had ids; expires on its own
+        try:
+            await run_in_threadpool(revocation_store.revoke_token, token_data.jti, token_data.exp)
+        except RevocationStoreFull:
+            raise HTTPException(status_code=503, detail="Cannot revoke tokens right now, try again later")
+    return Response(status_code=204)
 
 
 @router.post("/register", response_model=schemas.User)
-def register_user(
+async def register_user(
     *,
-    db: Session = Depends(deps.get_db),
+    db: AsyncSession = Depends(deps.get_async_db),
     user_in: schemas.UserCreate,
 ) -> Any:
     """
     Register a new user.
     """
-    user = crud.user.get_by_email(db, email=user_in.email)
+    user = await crud.async_user.get_by_email(db, email=user_in.email)
     if user:
         raise HTTPException(
             status_code=400,
             detail="The user with this email already exists in the system",
         )
-    user = crud.user.create(db, obj_in=user_in)
+    hashed_password = await deps.hash_password(user_in.password)
+    user = await crud.async_user.create(db, obj_in=user_in, hashed_password=hashed_password)
     return user
 
 
 @router.post("/test-token", response_model=schemas.User)
-def test_token(current_user: models.User = Depends(deps.get_current_user)) -> Any:
+async def test_token(current_user: models.User = Depends(deps.get_current_user)) -> Any:
     """
     Test access token
     """
@@ -1,48 +1,76 @@
-from typing import Any
+from typing import Any, AsyncIterator, Optional, Union
 
-from fastapi import APIRouter, Depends, HTTPException
-import requests
+from fastapi import APIRouter, Depends, Header, HTTPException
+from fastapi.responses import StreamingResponse
+import httpx
 
+from app.core.barcode import lookup_product, lookup_products
 from app.core.config import settings
+from app.core.principal import Principal
+from app.schemas.barcode import BarcodeBatchRequest, BarcodeBatchResponse, BarcodeLookupResult
 from app.schemas.food_item import FoodItemCreate
 from app.api import deps
-from app import models
 
 router = APIRouter()
 
+NDJSON_MEDIA_TYPE = "application/x-ndjson"
+
+
+def _to_result(barcode: str, result: Union[FoodItemCreate, None, Exception]) -> BarcodeLookupResult:
+    if isinstance(result, Exception):
+        return BarcodeLookupResult(
+            barcode=barcode,
+            status_code=503,
+            error=f"Error contacting barcode API: {str(result)}",
+        )
+    if result is None:
+        return BarcodeLookupResult(barcode=barcode, status_code=404, error="Product not found")
+    return BarcodeLookupResult(barcode=barcode, item=result)
+
+
+@router.post("/batch", response_model=BarcodeBatchResponse)
+async def lookup_barcode_batch(
+    batch_in: BarcodeBatchRequest,
+    accept: Optional[str] = Header(None),
+    current_user: Principal = Depends(deps.get_current_active_principal)
+) -> Any:
+    """
+    Lookup many barcodes at once. Cached barcodes are answered right away and
+    the rest are fetched from Open Food Facts concurrently. Send
+    `Accept: application/x-ndjson` to stream one result per line as they complete.
+    """
+    if len(batch_in.barcodes) > settings.BARCODE_BATCH_MAX_SIZE:
+        raise HTTPException(
+            status_code=400,
+            detail=f"At most {settings.BARCODE_BATCH_MAX_SIZE} barcodes can be looked up at once",
+        )
+    results = lookup_products(batch_in.barcodes)
+
+    if accept and NDJSON_MEDIA_TYPE in accept:
+        async def stream() -> AsyncIterator[str]:
+            async for barcode, result in results:
+                yield _to_result(barcode, result).model_dump_json() + "\n"
+
+        return StreamingResponse(stream(), media_type=NDJSON_MEDIA_TYPE)
+
+    return BarcodeBatchResponse(
+        results={barcode: _to_result(barcode, result) async for barcode, result in results}
+    )
+
 
 @router.get("/{barcode}", response_model=FoodItemCreate)
-def lookup_barcode(
+async def lookup_barcode(
     barcode: str,
-    current_user: models.User = Depends(deps.get_current_active_user)
+    current_user: Principal = Depends(deps.get_current_active_principal)
 ) -> Any:
     """
-    Lookup food item information using barcode from Open Food Facts API.
+    Lookup food item information using barcode, served from the product cache
+    when possible and from the Open Food Facts API otherwise.
     """
     try:
-        # Call Open Food Facts API
-        response = requests.get(
-            f"{settings.OPEN_FOOD_FACTS_API_URL}/product/{barcode}.json",
-            timeout=10
-        )
-        response.raise_for_status()
-        data = response.json()
-        
-        # Check if product was found
-        if data.get("status") != 1 or not data.get("product"):
-            raise HTTPException(status_code=404, detail="Product not found")
-            
-        product = data["product"]
-        
-        # Extract relevant information
-        food_item = FoodItemCreate(
-            name=product.get("product_name", "Unknown Product"),
-            barcode=barcode,
-            category=product.get("categories_tags", ["unknown"])[0].replace("en:", "") if product.get("categories_tags") else "unknown",
-            image_url=product.get("image_url"),
-            source="barcode"
-        )
-        
-        return food_item
-    except requests.RequestException as e:
-        raise HTTPException(status_code=503, detail=f"Error contacting barcode API: {str(e)}")
\ No newline at end of file
+        food_item = await lookup_product(barcode)
+    except httpx.HTTPError as e:
+        raise HTTPException(status_code=503, detail=f"Error contacting barcode API: {str(e)}")
+    if food_item is None:
+        raise HTTPException(status_code=404, detail="Product not found")
+    return food_item
@@ -1,82 +1,462 @@
-from typing import Any, List, Optional
+import asyncio
+import hashlib
+import time
+from datetime import date, datetime
+from typing import Any, AsyncIterator, Callable, Dict, List, Optional, Sequence, Tuple, Type, TypeVar
 from uuid import UUID
 
-from fastapi import APIRouter, Depends, HTTPException, Query
-from sqlalchemy.orm import Session
+from fastapi import APIRouter, Body, Depends, HTTPException, Query, Request, Response
+from fastapi.responses import StreamingResponse
+from pydantic import BaseModel, ValidationError
+from sqlalchemy.exc import DBAPIError
+from sqlalchemy.ext.asyncio import AsyncSession
+from starlette.background import BackgroundTask
 
-from app import crud, models
+from app import crud
 from app.api import deps
-from app.schemas.food_item import FoodItem, FoodItemCreate, FoodItemUpdate
+from app.core.change_feed import Subscription, TooManySubscribers, change_feed
+from app.core.config import settings
+from app.core.pagination import InvalidCursor, decode_cursor, encode_cursor
+from app.core.principal import Principal
+from app.core.revocation import revocation_store
+from app.schemas.food_item import (
+    FoodItem,
+    FoodItemBulkCreate,
+    FoodItemBulkDelete,
+    FoodItemBulkError,
+    FoodItemBulkResult,
+    FoodItemBulkUpdate,
+    FoodItemBulkUpdateItem,
+    FoodItemChanges,
+    FoodItemCreate,
+    FoodItemSummary,
+    FoodItemUpdate,
+)
+from app.schemas.token import TokenPayload
 
 router = APIRouter()
 
+SchemaType = TypeVar("SchemaType", bound=BaseModel)
+
+# SQLSTATE of a statement cancelled by statement_timeout
+QUERY_CANCELED = "57014"
+
+CURSOR_DESCRIPTION = "Opaque cursor from the X-Next-Cursor header of the previous page; replaces skip"
+
+
+def _decode_cursor(
+    cursor: Optional[str], order: str, types: Sequence[Callable[[str], Any]]
+) -> Optional[Tuple[Any, ...]]:
+    if cursor is None:
+        return None
+    try:
+        return decode_cursor(cursor, order, types)
+    except InvalidCursor as e:
+        raise HTTPException(status_code=400, detail=str(e))
+
+
+def _set_next_cursor(response: Response, page: List[Any], limit: int, order: str, *columns: str) -> None:
+    # A short page is the last one
+    if page and len(page) == limit:
+        last = page[-1]
+        response.headers["X-Next-Cursor"] = encode_cursor(
+            order, *(getattr(last, column) for column in columns)
+        )
+
+
+def _optional_uuid(value: Optional[str]) -> Optional[UUID]:
+    return None if value is None else UUID(value)
+
+
+async def _not_modified(
+    request: Request, response: Response, db: AsyncSession, owner_id: UUID
+) -> Optional[Response]:
+    """
+    Set the ETag of one of the owner's listings, or return a 304 response
+    when the client's If-None-Match already holds it. The owner's version
+    changes with every write to their items, the date with the expired and
+    expiring buckets, and the query string with the listing. It is read
+    before the listing, so an ETag never claims newer data than the body.
+    """
+    version = await crud.async_food_item.get_version(db, owner_id=owner_id)
+    digest = hashlib.sha1(f"{owner_id}|{date.today()}|{request.url.query}".encode()).hexdigest()[:16]
+    etag = f'W/"{version}-{digest}"'
+    if_none_match = request.headers.get("If-None-Match", "")
+    if if_none_match:
+        # Weak comparison, as for GET
+        tags = {tag.strip().replace("W/", "", 1) for tag in if_none_match.split(",")}
+        if "*" in tags or etag.replace("W/", "", 1) in tags:
+            return Response(status_code=304, headers={"ETag": etag})
+    response.headers["ETag"] = etag
+    return None
+
 
 @router.get("/", response_model=List[FoodItem])
-def read_food_items(
-    db: Session = Depends(deps.get_db),
+async def read_food_items(
+    request: Request,
+    response: Response,
+    db: AsyncSession = Depends(deps.get_read_db),
     skip: int = 0,
     limit: int = 100,
     category: Optional[str] = None,
-    current_user: models.User = Depends(deps.get_current_active_user),
+    cursor: Optional[str] = Query(None, description=CURSOR_DESCRIPTION),
+    current_user: Principal = Depends(deps.get_current_active_principal),
 ) -> Any:
     """
-    Retrieve food items for the current user.
+    Retrieve food items for the current user, oldest first. When there may
+    be more items, the X-Next-Cursor header holds the cursor of the next page.
+    Answers 304 when the ETag in If-None-Match is still current.
     """
+    after = _decode_cursor(cursor, "added_at", (datetime.fromisoformat, UUID))
+    not_modified = await _not_modified(request, response, db, current_user.id)
+    if not_modified:
+        return not_modified
     if category:
-        food_items = crud.food_item.get_by_category(
-            db, category=category, owner_id=current_user.id, skip=skip, limit=limit
+        food_items = await crud.async_food_item.get_by_category(
+            db, category=category, owner_id=current_user.id, skip=skip, limit=limit, after=after
         )
     else:
-        food_items = crud.food_item.get_multi_by_owner(
-            db, owner_id=current_user.id, skip=skip, limit=limit
+        food_items = await crud.async_food_item.get_multi_by_owner(
+            db, owner_id=current_user.id, skip=skip, limit=limit, after=after
         )
+    _set_next_cursor(response, food_items, limit, "added_at", "added_at", "id")
     return food_items
 
 
 @router.post("/", response_model=FoodItem)
-def create_food_item(
+async def create_food_item(
     *,
-    db: Session = Depends(deps.get_db),
+    db: AsyncSession = Depends(deps.get_write_db),
     food_item_in: FoodItemCreate,
-    current_user: models.User = Depends(deps.get_current_active_user),
+    current_user: Principal = Depends(deps.get_current_active_principal),
 ) -> Any:
     """
     Create new food item for the current user.
     """
-    food_item = crud.food_item.create_with_owner(
+    food_item = await crud.async_food_item.create_with_owner(
         db=db, obj_in=food_item_in, owner_id=current_user.id
     )
     return food_item
 
 
+async def _raise_missing_or_forbidden(db: AsyncSession, food_item_id: UUID) -> None:
+    # Writes are scoped to the owner in one statement; only when that matched
+    # nothing is the item looked up to tell "missing" from "not yours"
+    if await crud.async_food_item.get(db=db, id=food_item_id):
+        raise HTTPException(status_code=403, detail="Not enough permissions")
+    raise HTTPException(status_code=404, detail="Food item not found")
+
+
+def _check_bulk_size(size: int) -> None:
+    if size > settings.FOOD_ITEM_BULK_MAX_SIZE:
+        raise HTTPException(
+            status_code=400,
+            detail=f"At most {settings.FOOD_ITEM_BULK_MAX_SIZE} items can be changed at once",
+        )
+
+
+def _validate_rows(
+    rows: List[Dict[str, Any]], schema: Type[SchemaType], errors: List[FoodItemBulkError]
+) -> List[Tuple[int, SchemaType]]:
+    """
+    Validate each row against `schema`, recording a 422 error per invalid row.
+    """
+    valid = []
+    for index, row in enumerate(rows):
+        try:
+            valid.append((index, schema(**row)))
+        except ValidationError as e:
+            detail = "; ".join(
+                f"{'.'.join(str(part) for part in error['loc'])}: {error['msg']}"
+                for error in e.errors()
+            )
+            errors.append(FoodItemBulkError(index=index, status_code=422, detail=detail))
+    return valid
+
+
+def _not_found(
+    requested: List[Tuple[int, UUID]], found: List[Any], errors: List[FoodItemBulkError]
+) -> None:
+    found_ids = {food_item.id for food_item in found}
+    for index, food_item_id in requested:
+        if food_item_id not in found_ids:
+            errors.append(
+                FoodItemBulkError(
+                    index=index, id=food_item_id, status_code=404, detail="Food item not found"
+                )
+            )
+
+
+@router.post("/bulk", response_model=FoodItemBulkResult)
+async def create_food_items_bulk(
+    *,
+    db: AsyncSession = Depends(deps.get_write_db),
+    bulk_in: FoodItemBulkCreate,
+    current_user: Principal = Depends(deps.get_current_active_principal),
+) -> Any:
+    """
+    Create many food items for the current user in one transaction. Invalid
+    rows are reported in `errors` and the valid ones are still created.
+    """
+    _check_bulk_size(len(bulk_in.items))
+    errors: List[FoodItemBulkError] = []
+    valid = _validate_rows(bulk_in.items, FoodItemCreate, errors)
+    food_items = await crud.async_food_item.create_multi_with_owner(
+        db, objs_in=[obj_in for _, obj_in in valid], owner_id=current_user.id
+    )
+    return FoodItemBulkResult(items=food_items, errors=errors)
+
+
+@router.patch("/bulk", response_model=FoodItemBulkResult)
+async def update_food_items_bulk(
+    *,
+    db: AsyncSession = Depends(deps.get_write_db),
+    bulk_in: FoodItemBulkUpdate,
+    current_user: Principal = Depends(deps.get_current_active_principal),
+) -> Any:
+    """
+    Update many of the current user's food items in one transaction. Only
+    the fields present in a row are changed. Invalid rows, repeated ids and
+    items that do not exist are reported in `errors`.
+    """
+    _check_bulk_size(len(bulk_in.items))
+    errors: List[FoodItemBulkError] = []
+    unique: List[Tuple[int, FoodItemBulkUpdateItem]] = []
+    seen = set()
+    for index, obj_in in _validate_rows(bulk_in.items, FoodItemBulkUpdateItem, errors):
+        if obj_in.id in seen:
+            errors.append(
+                FoodItemBulkError(
+                    index=index, id=obj_in.id, status_code=400, detail="Food item is listed more than once"
+                )
+            )
+            continue
+        seen.add(obj_in.id)
+        unique.append((index, obj_in))
+    food_items = await crud.async_food_item.update_multi_with_owner(
+        db, objs_in=[obj_in for _, obj_in in unique], owner_id=current_user.id
+    )
+    _not_found([(index, obj_in.id) for index, obj_in in unique], food_items, errors)
+    return FoodItemBulkResult(items=food_items, errors=sorted(errors, key=lambda e: e.index))
+
+
+@router.delete("/bulk", response_model=FoodItemBulkResult)
+async def delete_food_items_bulk(
+    *,
+    db: AsyncSession = Depends(deps.get_write_db),
+    bulk_in: FoodItemBulkDelete = Body(...),
+    current_user: Principal = Depends(deps.get_current_active_principal),
+) -> Any:
+    """
+    Delete many of the current user's food items in one transaction. Items
+    that do not exist are reported in `errors`.
+    """
+    _check_bulk_size(len(bulk_in.ids))
+    errors: List[FoodItemBulkError] = []
+    food_items = await crud.async_food_item.remove_multi_by_owner(
+        db, ids=list(set(bulk_in.ids)), owner_id=current_user.id
+    )
+    _not_found(list(enumerate(bulk_in.ids)), food_items, errors)
+    return FoodItemBulkResult(items=food_items, errors=errors)
+
+
+def _decode_changes_cursor(since: Optional[str]) -> Optional[Tuple[int, Optional[UUID], int]]:
+    if since is None:
+        return None
+    try:
+        return decode_cursor(since, "changes", (int, _optional_uuid, int))
+    except InvalidCursor:
+        # Cursors issued before they carried the version tombstones are
+        # needed from, which was their own
+        version, after_id = _decode_cursor(since, "changes", (int, _optional_uuid))
+        return version, after_id, version
+
+
+@router.get("/changes", response_model=FoodItemChanges)
+async def read_food_item_changes(
+    db: AsyncSession = Depends(deps.get_read_db),
+    since: Optional[str] = Query(None, description="`cursor` of the previous response; omit for a full sync"),
+    limit: int = Query(500, ge=1, le=settings.FOOD_ITEM_CHANGES_MAX_LIMIT),
+    current_user: Principal = Depends(deps.get_current_active_principal),
+) -> Any:
+    """
+    Food items of the current user created, updated or deleted since a
+    previous sync, oldest change first. Without `since`, every item is
+    returned as an upsert. Pass the returned cursor as `since` next time,
+    right away while has_more is true. Answers 410 when deletions after the
+    cursor are no longer retained; the client must then sync from scratch.
+    """
+    after = _decode_changes_cursor(since)
+    changes = await crud.async_food_item.get_changes(
+        db, owner_id=current_user.id, since=after, limit=limit
+    )
+    if after is not None and after[2] < changes["pruned_version"]:
+        raise HTTPException(status_code=410, detail="Cursor is too old, sync again without `since`")
+    return {
+        "upserts": changes["upserts"],
+        "deletes": changes["deletes"],
+        "cursor": encode_cursor("changes", *changes["cursor"]),
+        "has_more": changes["has_more"],
+    }
+
+
+def _server_sent_event(event: str, data: str = "{}") -> str:
+    return f"event: {event}\ndata: {data}\n\n"
+
+
+def _token_valid(token_data: TokenPayload) -> bool:
+    # A stream outlives the request that authenticated it
+    if token_data.exp is not None and token_data.exp <= time.time():
+        return False
+    return not revocation_store.is_revoked(
+        jti=token_data.jti, user_id=token_data.sub, issued_at=token_data.iat
+    )
+
+
+async def _change_events(subscription: Subscription, token_data: TokenPayload) -> AsyncIterator[str]:
+    try:
+        yield _server_sent_event("ready")
+        while True:
+            try:
+                data = await asyncio.wait_for(
+                    subscription.queue.get(), settings.CHANGE_STREAM_HEARTBEAT_SECONDS
+                )
+            except asyncio.TimeoutError:
+                data = ""
+            if not _token_valid(token_data):
+                yield _server_sent_event("unauthorized")
+                return
+            if data is None:
+                yield _server_sent_event("resync")
+                return
+            # A comment line keeps idle connections from being timed out by proxies
+            yield _server_sent_event("changes", data) if data else ": heartbeat\n\n"
+    finally:
+        change_feed.unsubscribe(subscription)
+
+
+@router.get("/stream", response_class=StreamingResponse)
+async def stream_food_item_changes(
+    token: str = Depends(deps.oauth2_scheme),
+    current_user: Principal = Depends(deps.get_current_active_principal),
+) -> Any:
+    """
+    Server-Sent Events of the current user's food item changes, made from
+    any device. After `ready`, each `changes` event carries the upserted
+    items and deleted ids of one write, and a comment line is sent every
+    CHANGE_STREAM_HEARTBEAT_SECONDS while idle. To stay in sync, wait for
+    `ready` and then catch up with GET /food-items/changes; applying
+    an event twice is harmless. The stream ends with `resync` when the
+    client falls too far behind or changes may have been missed, and with
+    `unauthorized` when the token expires or is revoked; reconnect and
+    catch up with GET /food-items/changes again. Answers 429 when too many
+    streams are open.
+    """
+    token_data = deps.decode_token(token)
+    try:
+        subscription = change_feed.subscribe(str(current_user.id))
+    except TooManySubscribers as e:
+        raise HTTPException(status_code=429, detail=str(e))
+
+    async def unsubscribe() -> None:
+        # Also covers a client that disconnects before the stream starts
+        change_feed.unsubscribe(subscription)
+
+    return StreamingResponse(
+        _change_events(subscription, token_data),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"},
+        background=BackgroundTask(unsubscribe),
+    )
+
+
+@router.get("/summary", response_model=FoodItemSummary)
+async def read_food_item_summary(
+    request: Request,
+    response: Response,
+    db: AsyncSession = Depends(deps.get_read_db),
+    days: int = Query(7, description="Number of days to check for expiration"),
+    recent: int = Query(5, ge=0, le=100, description="Number of recently added items to include"),
+    current_user: Principal = Depends(deps.get_current_active_principal),
+) -> Any:
+    """
+    Inventory overview for the current user's dashboard: item counts by
+    category, total quantity, expired and expiring-soon counts and the most
+    recently added items.
+    Answers 304 when the ETag in If-None-Match is still current.
+    """
+    not_modified = await _not_modified(request, response, db, current_user.id)
+    if not_modified:
+        return not_modified
+    return await crud.async_food_item.get_summary(
+        db, owner_id=current_user.id, days=days, recent=recent
+    )
+
+
+@router.get("/search", response_model=List[FoodItem])
+async def search_food_items(
+    request: Request,
+    response: Response,
+    db: AsyncSession = Depends(deps.get_read_db),
+    q: str = Query(..., min_length=1, max_length=100, description="Words or word prefixes; typos are tolerated"),
+    limit: int = Query(20, ge=1, le=settings.FOOD_ITEM_SEARCH_MAX_LIMIT),
+    current_user: Principal = Depends(deps.get_current_active_principal),
+) -> Any:
+    """
+    Search the current user's food items by name and category, best
+    matches first.
+    Answers 304 when the ETag in If-None-Match is still current.
+    """
+    not_modified = await _not_modified(request, response, db, current_user.id)
+    if not_modified:
+        return not_modified
+    try:
+        return await crud.async_food_item.search(db, q=q, owner_id=current_user.id, limit=limit)
+    except DBAPIError as e:
+        if getattr(e.orig, "sqlstate", None) != QUERY_CANCELED:
+            raise
+        raise HTTPException(status_code=503, detail="Search took too long, try a more specific query")
+
+
 @router.get("/expiring-soon/", response_model=List[FoodItem])
-def read_expiring_food_items(
-    db: Session = Depends(deps.get_db),
+async def read_expiring_food_items(
+    request: Request,
+    response: Response,
+    db: AsyncSession = Depends(deps.get_read_db),
     days: int = Query(7, description="Number of days to check for expiration"),
     skip: int = 0,
     limit: int = 100,
-    current_user: models.User = Depends(deps.get_current_active_user),
+    cursor: Optional[str] = Query(None, description=CURSOR_DESCRIPTION),
+    current_user: Principal = Depends(deps.get_current_active_principal),
 ) -> Any:
     """
-    Retrieve food items that are expiring soon for the current user.
+    Retrieve food items that are expiring soon for the current user, soonest
+    first. When there may be more items, the X-Next-Cursor header holds the
+    cursor of the next page.
+    Answers 304 when the ETag in If-None-Match is still current.
     """
-    food_items = crud.food_item.get_expiring_soon(
-        db, days=days, owner_id=current_user.id, skip=skip, limit=limit
+    after = _decode_cursor(cursor, "expiration_date", (date.fromisoformat, UUID))
+    not_modified = await _not_modified(request, response, db, current_user.id)
+    if not_modified:
+        return not_modified
+    food_items = await crud.async_food_item.get_expiring_soon(
+        db, days=days, owner_id=current_user.id, skip=skip, limit=limit, after=after
     )
+    _set_next_cursor(response, food_items, limit, "expiration_date", "expiration_date", "id")
     return food_items
 
 
 @router.get("/{food_item_id}", response_model=FoodItem)
-def read_food_item(
+async def read_food_item(
     *,
-    db: Session = Depends(deps.get_db),
+    db: AsyncSession = Depends(deps.get_read_db),
     food_item_id: UUID,
-    current_user: models.User = Depends(deps.get_current_active_user),
+    current_user: Principal = Depends(deps.get_current_active_principal),
 ) -> Any:
     """
     Get food item by ID.
     """
-    food_item = crud.food_item.get(db=db, id=food_item_id)
+    food_item = await crud.async_food_item.get(db=db, id=food_item_id)
     if not food_item:
         raise HTTPException(status_code=404, detail="Food item not found")
     if food_item.owner_id != current_user.id:
@@ -85,39 +465,35 @@ def read_food_item(
 
 
 @router.put("/{food_item_id}", response_model=FoodItem)
-def update_food_item(
+async def update_food_item(
     *,
-    db: Session = Depends(deps.get_db),
+    db: AsyncSession = Depends(deps.get_write_db),
     food_item_id: UUID,
     food_item_in: FoodItemUpdate,
-    current_user: models.User = Depends(deps.get_current_active_user),
+    current_user: Principal = Depends(deps.get_current_active_principal),
 ) -> Any:
     """
     Update a food item.
     """
-    food_item = crud.food_item.get(db=db, id=food_item_id)
+    food_item = await crud.async_food_item.update_by_owner(
+        db=db, id=food_item_id, owner_id=current_user.id, obj_in=food_item_in
+    )
     if not food_item:
-        raise HTTPException(status_code=404, detail="Food item not found")
-    if food_item.owner_id != current_user.id:
-        raise HTTPException(status_code=403, detail="Not enough permissions")
-    food_item = crud.food_item.update(db=db, db_obj=food_item, obj_in=food_item_in)
+        await _raise_missing_or_forbidden(db, food_item_id)
     return food_item
 
 
 @router.delete("/{food_item_id}", response_model=FoodItem)
-def delete_food_item(
+async def delete_food_item(
     *,
-    db: Session = Depends(deps.get_db),
+    db: AsyncSession = Depends(deps.get_write_db),
     food_item_id: UUID,
-    current_user: models.User = Depends(deps.get_current_active_user),
+    current_user: Principal = Depends(deps.get_current_active_principal),
 ) -> Any:
     """
     Delete a food item.
     """
-    food_item = crud.food_item.get(db=db, id=food_item_id)
+    food_item = await crud.async_food_item.remove_by_owner(db=db, id=food_item_id, owner_id=current_user.id)
     if not food_item:
-        raise HTTPException(status_code=404, detail="Food item not found")
-    if food_item.owner_id != current_user.id:
-        raise HTTPException(status_code=403, detail="Not enough permissions")
-    food_item = crud.food_item.remove(db=db, id=food_item_id)
+        await _raise_missing_or_forbidden(db, food_item_id)
     return food_item
\ No newline at end of file
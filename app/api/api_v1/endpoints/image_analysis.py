@@ -1,113 +1,164 @@
-from typing import Any
-import base64
-from io import BytesIO
+from typing import Any, Dict, List, Optional, Tuple
 
-from fastapi import APIRouter, Depends, HTTPException, UploadFile, File
-import openai
-from PIL import Image
+from fastapi import APIRouter, Depends, Form, HTTPException, Response, UploadFile, File
+from fastapi.encoders import jsonable_encoder
+from fastapi.responses import JSONResponse
+from pydantic import AnyHttpUrl
+from sqlalchemy.ext.asyncio import AsyncSession
 
+from app.core import vision
 from app.core.config import settings
-from app.schemas.food_item import FoodItemCreate
+from app.core.executor import ExecutorSaturated
+from app.core.image_processing import InvalidImage, PreprocessedImage, image_executor, preprocess_image
+from app.core.jobs import InvalidCallbackUrl, QueueFull
+from app.core.principal import Principal
+from app.schemas.food_item import DetectedFoodItem, FoodItem, FoodItemCreate
+from app.schemas.job import ImageAnalysisJob
 from app.api import deps
-from app import models
+from app import crud
 
 router = APIRouter()
 
 
-@router.post("/", response_model=FoodItemCreate)
+def _image_headers(image: PreprocessedImage) -> Dict[str, str]:
+    return {
+        "Server-Timing": image.server_timing(),
+        "X-Image-Bytes-In": str(image.bytes_in),
+        "X-Image-Bytes-Out": str(image.bytes_out),
+    }
+
+
+async def _preprocess(file: UploadFile) -> PreprocessedImage:
+    # Check if OpenAI API key is set
+    if not settings.OPENAI_API_KEY:
+        raise HTTPException(status_code=500, detail="OpenAI API key not configured")
+    if file.size is not None and file.size > settings.IMAGE_MAX_UPLOAD_BYTES:
+        raise HTTPException(status_code=413, detail="Image too large")
+
+    contents = await file.read()
+    try:
+        image = await image_executor.run(preprocess_image, contents)
+    except InvalidImage as e:
+        raise HTTPException(status_code=400, detail=f"Invalid image: {str(e)}")
+    except ExecutorSaturated:
+        raise HTTPException(status_code=429, detail="Too many images are being analyzed, try again later")
+    return image
+
+
+@router.post(
+    "/",
+    response_model=FoodItemCreate,
+    responses={202: {"model": ImageAnalysisJob, "description": "Job queued (background=true)"}},
+)
 async def analyze_image(
+    response: Response,
     file: UploadFile = File(...),
-    current_user: models.User = Depends(deps.get_current_active_user)
+    background: bool = False,
+    callback_url: Optional[AnyHttpUrl] = Form(None),
+    current_user: Principal = Depends(deps.get_current_active_principal)
 ) -> Any:
     """
-    Analyze food item image using OpenAI Vision API.
+    Analyze food item image using OpenAI Vision API. The image is downscaled
+    and re-encoded before it is sent; the `Server-Timing` and
+    `X-Image-Bytes-In`/`X-Image-Bytes-Out` headers report what that cost and saved.
+    `X-Cache: HIT` means the result was reused from an identical or
+    near-identical image analyzed before.
+
+    With `background=true` the analysis is queued and a job is returned right
+    away with status 202; poll `GET /image-analysis/jobs/{job_id}` for the
+    result, or pass `callback_url` to have the finished job POSTed to it.
+    Callback URLs must be https and resolve to public addresses.
     """
-    try:
-        # Check if OpenAI API key is set
-        if not settings.OPENAI_API_KEY:
-            raise HTTPException(status_code=500, detail="OpenAI API key not configured")
-            
-        # Set OpenAI API key
-        openai.api_key = settings.OPENAI_API_KEY
-        
-        # Read and validate image
-        contents = await file.read()
-        try:
-            image = Image.open(BytesIO(contents))
-            # Convert to RGB if needed
-            if image.mode != "RGB":
-                image = image.convert("RGB")
-            
-            # Save to buffer for base64 encoding
-            buffer = BytesIO()
-            image.save(buffer, format="JPEG")
-            base64_image = base64.b64encode(buffer.getvalue()).decode("utf-8")
-            
-        except Exception as e:
-            raise HTTPException(status_code=400, detail=f"Invalid image: {str(e)}")
-            
-        # Prepare prompt for OpenAI
-        prompt = """
-        Analyze this food item image and extract the following information in JSON format:
-        1. name: The name of the food item
-        2. category: The category (e.g., Dairy, Produce, Meat, etc.)
-        3. estimated_expiration_days: Estimated days until expiration (integer)
-        
-        Only respond with valid JSON. Do not include any explanations or notes.
-        """
-        
-        # Call OpenAI API
-        response = openai.chat.completions.create(
-            model="gpt-4-vision-preview",
-            messages=[
-                {
-                    "role": "user",
-                    "content": [
-                        {"type": "text", "text": prompt},
-                        {
-                            "type": "image_url",
-                            "image_url": {"url": f"data:image/jpeg;base64,{base64_image}"}
-                        }
-                    ]
-                }
-            ],
-            max_tokens=300
-        )
-        
-        # Parse response
-        import json
+    image = await _preprocess(file)
+
+    if background:
         try:
-            result = json.loads(response.choices[0].message.content)
-        except json.JSONDecodeError:
-            # If not valid JSON, try to extract JSON from the response
-            content = response.choices[0].message.content
-            # Find JSON-like content between curly braces
-            start = content.find('{')
-            end = content.rfind('}')
-            if start != -1 and end != -1:
-                try:
-                    result = json.loads(content[start:end+1])
-                except json.JSONDecodeError:
-                    raise HTTPException(status_code=500, detail="Failed to parse AI response")
-            else:
-                raise HTTPException(status_code=500, detail="Failed to parse AI response")
-        
-        # Calculate expiration date if provided
-        expiration_date = None
-        if "estimated_expiration_days" in result and result["estimated_expiration_days"]:
-            from datetime import datetime, timedelta
-            days = int(result["estimated_expiration_days"])
-            expiration_date = (datetime.now() + timedelta(days=days)).date()
-        
-        # Create food item
-        food_item = FoodItemCreate(
-            name=result.get("name", "Unknown Food Item"),
-            category=result.get("category", "Unknown"),
-            expiration_date=expiration_date,
-            source="vision"
+            job = await vision.submit_analysis_job(
+                image,
+                owner_id=str(current_user.id),
+                callback_url=str(callback_url) if callback_url else None,
+            )
+        except QueueFull as e:
+            raise HTTPException(status_code=429, detail=str(e))
+        except InvalidCallbackUrl as e:
+            raise HTTPException(status_code=400, detail=str(e))
+        return JSONResponse(
+            status_code=202,
+            content=jsonable_encoder(ImageAnalysisJob(**job)),
+            headers=_image_headers(image),
         )
-        
-        return food_item
-        
+
+    try:
+        food_item, cached = await vision.analyze_image(image)
+    except vision.InvalidResponse as e:
+        raise HTTPException(status_code=500, detail=str(e))
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=f"Error analyzing image: {str(e)}")
+    response.headers.update(_image_headers(image))
+    response.headers["X-Cache"] = "HIT" if cached else "MISS"
+    return food_item
+
+
+@router.get("/jobs/{job_id}", response_model=ImageAnalysisJob)
+async def read_analysis_job(
+    job_id: str,
+    current_user: Principal = Depends(deps.get_current_active_principal)
+) -> Any:
+    """
+    Get the status, and once finished the result, of a background analysis job.
+    """
+    job = await vision.analysis_jobs.get(job_id)
+    if not job:
+        raise HTTPException(status_code=404, detail="Job not found")
+    if job["owner_id"] != str(current_user.id):
+        raise HTTPException(status_code=403, detail="Not enough permissions")
+    return job
+
+
+async def _analyze_items(image: PreprocessedImage) -> Tuple[List[DetectedFoodItem], bool]:
+    try:
+        return await vision.analyze_image_items(image)
+    except vision.InvalidResponse as e:
+        raise HTTPException(status_code=500, detail=str(e))
     except Exception as e:
-        raise HTTPException(status_code=500, detail=f"Error analyzing image: {str(e)}")
\ No newline at end of file
+        raise HTTPException(status_code=500, detail=f"Error analyzing image: {str(e)}")
+
+
+@router.post("/multi", response_model=List[DetectedFoodItem])
+async def analyze_image_items(
+    response: Response,
+    file: UploadFile = File(...),
+    current_user: Principal = Depends(deps.get_current_active_principal)
+) -> Any:
+    """
+    Detect every food item on a shelf, fridge or pantry photo, with the
+    bounding box of each item as fractions of the image size.
+    """
+    image = await _preprocess(file)
+    items, cached = await _analyze_items(image)
+    response.headers.update(_image_headers(image))
+    response.headers["X-Cache"] = "HIT" if cached else "MISS"
+    return items
+
+
+@router.post("/multi/insert", response_model=List[FoodItem])
+async def analyze_and_insert_image_items(
+    response: Response,
+    file: UploadFile = File(...),
+    db: AsyncSession = Depends(deps.get_write_db),
+    current_user: Principal = Depends(deps.get_current_active_principal)
+) -> Any:
+    """
+    Detect every food item on a photo and add all of them to the current
+    user's inventory in one transaction.
+    """
+    image = await _preprocess(file)
+    items, cached = await _analyze_items(image)
+    food_items = await crud.async_food_item.create_multi_with_owner(
+        db,
+        objs_in=[FoodItemCreate(**item.dict(exclude={"bounding_box"})) for item in items],
+        owner_id=current_user.id,
+    )
+    response.headers.update(_image_headers(image))
+    response.headers["X-Cache"] = "HIT" if cached else "MISS"
+    return food_items
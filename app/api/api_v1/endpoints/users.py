@@ -1,9 +1,10 @@
 from typing import Any, List
+from uuid import UUID
 
 from fastapi import APIRouter, Body, Depends, HTTPException
 from fastapi.encoders import jsonable_encoder
 from pydantic import EmailStr
-from sqlalchemy.orm import Session
+from sqlalchemy.ext.asyncio import AsyncSession
 
 from app import crud, models, schemas
 from app.api import deps
@@ -13,8 +14,8 @@ router = APIRouter()
 
 
 @router.get("/", response_model=List[schemas.User])
-def read_users(
-    db: Session = Depends(deps.get_db),
+async def read_users(
+    db: AsyncSession = Depends(deps.get_read_db),
     skip: int = 0,
     limit: int = 100,
     current_user: models.User = Depends(deps.get_current_active_superuser),
@@ -22,34 +23,35 @@ def read_users(
     """
     Retrieve users. Only for superusers.
     """
-    users = crud.user.get_multi(db, skip=skip, limit=limit)
+    users = await crud.async_user.get_multi(db, skip=skip, limit=limit)
     return users
 
 
 @router.post("/", response_model=schemas.User)
-def create_user(
+async def create_user(
     *,
-    db: Session = Depends(deps.get_db),
+    db: AsyncSession = Depends(deps.get_write_db),
     user_in: schemas.UserCreate,
     current_user: models.User = Depends(deps.get_current_active_superuser),
 ) -> Any:
     """
     Create new user. Only for superusers.
     """
-    user = crud.user.get_by_email(db, email=user_in.email)
+    user = await crud.async_user.get_by_email(db, email=user_in.email)
     if user:
         raise HTTPException(
             status_code=400,
             detail="The user with this email already exists in the system.",
         )
-    user = crud.user.create(db, obj_in=user_in)
+    hashed_password = await deps.hash_password(user_in.password)
+    user = await crud.async_user.create(db, obj_in=user_in, hashed_password=hashed_password)
     return user
 
 
 @router.put("/me", response_model=schemas.User)
-def update_user_me(
+async def update_user_me(
     *,
-    db: Session = Depends(deps.get_db),
+    db: AsyncSession = Depends(deps.get_write_db),
     password: str = Body(None),
     full_name: str = Body(None),
     email: EmailStr = Body(None),
@@ -60,19 +62,20 @@ def update_user_me(
     """
     current_user_data = jsonable_encoder(current_user)
     user_in = schemas.UserUpdate(**current_user_data)
-    if password is not None:
-        user_in.password = password
     if full_name is not None:
         user_in.full_name = full_name
     if email is not None:
         user_in.email = email
-    user = crud.user.update(db, db_obj=current_user, obj_in=user_in)
+    update_data = user_in.dict(exclude_unset=True, exclude={"password"})
+    if password is not None:
+        update_data["hashed_password"] = await deps.hash_password(password)
+    user = await crud.async_user.update(db, db_obj=current_user, obj_in=update_data)
     return user
 
 
 @router.get("/me", response_model=schemas.User)
-def read_user_me(
-    current_user: models.User = Depends(deps.get_current_active_user),
+async def read_user_me(
+    current_user: models.User = Depends(deps.get_current_active_user_readonly),
 ) -> Any:
     """
     Get current user.
@@ -81,18 +84,18 @@ def read_user_me(
 
 
 @router.get("/{user_id}", response_model=schemas.User)
-def read_user_by_id(
-    user_id: str,
-    current_user: models.User = Depends(deps.get_current_active_user),
-    db: Session = Depends(deps.get_db),
+async def read_user_by_id(
+    user_id: UUID,
+    current_user: models.User = Depends(deps.get_current_active_user_readonly),
+    db: AsyncSession = Depends(deps.get_read_db),
 ) -> Any:
     """
     Get a specific user by id.
     """
-    user = crud.user.get(db, id=user_id)
+    user = await crud.async_user.get(db, id=user_id)
     if user == current_user:
         return user
-    if not crud.user.is_superuser(current_user):
+    if not crud.async_user.is_superuser(current_user):
         raise HTTPException(
             status_code=400, detail="The user doesn't have enough privileges"
         )
@@ -100,21 +103,24 @@ def read_user_by_id(
 
 
 @router.put("/{user_id}", response_model=schemas.User)
-def update_user(
+async def update_user(
     *,
-    db: Session = Depends(deps.get_db),
-    user_id: str,
+    db: AsyncSession = Depends(deps.get_write_db),
+    user_id: UUID,
     user_in: schemas.UserUpdate,
     current_user: models.User = Depends(deps.get_current_active_superuser),
 ) -> Any:
     """
     Update a user. Only for superusers.
     """
-    user = crud.user.get(db, id=user_id)
+    user = await crud.async_user.get(db, id=user_id)
     if not user:
         raise HTTPException(
             status_code=404,
             detail="The user with this id does not exist in the system",
         )
-    user = crud.user.update(db, db_obj=user, obj_in=user_in)
-    return user
\ No newline at end of file
+    update_data = user_in.dict(exclude_unset=True, exclude={"password"})
+    if user_in.password:
+        update_data["hashed_password"] = await deps.hash_password(user_in.password)
+    user = await crud.async_user.update(db, db_obj=user, obj_in=update_data)
+    return user
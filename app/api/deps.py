@@ -1,18 +1,24 @@
-from typing import Generator, Optional
+from typing import AsyncGenerator, Generator
 from uuid import UUID
 
 from fastapi import Depends, HTTPException, status
 from fastapi.security import OAuth2PasswordBearer
 from jose import jwt, JWTError
 from pydantic import ValidationError
-from sqlalchemy.orm import Session
+from sqlalchemy.ext.asyncio import AsyncSession
 
 from app import crud, models, schemas
 from app.core import security
 from app.core.config import settings
-from app.db.session import SessionLocal
+from app.core.executor import ExecutorSaturated
+from app.core.principal import Principal, principal_cache
+from app.core.revocation import revocation_store
+from app.db.replicas import replicas
+from app.db.session import AsyncSessionLocal, SessionLocal
 
 oauth2_scheme = OAuth2PasswordBearer(tokenUrl=f"{settings.API_V1_STR}/auth/login")
+# For endpoints that can also be authenticated another way
+optional_oauth2_scheme = OAuth2PasswordBearer(tokenUrl=f"{settings.API_V1_STR}/auth/login", auto_error=False)
 
 
 def get_db() -> Generator:
@@ -23,26 +29,115 @@ def get_db() -> Generator:
         db.close()
 
 
-def get_current_user(
-    db: Session = Depends(get_db), token: str = Depends(oauth2_scheme)
-) -> models.User:
+async def get_async_db() -> AsyncGenerator[AsyncSession, None]:
+    async with AsyncSessionLocal() as db:
+        yield db
+
+
+def decode_token(token: str, token_type: str = "access") -> schemas.TokenPayload:
+    """
+    Validate a JWT of the given type and return its payload. Raises 403 when
+    it is malformed, expired, of another type or revoked.
+    """
     try:
         payload = jwt.decode(
             token, settings.SECRET_KEY, algorithms=[settings.ALGORITHM]
         )
         token_data = schemas.TokenPayload(**payload)
-    except (JWTError, ValidationError):
+        UUID(token_data.sub)
+    except (JWTError, ValidationError, TypeError, ValueError):
         raise HTTPException(
             status_code=status.HTTP_403_FORBIDDEN,
             detail="Could not validate credentials",
         )
-    user = crud.user.get(db, id=token_data.sub)
+    if (token_data.type or "access") != token_type or revocation_store.is_revoked(
+        jti=token_data.jti, user_id=token_data.sub, issued_at=token_data.iat
+    ):
+        raise HTTPException(
+            status_code=status.HTTP_403_FORBIDDEN,
+            detail="Could not validate credentials",
+        )
+    return token_data
+
+
+async def get_current_principal(token: str = Depends(oauth2_scheme)) -> Principal:
+    """
+    Authenticate the caller without loading the full user: from the claims
+    embedded in the token when JWT_EMBED_CLAIMS is enabled, otherwise from
+    the principal cache, opening a session only on a cache miss.
+    """
+    token_data = decode_token(token)
+    user_id = UUID(token_data.sub)
+    if settings.JWT_EMBED_CLAIMS and token_data.active is not None and token_data.superuser is not None:
+        return Principal(id=user_id, is_active=token_data.active, is_superuser=token_data.superuser)
+    principal = principal_cache.get(user_id)
+    if principal is None:
+        async with AsyncSessionLocal() as db:
+            user = await crud.async_user.get(db, id=user_id)
+            if not user:
+                raise HTTPException(status_code=404, detail="User not found")
+            principal = Principal.from_user(user)
+        principal_cache.set(principal)
+    return principal
+
+
+async def get_write_db(
+    current_user: Principal = Depends(get_current_principal),
+) -> AsyncGenerator[AsyncSession, None]:
+    """
+    Primary session for the authenticated caller. Its commits keep the
+    caller's reads on the primary for DB_READ_YOUR_WRITES_SECONDS.
+    """
+    async with AsyncSessionLocal() as db:
+        db.info["user_id"] = str(current_user.id)
+        yield db
+
+
+async def get_read_db(
+    current_user: Principal = Depends(get_current_principal),
+) -> AsyncGenerator[AsyncSession, None]:
+    """
+    Session for read-only endpoints: on a healthy read replica when any are
+    configured, unless the caller wrote recently.
+    """
+    engine = await replicas.route(str(current_user.id))
+    async with AsyncSessionLocal(bind=engine) as db:
+        yield db
+
+
+async def _load_user(db: AsyncSession, user_id: UUID) -> models.User:
+    user = await crud.async_user.get(db, id=user_id)
     if not user:
         raise HTTPException(status_code=404, detail="User not found")
+    principal_cache.set(Principal.from_user(user))
     return user
 
 
-def get_current_active_user(
+async def get_current_user(
+    db: AsyncSession = Depends(get_write_db), principal: Principal = Depends(get_current_principal)
+) -> models.User:
+    return await _load_user(db, principal.id)
+
+
+async def get_current_user_readonly(
+    db: AsyncSession = Depends(get_read_db), principal: Principal = Depends(get_current_principal)
+) -> models.User:
+    """
+    The caller's user loaded through get_read_db, for endpoints that do not
+    modify it.
+    """
+    return await _load_user(db, principal.id)
+
+
+async def get_current_active_principal(
+    current_user: Principal = Depends(get_current_principal),
+) -> Principal:
+    if not current_user.is_active:
+        raise HTTPException(status_code=400, detail="Inactive user")
+    return current_user
+
+
+async def get_current_active_user(
     current_user: models.User = Depends(get_current_user),
 ) -> models.User:
     if not current_user.is_active:
@@ -50,11 +145,31 @@ def get_current_active_user(
     return current_user
 
 
-def get_current_active_superuser(
+async def get_current_active_user_readonly(
+    current_user: models.User = Depends(get_current_user_readonly),
+) -> models.User:
+    if not current_user.is_active:
+        raise HTTPException(status_code=400, detail="Inactive user")
+    return current_user
+
+
+async def get_current_active_superuser(
     current_user: models.User = Depends(get_current_user),
 ) -> models.User:
     if not current_user.is_superuser:
         raise HTTPException(
             status_code=400, detail="The user doesn't have enough privileges"
         )
-    return current_user
\ No newline at end of file
+    return current_user
+
+
+async def hash_password(password: str) -> str:
+    """
+    Hash a password on the password pool, answering 429 when it is full.
+    """
+    try:
+        return await security.hash_password(password)
+    except ExecutorSaturated:
+        raise HTTPException(
+            status_code=429, detail="Too many password changes in progress, try again later"
+        )
@@ -0,0 +1,94 @@
+"""
+Benchmark the per-request overhead of the authentication dependencies.
+
+    python -m app.commands.benchmark_auth --requests 2000
+
+Creates a throwaway user and times, per simulated request, authenticating
+its token the way the endpoints do: loading the full user through a fresh
+session (get_current_user), through get_current_principal on a principal
+cache miss and on a hit, and from claims embedded in the token
+(JWT_EMBED_CLAIMS). Reports latency percentiles of each. Run it with the
+API's database settings; the user is deleted afterwards.
+"""
+import argparse
+import asyncio
+import logging
+import statistics
+import time
+import uuid
+from typing import Awaitable, Callable, Dict, List, Optional
+
+from app.api import deps
+from app.commands.throwaway_users import throwaway_users
+from app.core import security
+from app.core.config import settings
+from app.core.principal import Principal, principal_cache
+from app.db.session import AsyncSessionLocal
+
+logger = logging.getLogger(__name__)
+
+
+async def time_calls(call: Callable[[], Awaitable[object]], count: int) -> List[float]:
+    timings = []
+    for _ in range(count):
+        started = time.perf_counter()
+        await call()
+        timings.append(time.perf_counter() - started)
+    return sorted(timings)
+
+
+async def run(owner_id: uuid.UUID, requests: int) -> None:
+    token = security.create_access_token(owner_id)
+    embedded = security.create_access_token(
+        owner_id, claims=Principal(id=owner_id, is_active=True, is_superuser=False).claims()
+    )
+
+    async def load_user() -> object:
+        # get_write_db + get_current_user: a session and a SELECT per request
+        deps.decode_token(token)
+        async with AsyncSessionLocal() as db:
+            return await deps._load_user(db, owner_id)
+
+    async def cache_miss() -> object:
+        principal_cache.invalidate(owner_id)
+        return await deps.get_current_principal(token)
+
+    async def cache_hit() -> object:
+        return await deps.get_current_principal(token)
+
+    async def embedded_claims() -> object:
+        return await deps.get_current_principal(embedded)
+
+    cases: Dict[str, Callable[[], Awaitable[object]]] = {
+        "full user from the database": load_user,
+        "principal, cache miss": cache_miss,
+        "principal, cache hit": cache_hit,
+        "principal, embedded claims": embedded_claims,
+    }
+    embed_claims = settings.JWT_EMBED_CLAIMS
+    try:
+        for name, call in cases.items():
+            settings.JWT_EMBED_CLAIMS = call is embedded_claims
+            await time_calls(call, min(requests, 50))  # warm up
+            timings = await time_calls(call, requests)
+            quantiles = statistics.quantiles(timings, n=100)
+            logger.info(
+                "%s: p50 %.3fms, p95 %.3fms, p99 %.3fms",
+                name, quantiles[49] * 1000, quantiles[94] * 1000, quantiles[98] * 1000,
+            )
+    finally:
+        settings.JWT_EMBED_CLAIMS = embed_claims
+
+
+def main(argv: Optional[List[str]] = None) -> None:
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--requests", type=int, default=2000, help="Requests timed per case")
+    args = parser.parse_args(argv)
+
+    logging.basicConfig(level=logging.INFO, format="%(asctime)s %(message)s")
+    with throwaway_users("auth-benchmark", 1) as (owner_id,):
+        asyncio.run(run(owner_id, args.requests))
+
+
+if __name__ == "__main__":
+    main()
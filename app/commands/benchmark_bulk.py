@@ -0,0 +1,129 @@
+"""
+Benchmark the bulk food item endpoints against the per-item ones on a running server.
+
+    python -m app.commands.benchmark_bulk --base-url http://localhost:8000 --items 200 --rounds 5
+
+Creates a throwaway user, then for each of --rounds rounds creates, updates
+and deletes --items food items (a grocery order) twice: one request per
+item through POST /food-items/, PUT /food-items/{id} and
+DELETE /food-items/{id}, and --batch-size items per request through
+POST, PATCH and DELETE /food-items/bulk. Reports items/sec of each
+operation for both paths. The user is deleted afterwards. Run it with the
+server's settings (SECRET_KEY and database).
+"""
+import argparse
+import asyncio
+import logging
+import time
+import uuid
+from typing import Dict, List, Optional
+
+import httpx
+
+from app.commands.throwaway_users import throwaway_users
+from app.core import security
+from app.core.config import settings
+
+logger = logging.getLogger(__name__)
+
+PREFIX = f"{settings.API_V1_STR}/food-items"
+
+
+def _items(count: int) -> List[Dict[str, object]]:
+    return [
+        {"name": f"Bulk benchmark {i}", "category": "Pantry", "quantity": 1 + i % 5}
+        for i in range(count)
+    ]
+
+
+def _batches(rows: List, size: int) -> List[List]:
+    return [rows[i:i + size] for i in range(0, len(rows), size)]
+
+
+async def per_item(client: httpx.AsyncClient, count: int, timings: Dict[str, float]) -> None:
+    started = time.perf_counter()
+    ids = []
+    for item in _items(count):
+        response = await client.post(f"{PREFIX}/", json=item)
+        response.raise_for_status()
+        ids.append(response.json()["id"])
+    timings["create"] += time.perf_counter() - started
+
+    started = time.perf_counter()
+    for id in ids:
+        response = await client.put(f"{PREFIX}/{id}", json={"quantity": 9})
+        response.raise_for_status()
+    timings["update"] += time.perf_counter() - started
+
+    started = time.perf_counter()
+    for id in ids:
+        response = await client.delete(f"{PREFIX}/{id}")
+        response.raise_for_status()
+    timings["delete"] += time.perf_counter() - started
+
+
+async def bulk(client: httpx.AsyncClient, count: int, batch_size: int, timings: Dict[str, float]) -> None:
+    started = time.perf_counter()
+    ids = []
+    for batch in _batches(_items(count), batch_size):
+        response = await client.post(f"{PREFIX}/bulk", json={"items": batch})
+        response.raise_for_status()
+        ids.extend(item["id"] for item in response.json()["items"])
+    timings["create"] += time.perf_counter() - started
+
+    started = time.perf_counter()
+    for batch in _batches(ids, batch_size):
+        response = await client.patch(
+            f"{PREFIX}/bulk", json={"items": [{"id": id, "quantity": 9} for id in batch]}
+        )
+        response.raise_for_status()
+    timings["update"] += time.perf_counter() - started
+
+    started = time.perf_counter()
+    for batch in _batches(ids, batch_size):
+        response = await client.request("DELETE", f"{PREFIX}/bulk", json={"ids": batch})
+        response.raise_for_status()
+    timings["delete"] += time.perf_counter() - started
+
+
+async def run(args: argparse.Namespace, owner_id: uuid.UUID) -> None:
+    token = security.create_access_token(owner_id)
+    results = {
+        "per item": dict.fromkeys(("create", "update", "delete"), 0.0),
+        "bulk": dict.fromkeys(("create", "update", "delete"), 0.0),
+    }
+    async with httpx.AsyncClient(
+        base_url=args.base_url, headers={"Authorization": f"Bearer {token}"}, timeout=60.0
+    ) as client:
+        # Warm up connections and caches
+        await bulk(client, min(args.items, 10), args.batch_size, dict.fromkeys(("create", "update", "delete"), 0.0))
+        for _ in range(args.rounds):
+            await per_item(client, args.items, results["per item"])
+            await bulk(client, args.items, args.batch_size, results["bulk"])
+    total = args.items * args.rounds
+    for path, timings in results.items():
+        logger.info(
+            "%s: create %.0f items/sec, update %.0f items/sec, delete %.0f items/sec",
+            path, *(total / max(timings[operation], 1e-9) for operation in ("create", "update", "delete")),
+        )
+
+
+def main(argv: Optional[List[str]] = None) -> None:
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--base-url", default="http://localhost:8000", help="Server to test")
+    parser.add_argument("--items", type=int, default=200, help="Items created, updated and deleted per round")
+    parser.add_argument("--rounds", type=int, default=5, help="Rounds per path")
+    parser.add_argument(
+        "--batch-size", type=int, default=settings.FOOD_ITEM_BULK_MAX_SIZE,
+        help=f"Items per bulk request, at most FOOD_ITEM_BULK_MAX_SIZE ({settings.FOOD_ITEM_BULK_MAX_SIZE})",
+    )
+    args = parser.parse_args(argv)
+
+    logging.basicConfig(level=logging.INFO, format="%(asctime)s %(message)s")
+    logging.getLogger("httpx").setLevel(logging.WARNING)
+    with throwaway_users("bulk-benchmark", 1) as (owner_id,):
+        asyncio.run(run(args, owner_id))
+
+
+if __name__ == "__main__":
+    main()
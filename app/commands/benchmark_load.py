@@ -0,0 +1,151 @@
+"""
+Load test the food item endpoints of a running server with many concurrent clients.
+
+    python -m app.commands.benchmark_load --base-url http://localhost:8000 --clients 500 --duration 60
+
+Creates --users throwaway users with --items food items each, then runs
+--clients concurrent clients for --duration seconds. Each client repeatedly
+sends one request as a random user: a page of GET /food-items/, a
+GET /food-items/{id}, or, with probability --write-ratio, a
+POST /food-items/. Reports requests per second, latency percentiles per
+endpoint and errors. The endpoints and tokens are the same as before the
+async database stack, so running it against an older build of the server
+on the same database gives a like-for-like comparison. The users and
+their items are deleted afterwards. Run it with the server's settings
+(SECRET_KEY and database), and raise the open file limit (ulimit -n) of
+both this process and the server to above --clients first.
+"""
+import argparse
+import asyncio
+import logging
+import random
+import statistics
+import time
+import uuid
+from collections import Counter, defaultdict
+from typing import Dict, List, Optional
+
+import httpx
+from sqlalchemy import insert
+
+from app.commands.throwaway_users import throwaway_users
+from app.core import security
+from app.core.config import settings
+from app.db.session import engine
+from app.models.food_item import FoodItem
+
+logger = logging.getLogger(__name__)
+
+PREFIX = f"{settings.API_V1_STR}/food-items"
+
+
+class Results:
+    def __init__(self) -> None:
+        self.latencies: Dict[str, List[float]] = defaultdict(list)
+        self.errors: Counter = Counter()
+
+
+async def client_loop(
+    client: httpx.AsyncClient,
+    args: argparse.Namespace,
+    tokens: List[str],
+    items: List[List[uuid.UUID]],
+    deadline: float,
+    results: Results,
+) -> None:
+    while time.perf_counter() < deadline:
+        user = random.randrange(len(tokens))
+        headers = {"Authorization": f"Bearer {tokens[user]}"}
+        roll = random.random()
+        if roll < args.write_ratio:
+            name, request = "POST /food-items/", client.post(
+                f"{PREFIX}/", json={"name": "Load test item"}, headers=headers
+            )
+        elif roll < (1 + args.write_ratio) / 2:
+            name, request = "GET /food-items/", client.get(f"{PREFIX}/", params={"limit": 20}, headers=headers)
+        else:
+            name, request = "GET /food-items/{id}", client.get(
+                f"{PREFIX}/{random.choice(items[user])}", headers=headers
+            )
+        started = time.perf_counter()
+        try:
+            response = await request
+        except httpx.HTTPError as e:
+            results.errors[f"{name}: {type(e).__name__}"] += 1
+            continue
+        if response.status_code >= 400:
+            results.errors[f"{name}: HTTP {response.status_code}"] += 1
+        else:
+            results.latencies[name].append(time.perf_counter() - started)
+
+
+async def run(args: argparse.Namespace, owners: List[uuid.UUID], items: List[List[uuid.UUID]]) -> None:
+    tokens = [security.create_access_token(owner_id) for owner_id in owners]
+    results = Results()
+    async with httpx.AsyncClient(
+        base_url=args.base_url,
+        timeout=30.0,
+        limits=httpx.Limits(max_connections=args.clients, max_keepalive_connections=args.clients),
+    ) as client:
+        warm_up = time.perf_counter() + min(args.duration / 10, 5.0)
+        await asyncio.gather(
+            *(client_loop(client, args, tokens, items, warm_up, Results()) for _ in range(args.clients))
+        )
+        started = time.perf_counter()
+        await asyncio.gather(
+            *(
+                client_loop(client, args, tokens, items, started + args.duration, results)
+                for _ in range(args.clients)
+            )
+        )
+        elapsed = time.perf_counter() - started
+
+    everything = sorted(latency for latencies in results.latencies.values() for latency in latencies)
+    if len(everything) < 2:
+        logger.error("Too few successful requests to report on (errors: %s)", dict(results.errors))
+        return
+    for name, latencies in sorted(results.latencies.items()) + [("all", everything)]:
+        if len(latencies) < 2:
+            continue
+        latencies.sort()
+        quantiles = statistics.quantiles(latencies, n=100)
+        logger.info(
+            "%s: %.0f req/s, p50 %.1fms, p95 %.1fms, p99 %.1fms, max %.1fms",
+            name, len(latencies) / elapsed, quantiles[49] * 1000, quantiles[94] * 1000,
+            quantiles[98] * 1000, latencies[-1] * 1000,
+        )
+    logger.info(
+        "%d clients for %.0fs: %d requests, %d errors (%s)",
+        args.clients, elapsed, len(everything) + sum(results.errors.values()), sum(results.errors.values()),
+        ", ".join(f"{error} x{count}" for error, count in results.errors.most_common()) or "none",
+    )
+
+
+def main(argv: Optional[List[str]] = None) -> None:
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--base-url", default="http://localhost:8000", help="Server to test")
+    parser.add_argument("--clients", type=int, default=500, help="Concurrent clients")
+    parser.add_argument("--duration", type=float, default=60.0, help="Seconds to run for, after a warm-up")
+    parser.add_argument("--users", type=int, default=100, help="Users to spread the requests over")
+    parser.add_argument("--items", type=int, default=50, help="Food items per user")
+    parser.add_argument("--write-ratio", type=float, default=0.1, help="Share of requests that create an item")
+    args = parser.parse_args(argv)
+
+    logging.basicConfig(level=logging.INFO, format="%(asctime)s %(message)s")
+    logging.getLogger("httpx").setLevel(logging.WARNING)
+    with throwaway_users("load-benchmark", args.users) as owners:
+        items = [[uuid.uuid4() for _ in range(args.items)] for _ in owners]
+        with engine.begin() as connection:
+            connection.execute(
+                insert(FoodItem),
+                [
+                    {"id": id, "name": f"Load test item {i}", "source": "manual", "owner_id": owner_id}
+                    for owner_id, ids in zip(owners, items)
+                    for i, id in enumerate(ids)
+                ],
+            )
+        asyncio.run(run(args, owners, items))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,94 @@
+"""
+Benchmark offset vs. keyset pagination of GET /food-items/ on a deep listing.
+
+    python -m app.commands.benchmark_pagination --pages 500 --limit 100
+
+Seeds one throwaway user with --pages x --limit generated food items (see
+app.commands.benchmark_search), runs ANALYZE, then times
+crud.food_item.get_multi_by_owner for page 1 and page --pages, both with
+skip/limit and with the `after` cursor of the previous page, and reports
+latency percentiles of each. The seeded user and items are deleted
+afterwards unless --keep is given. Run it against a scratch database with
+migrations applied.
+"""
+import argparse
+import logging
+import statistics
+import time
+import uuid
+from typing import Any, Callable, Dict, List, Optional
+
+from sqlalchemy import select
+
+from app import crud
+from app.commands.benchmark_search import seed
+from app.commands.throwaway_users import throwaway_users
+from app.crud.crud_food_item import ORDER_BY_ADDED
+from app.db.session import SessionLocal
+from app.models.food_item import FoodItem
+
+logger = logging.getLogger(__name__)
+
+
+def cursor_before(owner_id: uuid.UUID, page: int, limit: int) -> Optional[Any]:
+    """
+    The `after` cursor that fetches `page` (1-based), i.e. the sort key of
+    the last row of the page before it.
+    """
+    if page == 1:
+        return None
+    with SessionLocal() as db:
+        return tuple(
+            db.execute(
+                select(*ORDER_BY_ADDED)
+                .where(FoodItem.owner_id == owner_id)
+                .order_by(*ORDER_BY_ADDED)
+                .offset((page - 1) * limit - 1)
+                .limit(1)
+            ).one()
+        )
+
+
+def time_fetch(fetch: Callable[[Any], List[FoodItem]], repeat: int) -> List[float]:
+    timings = []
+    for _ in range(repeat):
+        with SessionLocal() as db:
+            started = time.perf_counter()
+            fetch(db)
+            timings.append(time.perf_counter() - started)
+    return sorted(timings)
+
+
+def main(argv: Optional[List[str]] = None) -> None:
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--pages", type=int, default=500, help="Depth of the last page timed")
+    parser.add_argument("--limit", type=int, default=100, help="Items per page")
+    parser.add_argument("--repeat", type=int, default=200, help="Fetches timed per case")
+    parser.add_argument("--keep", action="store_true", help="Keep the seeded user and items")
+    args = parser.parse_args(argv)
+
+    logging.basicConfig(level=logging.INFO, format="%(asctime)s %(message)s")
+    with throwaway_users("pagination-benchmark", 1, keep=args.keep) as (owner_id,):
+        rows = args.pages * args.limit
+        seed([owner_id], rows, min(rows, 100000))
+        cases: Dict[str, Callable[[Any], List[FoodItem]]] = {}
+        for page in (1, args.pages):
+            after = cursor_before(owner_id, page, args.limit)
+            cases[f"page {page}, offset"] = lambda db, page=page: crud.food_item.get_multi_by_owner(
+                db, owner_id=owner_id, skip=(page - 1) * args.limit, limit=args.limit
+            )
+            cases[f"page {page}, keyset"] = lambda db, after=after: crud.food_item.get_multi_by_owner(
+                db, owner_id=owner_id, limit=args.limit, after=after
+            )
+        for name, fetch in cases.items():
+            time_fetch(fetch, min(args.repeat, 20))  # warm up
+            timings = time_fetch(fetch, args.repeat)
+            quantiles = statistics.quantiles(timings, n=100)
+            logger.info(
+                "%s: p50 %.2fms, p95 %.2fms, p99 %.2fms (%d items)",
+                name, quantiles[49] * 1000, quantiles[94] * 1000, quantiles[98] * 1000, rows,
+            )
+
+
+if __name__ == "__main__":
+    main()
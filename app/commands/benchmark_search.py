@@ -0,0 +1,129 @@
+"""
+Benchmark GET /food-items/search queries on a seeded fooditem table.
+
+    python -m app.commands.benchmark_search --rows 1000000 --owners 1000
+
+Seeds --rows generated food items spread over --owners throwaway users with
+a single INSERT ... SELECT per batch, runs ANALYZE, then times
+crud.food_item.search for random owners and a mix of exact, prefix and
+misspelled queries, and reports latency percentiles together with the plan
+of one query. The seeded users and items are deleted afterwards unless
+--keep is given. Run it against a scratch database with migrations applied.
+"""
+import argparse
+import logging
+import random
+import statistics
+import time
+import uuid
+from typing import List, Optional
+
+from sqlalchemy import text
+
+from app import crud
+from app.commands.throwaway_users import throwaway_users
+from app.core.config import settings
+from app.crud.crud_food_item import _search, _search_limits, _SEARCH_LIMITS
+from app.db.session import SessionLocal, engine
+
+logger = logging.getLogger(__name__)
+
+NOUNS = [
+    "milk", "cheese", "yogurt", "butter", "apple", "banana", "orange", "tomato", "potato",
+    "onion", "carrot", "lettuce", "spinach", "chicken", "beef", "salmon", "tuna", "rice",
+    "pasta", "bread", "cereal", "oats", "beans", "lentils", "coffee", "tea", "juice",
+    "honey", "jam", "peanut butter", "olive oil", "vinegar", "flour", "sugar", "eggs",
+]
+ADJECTIVES = [
+    "organic", "whole", "skimmed", "fresh", "frozen", "smoked", "green", "red", "sweet",
+    "spicy", "wholegrain", "low fat", "greek", "aged", "roasted", "canned", "dried",
+]
+CATEGORIES = ["Dairy", "Produce", "Meat", "Seafood", "Bakery", "Pantry", "Beverages", "Frozen"]
+QUERIES = [
+    "milk", "chee", "organic apple", "smoked salmon", "frozen", "peanut", "greek yog",
+    "chiken", "tomatoe", "bananna", "Dairy", "olive", "whole milk", "spicy beans",
+]
+
+_SEED = """
+INSERT INTO fooditem (id, name, category, quantity, expiration_date, source, added_at, owner_id)
+SELECT gen_random_uuid(),
+       initcap((:adjectives)[1 + floor(random() * cardinality(:adjectives))::int] || ' '
+               || (:nouns)[1 + floor(random() * cardinality(:nouns))::int]),
+       (:categories)[1 + floor(random() * cardinality(:categories))::int],
+       1 + floor(random() * 5)::int,
+       CASE WHEN random() < 0.8 THEN current_date + floor(random() * 60)::int - 10 END,
+       'manual',
+       now() - random() * interval '365 days',
+       (CAST(:owners AS uuid[]))[1 + (i % cardinality(CAST(:owners AS uuid[])))]
+FROM generate_series(1, :count) AS i
+"""
+
+
+def seed(owners: List[uuid.UUID], rows: int, batch_size: int) -> None:
+    started = time.monotonic()
+    done = 0
+    while done < rows:
+        count = min(batch_size, rows - done)
+        with engine.begin() as connection:
+            connection.execute(
+                text(_SEED),
+                {
+                    "adjectives": ADJECTIVES,
+                    "nouns": NOUNS,
+                    "categories": CATEGORIES,
+                    "owners": [str(owner_id) for owner_id in owners],
+                    "count": count,
+                },
+            )
+        done += count
+        logger.info("Seeded %d rows (%.0f rows/sec)", done, done / max(time.monotonic() - started, 1e-9))
+    with engine.connect().execution_options(isolation_level="AUTOCOMMIT") as connection:
+        connection.execute(text("ANALYZE fooditem"))
+
+
+def run_queries(owners: List[uuid.UUID], queries: int, limit: int) -> List[float]:
+    timings = []
+    for _ in range(queries):
+        owner_id, q = random.choice(owners), random.choice(QUERIES)
+        with SessionLocal() as db:
+            started = time.perf_counter()
+            crud.food_item.search(db, q=q, owner_id=owner_id, limit=limit)
+            timings.append(time.perf_counter() - started)
+    return timings
+
+
+def explain(owner_id: uuid.UUID, q: str, limit: int) -> str:
+    with SessionLocal() as db:
+        db.execute(_SEARCH_LIMITS, _search_limits())
+        stmt = _search(q, owner_id, limit).compile(engine, compile_kwargs={"literal_binds": True})
+        plan = db.connection().exec_driver_sql(f"EXPLAIN (ANALYZE, BUFFERS) {stmt}")
+        return "\n".join(row[0] for row in plan)
+
+
+def main(argv: Optional[List[str]] = None) -> None:
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--rows", type=int, default=1000000, help="Food items to seed")
+    parser.add_argument("--owners", type=int, default=1000, help="Users to spread them over")
+    parser.add_argument("--batch-size", type=int, default=100000, help="Rows per INSERT")
+    parser.add_argument("--queries", type=int, default=500, help="Searches to time")
+    parser.add_argument("--limit", type=int, default=20, help="Results per search")
+    parser.add_argument("--keep", action="store_true", help="Keep the seeded users and items")
+    args = parser.parse_args(argv)
+
+    logging.basicConfig(level=logging.INFO, format="%(asctime)s %(message)s")
+    with throwaway_users("search-benchmark", args.owners, keep=args.keep) as owners:
+        seed(owners, args.rows, args.batch_size)
+        run_queries(owners, min(args.queries, 20), args.limit)  # warm up
+        timings = sorted(run_queries(owners, args.queries, args.limit))
+        quantiles = statistics.quantiles(timings, n=100)
+        logger.info(
+            "%d searches over %d rows: p50 %.1fms, p95 %.1fms, p99 %.1fms, max %.1fms "
+            "(statement_timeout %dms)",
+            len(timings), args.rows, quantiles[49] * 1000, quantiles[94] * 1000,
+            quantiles[98] * 1000, timings[-1] * 1000, settings.FOOD_ITEM_SEARCH_TIMEOUT_MS,
+        )
+        logger.info("Plan of %r:\n%s", QUERIES[0], explain(owners[0], QUERIES[0], args.limit))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,161 @@
+"""
+Load test GET /food-items/stream against a running server.
+
+    python -m app.commands.benchmark_stream --base-url http://localhost:8000 --users 500 --streams-per-user 10
+
+Creates --users throwaway users, opens --streams-per-user idle streams for
+each, --batch-size at a time, and holds them open for --idle-seconds, then creates --writes food
+items through the API for random users and reports how long each write
+took to reach every open stream of its owner. Streams that ended early,
+and events beyond those deliveries (i.e. sent to the wrong streams), are
+reported too. The users and
+their items are deleted afterwards. Run it with the server's settings
+(SECRET_KEY and database), and raise the open file limit (ulimit -n) of
+both this process and the server to above the number of streams first.
+"""
+import argparse
+import asyncio
+import logging
+import random
+import statistics
+import time
+import uuid
+from typing import List, Optional
+
+import httpx
+
+from app.commands.throwaway_users import throwaway_users
+from app.core import security
+from app.core.config import settings
+
+logger = logging.getLogger(__name__)
+
+
+class Stream:
+    def __init__(self, owner: int):
+        self.owner = owner
+        self.ready = asyncio.Event()
+        self.received: List[float] = []
+        self.heartbeats = 0
+        self.ended: Optional[str] = None
+
+    async def listen(self, client: httpx.AsyncClient, token: str) -> None:
+        event = None
+        try:
+            async with client.stream(
+                "GET", f"{settings.API_V1_STR}/food-items/stream",
+                headers={"Authorization": f"Bearer {token}"},
+            ) as response:
+                if response.status_code != 200:
+                    self.ended = f"HTTP {response.status_code}"
+                    return
+                async for line in response.aiter_lines():
+                    if line.startswith(":"):
+                        self.heartbeats += 1
+                    elif line.startswith("event: "):
+                        event = line[len("event: "):]
+                    elif line.startswith("data: "):
+                        if event == "ready":
+                            self.ready.set()
+                        elif event == "changes":
+                            self.received.append(time.perf_counter())
+                        else:
+                            self.ended = event
+                self.ended = self.ended or "closed"
+        except httpx.HTTPError as e:
+            self.ended = type(e).__name__
+        finally:
+            self.ready.set()
+
+
+async def run(args: argparse.Namespace, owners: List[uuid.UUID]) -> None:
+    tokens = [security.create_access_token(owner_id) for owner_id in owners]
+    streams = [Stream(i) for i in range(len(owners)) for _ in range(args.streams_per_user)]
+    async with httpx.AsyncClient(
+        base_url=args.base_url,
+        timeout=httpx.Timeout(30.0, read=max(30.0, settings.CHANGE_STREAM_HEARTBEAT_SECONDS * 3)),
+        limits=httpx.Limits(max_connections=None, max_keepalive_connections=None),
+    ) as client:
+        started = time.perf_counter()
+        tasks = []
+        # Open in batches, as clients reconnecting after a deploy would
+        for i in range(0, len(streams), args.batch_size):
+            batch = streams[i:i + args.batch_size]
+            tasks.extend(asyncio.create_task(stream.listen(client, tokens[stream.owner])) for stream in batch)
+            await asyncio.gather(*(stream.ready.wait() for stream in batch))
+        logger.info(
+            "Opened %d streams in %.1fs, %d failed",
+            len(streams), time.perf_counter() - started, sum(stream.ended is not None for stream in streams),
+        )
+
+        await asyncio.sleep(args.idle_seconds)
+        logger.info(
+            "After %.0fs idle: %d streams open, %d heartbeats",
+            args.idle_seconds, sum(stream.ended is None for stream in streams),
+            sum(stream.heartbeats for stream in streams),
+        )
+
+        latencies: List[float] = []
+        for i in range(args.writes):
+            owner = random.randrange(len(owners))
+            targets = [stream for stream in streams if stream.owner == owner and stream.ended is None]
+            seen = [len(stream.received) for stream in targets]
+            started = time.perf_counter()
+            response = await client.post(
+                f"{settings.API_V1_STR}/food-items/",
+                json={"name": f"Stream benchmark {i}"},
+                headers={"Authorization": f"Bearer {tokens[owner]}"},
+            )
+            response.raise_for_status()
+            deadline = started + 10.0
+            while time.perf_counter() < deadline and any(
+                len(stream.received) == n for stream, n in zip(targets, seen)
+            ):
+                await asyncio.sleep(0.005)
+            latencies.extend(
+                stream.received[n] - started for stream, n in zip(targets, seen) if len(stream.received) > n
+            )
+            await asyncio.sleep(args.interval)
+
+        for task in tasks:
+            task.cancel()
+        await asyncio.gather(*tasks, return_exceptions=True)
+
+    if len(latencies) > 1:
+        latencies.sort()
+        quantiles = statistics.quantiles(latencies, n=100)
+        logger.info(
+            "%d deliveries: p50 %.1fms, p95 %.1fms, p99 %.1fms, max %.1fms",
+            len(latencies), quantiles[49] * 1000, quantiles[94] * 1000,
+            quantiles[98] * 1000, latencies[-1] * 1000,
+        )
+    logger.info(
+        "%d events received for %d deliveries, %d streams ended early (%s)",
+        sum(len(stream.received) for stream in streams), len(latencies),
+        sum(stream.ended is not None for stream in streams),
+        ", ".join(sorted({stream.ended for stream in streams if stream.ended})) or "none",
+    )
+
+
+def main(argv: Optional[List[str]] = None) -> None:
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--base-url", default="http://localhost:8000", help="Server to test")
+    parser.add_argument("--users", type=int, default=500, help="Users to create")
+    parser.add_argument(
+        "--streams-per-user", type=int, default=10,
+        help=f"Streams per user, at most CHANGE_STREAM_MAX_PER_USER ({settings.CHANGE_STREAM_MAX_PER_USER})",
+    )
+    parser.add_argument("--batch-size", type=int, default=200, help="Streams to open at a time")
+    parser.add_argument("--idle-seconds", type=float, default=60.0, help="How long to hold the streams idle")
+    parser.add_argument("--writes", type=int, default=200, help="Food items to create")
+    parser.add_argument("--interval", type=float, default=0.05, help="Seconds between writes")
+    args = parser.parse_args(argv)
+
+    logging.basicConfig(level=logging.INFO, format="%(asctime)s %(message)s")
+    logging.getLogger("httpx").setLevel(logging.WARNING)
+    with throwaway_users("stream-benchmark", args.users) as owners:
+        asyncio.run(run(args, owners))
+
+
+if __name__ == "__main__":
+    main()
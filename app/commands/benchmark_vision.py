@@ -0,0 +1,225 @@
+"""
+Benchmark GET /food-items/ latency on a running server while image analysis requests are in flight.
+
+    python -m app.commands.benchmark_vision --base-url http://localhost:8000 --stub-port 8100
+
+Starts a stub of the OpenAI chat completions API on --stub-port that answers
+every request after --vision-delay seconds, so start the server with
+OPENAI_BASE_URL=http://127.0.0.1:<stub-port>/v1 and any OPENAI_API_KEY.
+Creates a throwaway user, generates --images distinct photo-sized JPEGs
+(distinct enough to miss the image result cache), then runs --list-clients
+clients paging GET /food-items/ for --duration seconds twice: alone, and
+with --vision-clients clients uploading images to POST /image-analysis/ the
+whole time. Reports the listing latency percentiles of both phases, which
+should stay about the same, and how many analyses finished, were turned
+away with 429 or failed. The user is deleted afterwards. Run it with the
+server's settings (SECRET_KEY and database).
+"""
+import argparse
+import asyncio
+import io
+import itertools
+import logging
+import random
+import statistics
+import time
+import uuid
+from collections import Counter
+from typing import Any, Dict, Iterator, List, Optional
+
+import httpx
+import uvicorn
+from fastapi import FastAPI
+from PIL import Image
+
+from app.commands.throwaway_users import throwaway_users
+from app.core import security
+from app.core.config import settings
+
+logger = logging.getLogger(__name__)
+
+
+class Stub:
+    """
+    Stand-in for the OpenAI chat completions API that answers with a fixed
+    food item after `delay` seconds and records how many requests it holds.
+    """
+
+    def __init__(self, delay: float):
+        self.delay = delay
+        self.requests = 0
+        self.in_flight = 0
+        self.max_in_flight = 0
+        self.app = FastAPI()
+        self.app.post("/v1/chat/completions")(self.chat_completions)
+
+    async def chat_completions(self) -> Dict[str, Any]:
+        self.requests += 1
+        self.in_flight += 1
+        self.max_in_flight = max(self.max_in_flight, self.in_flight)
+        try:
+            await asyncio.sleep(self.delay)
+        finally:
+            self.in_flight -= 1
+        return {
+            "id": f"chatcmpl-{uuid.uuid4().hex}",
+            "object": "chat.completion",
+            "created": int(time.time()),
+            "model": settings.OPENAI_VISION_MODEL,
+            "choices": [
+                {
+                    "index": 0,
+                    "message": {
+                        "role": "assistant",
+                        "content": '{"name": "Milk", "category": "Dairy", "estimated_expiration_days": 7}',
+                    },
+                    "finish_reason": "stop",
+                }
+            ],
+        }
+
+
+def make_images(count: int) -> List[bytes]:
+    """
+    Photo-sized JPEGs of random coloured blocks: cheap to generate, but big
+    enough that the server has to downscale and re-encode them, and with
+    unrelated dHashes so that none is served from the result cache.
+    """
+    images = []
+    for _ in range(count):
+        blocks = Image.new("RGB", (16, 12))
+        blocks.putdata([tuple(random.randrange(256) for _ in range(3)) for _ in range(16 * 12)])
+        buffer = io.BytesIO()
+        blocks.resize((3200, 2400), Image.NEAREST).save(buffer, format="JPEG", quality=90)
+        images.append(buffer.getvalue())
+    return images
+
+
+async def list_loop(client: httpx.AsyncClient, deadline: float, latencies: List[float], errors: Counter) -> None:
+    while time.perf_counter() < deadline:
+        started = time.perf_counter()
+        try:
+            response = await client.get(f"{settings.API_V1_STR}/food-items/", params={"limit": 20})
+        except httpx.HTTPError as e:
+            errors[f"GET /food-items/: {type(e).__name__}"] += 1
+            continue
+        if response.status_code >= 400:
+            errors[f"GET /food-items/: HTTP {response.status_code}"] += 1
+        else:
+            latencies.append(time.perf_counter() - started)
+
+
+async def vision_loop(client: httpx.AsyncClient, images: Iterator[bytes], stop: asyncio.Event, results: Counter) -> None:
+    while not stop.is_set():
+        try:
+            response = await client.post(
+                f"{settings.API_V1_STR}/image-analysis/",
+                files={"file": ("photo.jpg", next(images), "image/jpeg")},
+            )
+        except httpx.HTTPError as e:
+            results[type(e).__name__] += 1
+            continue
+        if response.status_code == 429:
+            results["429"] += 1
+            # As a client would, back off instead of hammering the server
+            await asyncio.sleep(0.1)
+        elif response.status_code >= 400:
+            results[f"HTTP {response.status_code}"] += 1
+        else:
+            results["ok"] += 1
+
+
+def report(phase: str, latencies: List[float], errors: Counter) -> None:
+    if len(latencies) < 2:
+        logger.error("%s: too few successful requests to report on (errors: %s)", phase, dict(errors))
+        return
+    latencies.sort()
+    quantiles = statistics.quantiles(latencies, n=100)
+    logger.info(
+        "%s: GET /food-items/ %d requests, p50 %.1fms, p95 %.1fms, p99 %.1fms, max %.1fms, %d errors",
+        phase, len(latencies), quantiles[49] * 1000, quantiles[94] * 1000, quantiles[98] * 1000,
+        latencies[-1] * 1000, sum(errors.values()),
+    )
+
+
+async def run(args: argparse.Namespace, owner_id: uuid.UUID) -> None:
+    stub = Stub(args.vision_delay)
+    server = uvicorn.Server(uvicorn.Config(stub.app, host="127.0.0.1", port=args.stub_port, log_level="warning"))
+    serving = asyncio.create_task(server.serve())
+    while not server.started:
+        if serving.done():
+            serving.result()
+        await asyncio.sleep(0.01)
+
+    images = itertools.cycle(await asyncio.get_running_loop().run_in_executor(None, make_images, args.images))
+    token = security.create_access_token(owner_id)
+    try:
+        async with httpx.AsyncClient(
+            base_url=args.base_url, headers={"Authorization": f"Bearer {token}"}, timeout=60.0,
+            limits=httpx.Limits(max_connections=None, max_keepalive_connections=None),
+        ) as client:
+            warm_up = time.perf_counter() + 2.0
+            await asyncio.gather(*(list_loop(client, warm_up, [], Counter()) for _ in range(args.list_clients)))
+
+            latencies: List[float] = []
+            errors: Counter = Counter()
+            deadline = time.perf_counter() + args.duration
+            await asyncio.gather(*(list_loop(client, deadline, latencies, errors) for _ in range(args.list_clients)))
+            report("idle", latencies, errors)
+
+            stop = asyncio.Event()
+            analyses: Counter = Counter()
+            vision = [
+                asyncio.create_task(vision_loop(client, images, stop, analyses)) for _ in range(args.vision_clients)
+            ]
+            # Let the uploads fill the image pool and the stub before measuring
+            await asyncio.sleep(args.vision_delay)
+            loaded_latencies: List[float] = []
+            loaded_errors: Counter = Counter()
+            deadline = time.perf_counter() + args.duration
+            await asyncio.gather(
+                *(list_loop(client, deadline, loaded_latencies, loaded_errors) for _ in range(args.list_clients))
+            )
+            stop.set()
+            await asyncio.gather(*vision)
+            report(f"{args.vision_clients} vision clients", loaded_latencies, loaded_errors)
+    finally:
+        server.should_exit = True
+        await serving
+
+    logger.info(
+        "Image analysis: %d finished, %d turned away with 429, %d failed (%s); "
+        "%d vision API requests, at most %d in flight",
+        analyses["ok"], analyses["429"], sum(analyses.values()) - analyses["ok"] - analyses["429"],
+        ", ".join(f"{error} x{count}" for error, count in analyses.items() if error not in ("ok", "429")) or "none",
+        stub.requests, stub.max_in_flight,
+    )
+    if len(latencies) > 1 and len(loaded_latencies) > 1:
+        logger.info(
+            "p99 with vision load / idle: %.2fx",
+            statistics.quantiles(loaded_latencies, n=100)[98] / statistics.quantiles(latencies, n=100)[98],
+        )
+
+
+def main(argv: Optional[List[str]] = None) -> None:
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--base-url", default="http://localhost:8000", help="Server to test")
+    parser.add_argument(
+        "--stub-port", type=int, default=8100,
+        help="Port of the stub vision API, which the server's OPENAI_BASE_URL must point at",
+    )
+    parser.add_argument("--vision-delay", type=float, default=2.0, help="Seconds the stub takes per analysis")
+    parser.add_argument("--vision-clients", type=int, default=16, help="Concurrent image uploads")
+    parser.add_argument("--list-clients", type=int, default=4, help="Concurrent GET /food-items/ clients")
+    parser.add_argument("--duration", type=float, default=20.0, help="Seconds per phase")
+    parser.add_argument("--images", type=int, default=200, help="Distinct images to upload")
+    args = parser.parse_args(argv)
+
+    logging.basicConfig(level=logging.INFO, format="%(asctime)s %(message)s")
+    logging.getLogger("httpx").setLevel(logging.WARNING)
+    with throwaway_users("vision-benchmark", 1) as (owner_id,):
+        asyncio.run(run(args, owner_id))
+
+
+if __name__ == "__main__":
+    main()
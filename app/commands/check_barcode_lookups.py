@@ -0,0 +1,207 @@
+"""
+Check the barcode lookup path against a local stub of the Open Food Facts API.
+
+    python -m app.commands.check_barcode_lookups
+
+Starts a stub API on a local port, points OPEN_FOOD_FACTS_API_URL at it and
+runs lookup_product / lookup_products through the shared HTTP client, with
+an empty in-process cache and no shared tier or catalog, so no database,
+Redis or network access is needed. Checks found and unknown products,
+upstream errors, unparseable responses and read timeouts, that cached and
+concurrent lookups of a barcode make a single upstream request, and that a
+batch stays within BARCODE_BATCH_CONCURRENCY / HTTP_MAX_CONNECTIONS_PER_HOST
+requests in flight over kept-alive connections. Exits with status 1 if any
+check fails.
+"""
+import argparse
+import asyncio
+import logging
+import socket
+import sys
+from collections import Counter
+from typing import Any, Awaitable, Callable, Dict, List, Optional, Set, Tuple
+
+import httpx
+import uvicorn
+from fastapi import FastAPI, Request
+from fastapi.responses import PlainTextResponse
+
+from app.core import barcode, http
+from app.core.config import settings
+
+logger = logging.getLogger(__name__)
+
+FOUND = "3017620422003"
+UNKNOWN = "0000000000000"
+FAILING = "5000000000000"
+GARBLED = "4000000000000"
+HANGING = "9000000000000"
+SLOW_DELAY_SECONDS = 0.1
+
+
+class Stub:
+    """
+    Stand-in for the Open Food Facts product API that records what it is
+    asked. Barcodes starting with "slow" answer after SLOW_DELAY_SECONDS.
+    """
+
+    def __init__(self, read_timeout: float):
+        self.read_timeout = read_timeout
+        self.requests: Counter = Counter()
+        self.connections: Set[Tuple[str, int]] = set()
+        self.in_flight = 0
+        self.max_in_flight = 0
+        self.app = FastAPI()
+        self.app.get("/product/{barcode}.json")(self.product)
+
+    async def product(self, barcode: str, request: Request) -> Any:
+        self.requests[barcode] += 1
+        self.connections.add((request.client.host, request.client.port))
+        self.in_flight += 1
+        self.max_in_flight = max(self.max_in_flight, self.in_flight)
+        try:
+            if barcode.startswith("slow"):
+                await asyncio.sleep(SLOW_DELAY_SECONDS)
+            elif barcode == HANGING:
+                await asyncio.sleep(self.read_timeout * 2)
+            elif barcode == FAILING:
+                return PlainTextResponse("upstream down", status_code=500)
+            elif barcode == GARBLED:
+                return PlainTextResponse("<html>maintenance</html>")
+            if barcode == UNKNOWN:
+                return {"status": 0, "status_verbose": "product not found"}
+            return {
+                "status": 1,
+                "product": {"product_name": f"Product {barcode}", "categories_tags": ["en:snacks"]},
+            }
+        finally:
+            self.in_flight -= 1
+
+    def reset(self) -> None:
+        self.requests.clear()
+        self.connections.clear()
+        self.max_in_flight = 0
+
+
+async def _raises(call: Awaitable[Any], error: type) -> bool:
+    try:
+        await call
+    except error:
+        return True
+    return False
+
+
+async def run_checks(stub: Stub) -> List[str]:
+    async def found() -> bool:
+        item = await barcode.lookup_product(FOUND)
+        return item is not None and item.name == f"Product {FOUND}" and item.category == "snacks"
+
+    async def cached() -> bool:
+        await barcode.lookup_product(FOUND)
+        return stub.requests[FOUND] == 1
+
+    async def unknown() -> bool:
+        return await barcode.lookup_product(UNKNOWN) is None
+
+    async def upstream_error() -> bool:
+        return await _raises(barcode.lookup_product(FAILING), httpx.HTTPStatusError)
+
+    async def garbled() -> bool:
+        return await _raises(barcode.lookup_product(GARBLED), httpx.DecodingError)
+
+    async def timeout() -> bool:
+        return await _raises(barcode.lookup_product(HANGING), httpx.ReadTimeout)
+
+    async def coalesced() -> bool:
+        results = await asyncio.gather(*(barcode.lookup_product("slow-shared") for _ in range(20)))
+        return all(item is not None for item in results) and stub.requests["slow-shared"] == 1
+
+    async def batch() -> bool:
+        stub.reset()
+        codes = [f"slow-{i}" for i in range(30)] + [FOUND, UNKNOWN, FAILING, GARBLED]
+        results = {code: result async for code, result in barcode.lookup_products(codes + codes[:5])}
+        limit = min(settings.BARCODE_BATCH_CONCURRENCY, settings.HTTP_MAX_CONNECTIONS_PER_HOST)
+        logger.info(
+            "batch: %d upstream requests, at most %d in flight (limit %d), over %d connections",
+            sum(stub.requests.values()), stub.max_in_flight, limit, len(stub.connections),
+        )
+        return (
+            set(results) == set(codes)
+            and all(results[code] is not None for code in codes[:30])
+            and results[UNKNOWN] is None
+            and isinstance(results[FAILING], httpx.HTTPStatusError)
+            and isinstance(results[GARBLED], httpx.DecodingError)
+            and stub.max_in_flight <= limit
+            and len(stub.connections) <= limit
+        )
+
+    # timeout last, as the stub keeps serving the abandoned request
+    checks: Dict[str, Callable[[], Awaitable[bool]]] = {
+        "found": found,
+        "cached": cached,
+        "unknown": unknown,
+        "upstream error": upstream_error,
+        "unparseable response": garbled,
+        "coalesced": coalesced,
+        "batch": batch,
+        "timeout": timeout,
+    }
+    failed = []
+    for name, check in checks.items():
+        try:
+            ok = await check()
+        except Exception:
+            logger.exception("%s: raised", name)
+            ok = False
+        if ok:
+            logger.info("%s: ok", name)
+        else:
+            failed.append(name)
+            logger.error("%s: failed", name)
+    return failed
+
+
+async def run(read_timeout: float) -> List[str]:
+    stub = Stub(read_timeout)
+    with socket.socket() as sock:
+        sock.bind(("127.0.0.1", 0))
+        port = sock.getsockname()[1]
+    server = uvicorn.Server(uvicorn.Config(stub.app, host="127.0.0.1", port=port, log_level="warning"))
+    serving = asyncio.create_task(server.serve())
+    while not server.started:
+        if serving.done():
+            serving.result()
+        await asyncio.sleep(0.01)
+
+    settings.OPEN_FOOD_FACTS_API_URL = f"http://127.0.0.1:{port}"
+    settings.HTTP_READ_TIMEOUT_SECONDS = read_timeout
+    settings.PRODUCT_CATALOG_ENABLED = False
+    settings.BARCODE_SHARED_LOCK = False
+    barcode.barcode_cache = barcode.BarcodeCache(shared=None)
+    await http.init_http_client()
+    try:
+        return await run_checks(stub)
+    finally:
+        await http.close_http_client()
+        server.should_exit = True
+        await serving
+
+
+def main(argv: Optional[List[str]] = None) -> None:
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument(
+        "--read-timeout", type=float, default=1.0,
+        help="HTTP_READ_TIMEOUT_SECONDS for the check; the stub hangs for twice as long",
+    )
+    args = parser.parse_args(argv)
+
+    logging.basicConfig(level=logging.INFO, format="%(asctime)s %(message)s")
+    logging.getLogger("httpx").setLevel(logging.WARNING)
+    failed = asyncio.run(run(args.read_timeout))
+    if failed:
+        logger.error("Failed checks: %s", ", ".join(failed))
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
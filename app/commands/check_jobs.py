@@ -0,0 +1,215 @@
+"""
+Check the background job queue with the in-process backend.
+
+    python -m app.commands.check_jobs
+
+Runs a JobQueue on the memory backend (JOB_BACKEND=memory) with a scripted
+handler, so no database, Redis or vision API is needed. Checks status
+polling from queued through running to succeeded, retries of retryable
+errors with exponential backoff (JOB_RETRY_BACKOFF_SECONDS, shortened to
+--backoff), giving up after JOB_MAX_ATTEMPTS, failing other errors without
+a retry, the per-user cap of JOB_MAX_ACTIVE_PER_USER queued or running jobs
+and its release once a job finishes, and the JOB_QUEUE_MAX limit. Exits
+with status 1 if any check fails.
+"""
+import argparse
+import asyncio
+import logging
+import sys
+import time
+from collections import defaultdict
+from typing import Any, Awaitable, Callable, Dict, List, Optional, Tuple
+
+from app.core.config import settings
+from app.core.jobs import JobQueue, QueueFull
+
+logger = logging.getLogger(__name__)
+
+WORKERS = 2
+MAX_ATTEMPTS = 3
+MAX_ACTIVE_PER_USER = 2
+QUEUE_MAX = 3
+
+
+class Retryable(Exception):
+    pass
+
+
+class Handler:
+    """
+    Job handler driven by the job's params: it sleeps for `delay` seconds,
+    then raises Retryable (or ValueError with `fatal`) for the first `fail`
+    attempts. Records when each job's attempts started.
+    """
+
+    def __init__(self):
+        self.attempts: Dict[str, List[float]] = defaultdict(list)
+
+    async def __call__(self, params: Dict[str, Any], payload: bytes) -> Dict[str, Any]:
+        attempts = self.attempts[params["key"]]
+        attempts.append(time.monotonic())
+        await asyncio.sleep(params.get("delay", 0))
+        if len(attempts) <= params.get("fail", 0):
+            if params.get("fatal"):
+                raise ValueError(f"fatal error on attempt {len(attempts)}")
+            raise Retryable(f"retryable error on attempt {len(attempts)}")
+        return {"key": params["key"], "size": len(payload)}
+
+
+async def _raises(call: Awaitable[Any], error: type) -> bool:
+    try:
+        await call
+    except error:
+        return True
+    return False
+
+
+async def run_checks(queue: JobQueue, handler: Handler, backoff: float) -> List[str]:
+    async def submit(key: str, owner_id: str = "owner", **params: Any) -> Dict[str, Any]:
+        return await queue.submit(owner_id=owner_id, params={"key": key, **params}, payload=b"image")
+
+    async def poll(job_id: str, timeout: float = 10.0) -> Tuple[Optional[Dict[str, Any]], List[str]]:
+        # As a client polling GET /image-analysis/jobs/{job_id} would
+        statuses: List[str] = []
+        deadline = time.monotonic() + timeout
+        while time.monotonic() < deadline:
+            job = await queue.get(job_id)
+            if job is None:
+                return None, statuses
+            if not statuses or statuses[-1] != job["status"]:
+                statuses.append(job["status"])
+            if job["finished_at"] is not None:
+                return job, statuses
+            await asyncio.sleep(0.005)
+        return job, statuses
+
+    async def status_polling() -> bool:
+        job = await submit("polled", delay=0.2)
+        finished, statuses = await poll(job["id"])
+        logger.info("status polling: %s", " -> ".join(statuses))
+        return (
+            job["status"] == "queued"
+            and finished is not None
+            and statuses[-2:] == ["running", "succeeded"]
+            and finished["result"] == {"key": "polled", "size": 5}
+            and finished["attempts"] == 1
+        )
+
+    async def unknown_job() -> bool:
+        return await queue.get("0" * 32) is None
+
+    async def retried_with_backoff() -> bool:
+        job = await submit("flaky", fail=MAX_ATTEMPTS - 1)
+        finished, _ = await poll(job["id"])
+        started = handler.attempts["flaky"]
+        gaps = [b - a for a, b in zip(started, started[1:])]
+        logger.info(
+            "retries: attempts %s apart (backoff %.0fms, doubling)",
+            ", ".join(f"{gap * 1000:.0f}ms" for gap in gaps), backoff * 1000,
+        )
+        return (
+            finished is not None
+            and finished["status"] == "succeeded"
+            and finished["attempts"] == MAX_ATTEMPTS
+            and len(gaps) == 2
+            and gaps[0] >= backoff
+            and gaps[1] >= 2 * backoff
+        )
+
+    async def gives_up() -> bool:
+        job = await submit("broken", fail=MAX_ATTEMPTS + 1)
+        finished, _ = await poll(job["id"])
+        return (
+            finished is not None
+            and finished["status"] == "failed"
+            and finished["attempts"] == MAX_ATTEMPTS
+            and finished["error"] == f"retryable error on attempt {MAX_ATTEMPTS}"
+            and finished["result"] is None
+        )
+
+    async def not_retried() -> bool:
+        job = await submit("fatal", fail=1, fatal=True)
+        finished, _ = await poll(job["id"])
+        return (
+            finished is not None
+            and finished["status"] == "failed"
+            and finished["attempts"] == 1
+            and finished["error"] == "fatal error on attempt 1"
+        )
+
+    async def per_user_cap() -> bool:
+        jobs = [await submit(f"capped-{i}", owner_id="capped", delay=0.3) for i in range(MAX_ACTIVE_PER_USER)]
+        capped = await _raises(submit("capped-over", owner_id="capped"), QueueFull)
+        other = await submit("other-user", owner_id="other")
+        for job in jobs + [other]:
+            await poll(job["id"])
+        # Finished jobs give their slots back
+        released = await submit("capped-again", owner_id="capped")
+        finished, _ = await poll(released["id"])
+        return capped and finished is not None and finished["status"] == "succeeded"
+
+    async def queue_full() -> bool:
+        # Keep every worker busy, then fill the queue behind them
+        busy = [await submit(f"busy-{i}", owner_id=f"busy-{i}", delay=0.3) for i in range(WORKERS)]
+        await asyncio.sleep(0.05)
+        queued = [await submit(f"queued-{i}", owner_id=f"queued-{i}") for i in range(QUEUE_MAX)]
+        full = await _raises(submit("overflow", owner_id="overflow"), QueueFull)
+        finished = [(await poll(job["id"]))[0] for job in busy + queued]
+        return full and all(job is not None and job["status"] == "succeeded" for job in finished)
+
+    checks: Dict[str, Callable[[], Awaitable[bool]]] = {
+        "status polling": status_polling,
+        "unknown job": unknown_job,
+        "retried with backoff": retried_with_backoff,
+        "gives up after JOB_MAX_ATTEMPTS": gives_up,
+        "other errors not retried": not_retried,
+        "per-user cap": per_user_cap,
+        "queue full": queue_full,
+    }
+    failed = []
+    for name, check in checks.items():
+        try:
+            ok = await check()
+        except Exception:
+            logger.exception("%s: raised", name)
+            ok = False
+        if ok:
+            logger.info("%s: ok", name)
+        else:
+            failed.append(name)
+            logger.error("%s: failed", name)
+    return failed
+
+
+async def run(backoff: float) -> List[str]:
+    settings.JOB_BACKEND = "memory"
+    settings.JOB_WORKERS = WORKERS
+    settings.JOB_MAX_ATTEMPTS = MAX_ATTEMPTS
+    settings.JOB_MAX_ACTIVE_PER_USER = MAX_ACTIVE_PER_USER
+    settings.JOB_QUEUE_MAX = QUEUE_MAX
+    settings.JOB_RETRY_BACKOFF_SECONDS = backoff
+    handler = Handler()
+    queue = JobQueue("check", handler, retry_on=(Retryable,))
+    await queue.start()
+    try:
+        return await run_checks(queue, handler, backoff)
+    finally:
+        await queue.stop()
+
+
+def main(argv: Optional[List[str]] = None) -> None:
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument(
+        "--backoff", type=float, default=0.1, help="JOB_RETRY_BACKOFF_SECONDS for the check"
+    )
+    args = parser.parse_args(argv)
+
+    logging.basicConfig(level=logging.INFO, format="%(asctime)s %(message)s")
+    failed = asyncio.run(run(args.backoff))
+    if failed:
+        logger.error("Failed checks: %s", ", ".join(failed))
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
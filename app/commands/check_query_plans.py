@@ -0,0 +1,116 @@
+"""
+Check that owner-scoped food item queries use indexes on a large fooditem table.
+
+    python -m app.commands.check_query_plans --rows 1000000 --owners 1000
+
+Seeds --rows generated food items spread over --owners throwaway users (see
+app.commands.benchmark_search), runs ANALYZE, then EXPLAINs the statements
+behind GET /food-items/ (first and keyset pages), ?category=,
+/barcode/{barcode}, /expiring-soon/ and /search for one of the owners. Exits
+with status 1, printing the offending plans, if any of them reads fooditem
+or expirationalert with a sequential scan, so it can run in CI against a
+scratch database with migrations applied. The seeded users and items are
+deleted afterwards unless --keep is given.
+"""
+import argparse
+import json
+import logging
+import sys
+import uuid
+from datetime import date, datetime
+from typing import Any, Dict, Iterator, List, Optional
+
+from sqlalchemy.sql import Select
+
+from app.commands.benchmark_search import CATEGORIES, seed
+from app.commands.throwaway_users import throwaway_users
+from app.crud.crud_food_item import (
+    _SEARCH_LIMITS,
+    _by_barcode,
+    _by_category,
+    _by_owner,
+    _expiring_soon,
+    _search,
+    _search_limits,
+)
+from app.db.session import engine
+
+logger = logging.getLogger(__name__)
+
+# Tables that grow with the number of items; small tables such as
+# expirationalertshard may be scanned
+LARGE_TABLES = {"fooditem", "expirationalert"}
+
+
+def statements(owner_id: uuid.UUID) -> Dict[str, Select]:
+    last_page = (datetime(2000, 1, 1), uuid.UUID(int=0))
+    return {
+        "list": _by_owner(owner_id, 0, 100, None),
+        "list (keyset page)": _by_owner(owner_id, 0, 100, last_page),
+        "category": _by_category(CATEGORIES[0], owner_id, 0, 100, None),
+        "barcode": _by_barcode("0000000000000", owner_id),
+        "expiring soon": _expiring_soon(7, owner_id, 0, 100, None),
+        "expiring soon (keyset page)": _expiring_soon(7, owner_id, 0, 100, (date.today(), uuid.UUID(int=0))),
+        "search": _search("milk", owner_id, 20),
+    }
+
+
+def _nodes(plan: Dict[str, Any]) -> Iterator[Dict[str, Any]]:
+    yield plan
+    for child in plan.get("Plans", []):
+        yield from _nodes(child)
+
+
+def _explain(stmt: Select, options: str = "") -> List[Any]:
+    sql = str(stmt.compile(engine, compile_kwargs={"literal_binds": True}))
+    with engine.connect() as connection:
+        # Session settings the search query relies on
+        connection.execute(_SEARCH_LIMITS, _search_limits())
+        return [row[0] for row in connection.exec_driver_sql(f"EXPLAIN {options}{sql}")]
+
+
+def sequential_scans(stmt: Select) -> List[str]:
+    """
+    Tables in LARGE_TABLES that the plan of `stmt` scans sequentially.
+    """
+    plan = _explain(stmt, "(FORMAT JSON) ")[0]
+    if isinstance(plan, str):
+        plan = json.loads(plan)
+    return [
+        node["Relation Name"]
+        for node in _nodes(plan[0]["Plan"])
+        if node["Node Type"] == "Seq Scan" and node.get("Relation Name") in LARGE_TABLES
+    ]
+
+
+def explain(stmt: Select) -> str:
+    return "\n".join(_explain(stmt))
+
+
+def main(argv: Optional[List[str]] = None) -> None:
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--rows", type=int, default=1000000, help="Food items to seed")
+    parser.add_argument("--owners", type=int, default=1000, help="Users to spread them over")
+    parser.add_argument("--batch-size", type=int, default=100000, help="Rows per INSERT")
+    parser.add_argument("--keep", action="store_true", help="Keep the seeded users and items")
+    args = parser.parse_args(argv)
+
+    logging.basicConfig(level=logging.INFO, format="%(asctime)s %(message)s")
+    failed = []
+    with throwaway_users("plan-check", args.owners, keep=args.keep) as owners:
+        checked = statements(owners[0])
+        seed(owners, args.rows, args.batch_size)
+        for name, stmt in checked.items():
+            scans = sequential_scans(stmt)
+            if scans:
+                failed.append(name)
+                logger.error("%s: sequential scan of %s\n%s", name, ", ".join(scans), explain(stmt))
+            else:
+                logger.info("%s: ok", name)
+    if failed:
+        logger.error("Sequential scans in %d of %d queries: %s", len(failed), len(checked), ", ".join(failed))
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,239 @@
+"""
+Check read replica routing, read-your-writes stickiness and health fallback.
+
+    python -m app.commands.check_replica_routing --replica-uri postgresql://postgres@replica/foodinventory
+
+Puts a local TCP proxy in front of --replica-uri (by default the primary
+database itself, reached over a second connection) so that the replica can
+be taken down and brought back, and routes read-only sessions through a
+ReplicaSet of it the way deps.get_read_db does. Checks that reads are spread
+round-robin over healthy replicas, that a user who just committed a write
+through a get_write_db style session reads from the primary for
+DB_READ_YOUR_WRITES_SECONDS (shortened to --window) while others stay on
+the replicas, that unreachable replicas are skipped, and that reads fall
+back to the primary while the replica is down and return to it once it is
+back. Run it with the API's database settings; the two throwaway users it
+writes as are deleted afterwards. Exits with status 1 if any check fails.
+"""
+import argparse
+import asyncio
+import logging
+import socket
+import sys
+import time
+import uuid
+from typing import Awaitable, Callable, Dict, List, Optional, Set, Tuple
+
+from sqlalchemy import text
+from sqlalchemy.engine import URL, make_url
+from sqlalchemy.ext.asyncio import AsyncEngine
+
+from app import crud
+from app.commands.throwaway_users import throwaway_users
+from app.core.config import settings
+from app.db import replicas as replicas_module
+from app.db.replicas import ReplicaSet
+from app.db.session import AsyncSessionLocal, async_engine
+from app.schemas.food_item import FoodItemCreate
+
+logger = logging.getLogger(__name__)
+
+Streams = Tuple[asyncio.StreamReader, asyncio.StreamWriter]
+
+
+class ReplicaProxy:
+    """
+    Forwards connections on a local port to the replica's server, and can
+    be stopped (closing every forwarded connection) and started again on
+    the same port to simulate an outage.
+    """
+
+    def __init__(self, connect: Callable[[], Awaitable[Streams]]):
+        self.connect = connect
+        self.port = _free_port()
+        self.server: Optional[asyncio.AbstractServer] = None
+        self.writers: Set[asyncio.StreamWriter] = set()
+
+    async def start(self) -> None:
+        self.server = await asyncio.start_server(self._forward, "127.0.0.1", self.port)
+
+    async def stop(self) -> None:
+        if self.server is not None:
+            self.server.close()
+            await self.server.wait_closed()
+            self.server = None
+        for writer in list(self.writers):
+            writer.close()
+
+    async def _forward(self, client_reader: asyncio.StreamReader, client_writer: asyncio.StreamWriter) -> None:
+        try:
+            server_reader, server_writer = await self.connect()
+        except OSError:
+            client_writer.close()
+            return
+        self.writers.update((client_writer, server_writer))
+        try:
+            await asyncio.gather(
+                self._pipe(client_reader, server_writer), self._pipe(server_reader, client_writer)
+            )
+        finally:
+            self.writers.difference_update((client_writer, server_writer))
+
+    async def _pipe(self, reader: asyncio.StreamReader, writer: asyncio.StreamWriter) -> None:
+        try:
+            while True:
+                data = await reader.read(65536)
+                if not data:
+                    break
+                writer.write(data)
+                await writer.drain()
+        except (ConnectionError, OSError):
+            pass
+        finally:
+            writer.close()
+
+
+def _free_port() -> int:
+    with socket.socket() as sock:
+        sock.bind(("127.0.0.1", 0))
+        return sock.getsockname()[1]
+
+
+def _connector(url: URL) -> Callable[[], Awaitable[Streams]]:
+    # libpq style ?host=/path puts the server on a Unix socket
+    host = url.query.get("host") or url.host or "localhost"
+    port = url.port or 5432
+    if host.startswith("/"):
+        return lambda: asyncio.open_unix_connection(f"{host}/.s.PGSQL.{port}")
+    return lambda: asyncio.open_connection(host, port)
+
+
+def _via(url: URL, port: int) -> str:
+    query = {key: value for key, value in url.query.items() if key != "host"}
+    return url.set(drivername="postgresql+asyncpg", host="127.0.0.1", port=port, query=query).render_as_string(
+        hide_password=False
+    )
+
+
+async def _until(condition: Callable[[], bool], timeout: float) -> bool:
+    deadline = time.monotonic() + timeout
+    while not condition():
+        if time.monotonic() > deadline:
+            return False
+        await asyncio.sleep(0.05)
+    return True
+
+
+async def _reads(engine: AsyncEngine) -> bool:
+    async with AsyncSessionLocal(bind=engine) as db:
+        return await db.scalar(text("SELECT 1")) == 1
+
+
+async def run_checks(args: argparse.Namespace, writer_id: uuid.UUID, reader_id: uuid.UUID) -> List[str]:
+    url = make_url(args.replica_uri or str(settings.SQLALCHEMY_DATABASE_URI))
+    proxy = ReplicaProxy(_connector(url))
+    await proxy.start()
+    replica_uri = _via(url, proxy.port)
+    writer, reader = str(writer_id), str(reader_id)
+
+    settings.DB_READ_YOUR_WRITES_SECONDS = args.window
+    settings.DB_REPLICA_HEALTH_CHECK_SECONDS = 0.2
+    settings.DB_REPLICA_HEALTH_CHECK_TIMEOUT_SECONDS = 1.0
+    # The commit hook marks writers on the module's ReplicaSet
+    configured = replicas_module.replicas
+    replica_set = replicas_module.replicas = ReplicaSet([replica_uri, replica_uri])
+    partial = ReplicaSet([replica_uri, _via(url, _free_port())])
+    outage_wait = settings.DB_REPLICA_HEALTH_CHECK_SECONDS + settings.DB_REPLICA_HEALTH_CHECK_TIMEOUT_SECONDS + 2
+
+    async def round_robin() -> bool:
+        await replica_set.check()
+        routed = [await replica_set.route(reader) for _ in range(6)]
+        return len(replica_set.healthy) == 2 and routed == replica_set.engines * 3 and await _reads(routed[0])
+
+    async def read_your_writes() -> bool:
+        async with AsyncSessionLocal() as db:
+            # As deps.get_write_db does
+            db.info["user_id"] = writer
+            await crud.async_food_item.create_with_owner(
+                db, obj_in=FoodItemCreate(name="Replica check"), owner_id=writer_id
+            )
+        return (
+            await replica_set.route(writer) is async_engine
+            and await replica_set.route(reader) in replica_set.engines
+        )
+
+    async def window_expires() -> bool:
+        await asyncio.sleep(args.window + 0.1)
+        return await replica_set.route(writer) in replica_set.engines
+
+    async def unreachable_skipped() -> bool:
+        await partial.check()
+        routed = {await partial.route(reader) for _ in range(4)}
+        return partial.healthy == partial.engines[:1] and routed == {partial.engines[0]}
+
+    async def replica_down() -> bool:
+        await replica_set.start()
+        await proxy.stop()
+        if not await _until(lambda: not replica_set.healthy, outage_wait):
+            return False
+        engine = await replica_set.route(reader)
+        return engine is async_engine and await _reads(engine)
+
+    async def replica_back() -> bool:
+        await proxy.start()
+        if not await _until(lambda: replica_set.healthy == replica_set.engines, outage_wait):
+            return False
+        engine = await replica_set.route(reader)
+        return engine in replica_set.engines and await _reads(engine)
+
+    checks: Dict[str, Callable[[], Awaitable[bool]]] = {
+        "round robin": round_robin,
+        "read your writes": read_your_writes,
+        "window expires": window_expires,
+        "unreachable replica skipped": unreachable_skipped,
+        "replica down": replica_down,
+        "replica back": replica_back,
+    }
+    failed = []
+    try:
+        for name, check in checks.items():
+            try:
+                ok = await check()
+            except Exception:
+                logger.exception("%s: raised", name)
+                ok = False
+            if ok:
+                logger.info("%s: ok", name)
+            else:
+                failed.append(name)
+                logger.error("%s: failed", name)
+    finally:
+        await replica_set.stop()
+        await partial.stop()
+        await proxy.stop()
+        await async_engine.dispose()
+        replicas_module.replicas = configured
+    return failed
+
+
+def main(argv: Optional[List[str]] = None) -> None:
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument(
+        "--replica-uri", default=None,
+        help="postgresql:// URI of the replica, by default the primary (SQLALCHEMY_DATABASE_URI)",
+    )
+    parser.add_argument(
+        "--window", type=float, default=1.0, help="DB_READ_YOUR_WRITES_SECONDS for the check"
+    )
+    args = parser.parse_args(argv)
+
+    logging.basicConfig(level=logging.INFO, format="%(asctime)s %(message)s")
+    with throwaway_users("replica-check", 2) as (writer_id, reader_id):
+        failed = asyncio.run(run_checks(args, writer_id, reader_id))
+    if failed:
+        logger.error("Failed checks: %s", ", ".join(failed))
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
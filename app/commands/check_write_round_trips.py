@@ -0,0 +1,117 @@
+"""
+Check that each food item write endpoint makes exactly one database round trip.
+
+    python -m app.commands.check_write_round_trips
+
+Runs the API in-process against the configured database as a throwaway
+user, counts the SQL statements executed on every engine while serving
+POST, PUT and DELETE /food-items/ and their /bulk counterparts, and exits
+with status 1, listing the statements, if any of them executed more than
+one. Authentication is warmed up first, so a principal cache miss is not
+counted. The user and their items are deleted afterwards.
+"""
+import argparse
+import asyncio
+import logging
+import sys
+import uuid
+from typing import Any, Callable, Dict, List, Optional, Tuple
+
+import httpx
+from sqlalchemy import event
+from sqlalchemy.engine import Engine
+
+from app.commands.throwaway_users import throwaway_users
+from app.core import security
+from app.core.config import settings
+from app.main import app
+
+logger = logging.getLogger(__name__)
+
+PREFIX = f"{settings.API_V1_STR}/food-items"
+
+
+class StatementLog:
+    """
+    Records the statements executed on any engine while active.
+    """
+
+    def __init__(self) -> None:
+        self.statements: List[str] = []
+        self.active = False
+        event.listen(Engine, "before_cursor_execute", self._record)
+
+    def _record(self, conn: Any, cursor: Any, statement: str, *args: Any) -> None:
+        if self.active:
+            self.statements.append(" ".join(statement.split()))
+
+    async def count(self, request: Callable[[], Any]) -> Tuple[httpx.Response, List[str]]:
+        self.statements, self.active = [], True
+        try:
+            response = await request()
+        finally:
+            self.active = False
+        return response, self.statements
+
+
+async def _create(client: httpx.AsyncClient, count: int) -> List[str]:
+    response = await client.post(
+        f"{PREFIX}/bulk", json={"items": [{"name": f"Round trip check {i}"} for i in range(count)]}
+    )
+    response.raise_for_status()
+    return [item["id"] for item in response.json()["items"]]
+
+
+async def run(owner_id: uuid.UUID) -> List[str]:
+    log = StatementLog()
+    failed = []
+    async with httpx.AsyncClient(
+        transport=httpx.ASGITransport(app=app),
+        base_url="http://check",
+        headers={"Authorization": f"Bearer {security.create_access_token(owner_id)}"},
+    ) as client:
+        (await client.get(f"{PREFIX}/", params={"limit": 1})).raise_for_status()
+        ids = await _create(client, 8)
+        writes: Dict[str, Callable[[], Any]] = {
+            "POST /food-items/": lambda: client.post(f"{PREFIX}/", json={"name": "Round trip check"}),
+            "PUT /food-items/{id}": lambda: client.put(f"{PREFIX}/{ids[0]}", json={"quantity": 2}),
+            "DELETE /food-items/{id}": lambda: client.delete(f"{PREFIX}/{ids[1]}"),
+            "POST /food-items/bulk": lambda: client.post(
+                f"{PREFIX}/bulk", json={"items": [{"name": "Round trip check"}, {"name": "Round trip check"}]}
+            ),
+            "PATCH /food-items/bulk": lambda: client.patch(
+                f"{PREFIX}/bulk", json={"items": [{"id": id, "quantity": 3} for id in ids[2:5]]}
+            ),
+            "DELETE /food-items/bulk": lambda: client.request(
+                "DELETE", f"{PREFIX}/bulk", json={"ids": ids[5:8]}
+            ),
+        }
+        for name, request in writes.items():
+            response, statements = await log.count(request)
+            response.raise_for_status()
+            if len(statements) == 1:
+                logger.info("%s: 1 statement", name)
+            else:
+                failed.append(name)
+                logger.error(
+                    "%s: %d statements\n%s", name, len(statements),
+                    "\n".join(f"  {statement}" for statement in statements),
+                )
+    return failed
+
+
+def main(argv: Optional[List[str]] = None) -> None:
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.parse_args(argv)
+
+    logging.basicConfig(level=logging.INFO, format="%(asctime)s %(message)s")
+    logging.getLogger("httpx").setLevel(logging.WARNING)
+    with throwaway_users("round-trip-check", 1) as (owner_id,):
+        failed = asyncio.run(run(owner_id))
+    if failed:
+        logger.error("More than one statement in: %s", ", ".join(failed))
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
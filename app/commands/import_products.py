@@ -0,0 +1,246 @@
+"""
+Import Open Food Facts dumps into the local product catalog.
+
+    python -m app.commands.import_products openfoodfacts-products.jsonl.gz
+    python -m app.commands.import_products delta/*.json.gz
+
+JSONL and tab-separated CSV dumps are supported, optionally gzipped. Files
+are streamed record by record and loaded in batches with COPY into a staging
+table followed by an upsert, so memory use does not grow with the dump.
+Progress is committed together with every batch: re-running the command
+resumes an interrupted file and skips files that were already imported,
+which makes it safe to point at a directory of daily delta files. Files are
+recognised by a hash of their content, not by name. Rows never
+overwrite a product with a newer `last_modified_t`.
+"""
+import argparse
+import csv
+import gzip
+import hashlib
+import io
+import itertools
+import json
+import logging
+import os
+import sys
+import time
+from typing import IO, Any, Iterator, List, Optional, Tuple
+
+from app.core.barcode import product_category
+from app.db.session import engine
+
+logger = logging.getLogger(__name__)
+
+Row = Tuple[str, Optional[str], Optional[str], Optional[str], Optional[int]]
+
+_CREATE_STAGE = """
+CREATE TEMP TABLE IF NOT EXISTS product_stage
+(LIKE product INCLUDING DEFAULTS) ON COMMIT DELETE ROWS
+"""
+_COPY_STAGE = """
+COPY product_stage (barcode, name, category, image_url, last_modified)
+FROM STDIN WITH (FORMAT csv)
+"""
+_UPSERT = """
+INSERT INTO product (barcode, name, category, image_url, last_modified)
+SELECT DISTINCT ON (barcode) barcode, name, category, image_url, last_modified
+FROM product_stage
+ORDER BY barcode, last_modified DESC NULLS LAST
+ON CONFLICT (barcode) DO UPDATE SET
+    name = EXCLUDED.name,
+    category = EXCLUDED.category,
+    image_url = EXCLUDED.image_url,
+    last_modified = EXCLUDED.last_modified
+WHERE product.last_modified IS NULL
+    OR EXCLUDED.last_modified IS NULL
+    OR EXCLUDED.last_modified >= product.last_modified
+"""
+_SAVE_PROGRESS = """
+INSERT INTO productimport (source, records_done, rows_loaded, completed, updated_at)
+VALUES (%s, %s, %s, %s, now())
+ON CONFLICT (source) DO UPDATE SET
+    records_done = EXCLUDED.records_done,
+    rows_loaded = EXCLUDED.rows_loaded,
+    completed = EXCLUDED.completed,
+    updated_at = EXCLUDED.updated_at
+"""
+
+
+def open_dump(path: str) -> IO[str]:
+    if path.endswith(".gz"):
+        return gzip.open(path, "rt", encoding="utf-8", newline="")
+    return open(path, "r", encoding="utf-8", newline="")
+
+
+def is_csv(path: str) -> bool:
+    name = path[:-3] if path.endswith(".gz") else path
+    return name.endswith((".csv", ".tsv"))
+
+
+def _last_modified(value: Any) -> Optional[int]:
+    try:
+        return int(value)
+    except (TypeError, ValueError):
+        return None
+
+
+def _row(code: Any, name: Any, tags: List[str], image_url: Any, last_modified: Any) -> Optional[Row]:
+    if not code:
+        return None
+    return (
+        str(code),
+        name or None,
+        product_category(tags) if tags else None,
+        image_url or None,
+        _last_modified(last_modified),
+    )
+
+
+def iter_records(stream: IO[str], csv_format: bool, skip: int = 0) -> Iterator[Optional[Row]]:
+    """
+    Yield one parsed row per dump record after the first `skip` records, or
+    None for records that are malformed or have no barcode, so that record
+    counts stay resumable.
+    """
+    if csv_format:
+        csv.field_size_limit(sys.maxsize)
+        records = csv.DictReader(stream, delimiter="\t", quoting=csv.QUOTE_NONE)
+        for record in itertools.islice(records, skip, None):
+            tags = [tag for tag in (record.get("categories_tags") or "").split(",") if tag]
+            yield _row(
+                record.get("code"),
+                record.get("product_name"),
+                tags,
+                record.get("image_url"),
+                record.get("last_modified_t"),
+            )
+        return
+    for line in itertools.islice(stream, skip, None):
+        try:
+            product = json.loads(line)
+        except ValueError:
+            yield None
+            continue
+        if not isinstance(product, dict):
+            yield None
+            continue
+        yield _row(
+            product.get("code") or product.get("_id"),
+            product.get("product_name"),
+            product.get("categories_tags") or [],
+            product.get("image_url"),
+            product.get("last_modified_t"),
+        )
+
+
+def source_key(path: str) -> str:
+    """
+    Progress key of a dump: its file name, for readability, and a SHA-256 of
+    its bytes, so that different dumps with the same name (e.g. successive
+    full dumps) are not mistaken for each other.
+    """
+    digest = hashlib.sha256()
+    with open(path, "rb") as f:
+        for chunk in iter(lambda: f.read(1024 * 1024), b""):
+            digest.update(chunk)
+    return f"{os.path.basename(path)}:{digest.hexdigest()}"
+
+
+def _load_progress(cursor: Any, source: str) -> Tuple[int, int, bool]:
+    cursor.execute(
+        "SELECT records_done, rows_loaded, completed FROM productimport WHERE source = %s",
+        (source,),
+    )
+    row = cursor.fetchone()
+    return tuple(row) if row else (0, 0, False)
+
+
+def _flush(cursor: Any, rows: List[Row]) -> None:
+    buffer = io.StringIO()
+    csv.writer(buffer).writerows(rows)
+    buffer.seek(0)
+    cursor.copy_expert(_COPY_STAGE, buffer)
+    cursor.execute(_UPSERT)
+
+
+def import_file(path: str, *, batch_size: int, restart: bool = False) -> int:
+    """
+    Import one dump or delta file, returning the number of rows loaded.
+    """
+    source = source_key(path)
+    name = os.path.basename(path)
+    connection = engine.raw_connection()
+    try:
+        cursor = connection.cursor()
+        cursor.execute(_CREATE_STAGE)
+        records_done, rows_loaded, completed = _load_progress(cursor, source)
+        if restart:
+            records_done, rows_loaded, completed = 0, 0, False
+        if completed:
+            logger.info("%s: already imported, skipping", name)
+            return 0
+        if records_done:
+            logger.info("%s: resuming after %d records", name, records_done)
+
+        started = time.monotonic()
+        loaded_now = 0
+        batch: List[Row] = []
+        with open_dump(path) as stream:
+            records = iter_records(stream, is_csv(path), skip=records_done)
+            for index, row in enumerate(records, start=records_done):
+                if row is not None:
+                    batch.append(row)
+                if len(batch) >= batch_size:
+                    _flush(cursor, batch)
+                    loaded_now += len(batch)
+                    cursor.execute(
+                        _SAVE_PROGRESS, (source, index + 1, rows_loaded + loaded_now, False)
+                    )
+                    connection.commit()
+                    batch = []
+                    elapsed = time.monotonic() - started
+                    logger.info(
+                        "%s: %d rows loaded (%.0f rows/sec)",
+                        name, rows_loaded + loaded_now, loaded_now / max(elapsed, 1e-9),
+                    )
+                records_done = index + 1
+        if batch:
+            _flush(cursor, batch)
+            loaded_now += len(batch)
+        cursor.execute(_SAVE_PROGRESS, (source, records_done, rows_loaded + loaded_now, True))
+        connection.commit()
+
+        elapsed = time.monotonic() - started
+        logger.info(
+            "%s: done, %d rows in %.1fs (%.0f rows/sec)",
+            name, loaded_now, elapsed, loaded_now / max(elapsed, 1e-9),
+        )
+        return loaded_now
+    except BaseException:
+        connection.rollback()
+        raise
+    finally:
+        connection.close()
+
+
+def main(argv: Optional[List[str]] = None) -> None:
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("paths", nargs="+", help="Dump or delta files, imported in the given order")
+    parser.add_argument("--batch-size", type=int, default=10000, help="Rows per COPY batch")
+    parser.add_argument("--restart", action="store_true", help="Ignore saved progress")
+    args = parser.parse_args(argv)
+
+    logging.basicConfig(level=logging.INFO, format="%(asctime)s %(message)s")
+    started = time.monotonic()
+    total = 0
+    for path in args.paths:
+        total += import_file(path, batch_size=args.batch_size, restart=args.restart)
+    elapsed = time.monotonic() - started
+    logger.info(
+        "Imported %d rows from %d files in %.1fs (%.0f rows/sec)",
+        total, len(args.paths), elapsed, total / max(elapsed, 1e-9),
+    )
+
+
+if __name__ == "__main__":
+    main()
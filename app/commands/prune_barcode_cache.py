@@ -0,0 +1,65 @@
+"""
+Delete expired entries from the Postgres tier of the barcode product cache.
+
+    python -m app.commands.prune_barcode_cache
+
+Run it periodically, e.g. daily from cron, when the shared tier is Postgres
+(BARCODE_CACHE_SHARED_TIER). Expired rows are never read again, but they are
+only replaced when the same barcode is looked up again, so without pruning
+the table keeps every barcode ever looked up.
+"""
+import argparse
+import logging
+from datetime import datetime
+from typing import List, Optional
+
+from sqlalchemy import text
+
+from app.db.session import engine
+
+logger = logging.getLogger(__name__)
+
+# Batched, so that a large backlog is not deleted in one long transaction
+_PRUNE = """
+DELETE FROM barcodecacheentry
+WHERE barcode IN (
+    SELECT barcode FROM barcodecacheentry
+    WHERE expires_at < :now
+    LIMIT :batch_size
+)
+"""
+
+
+def prune(batch_size: int) -> int:
+    """
+    Delete cache entries that have expired, returning how many.
+    """
+    # expires_at is naive UTC, see PostgresTier
+    now = datetime.utcnow()
+    total = 0
+    while True:
+        with engine.begin() as connection:
+            deleted = connection.execute(
+                text(_PRUNE), {"now": now, "batch_size": batch_size}
+            ).rowcount
+        total += deleted
+        if deleted < batch_size:
+            return total
+
+
+def main(argv: Optional[List[str]] = None) -> None:
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument(
+        "--batch-size",
+        type=int,
+        default=10000,
+        help="Entries deleted per transaction",
+    )
+    args = parser.parse_args(argv)
+
+    logging.basicConfig(level=logging.INFO, format="%(asctime)s %(message)s")
+    logger.info("Pruned %d barcode cache entries", prune(args.batch_size))
+
+
+if __name__ == "__main__":
+    main()
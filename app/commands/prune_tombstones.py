@@ -0,0 +1,59 @@
+"""
+Delete food item tombstones older than FOOD_ITEM_TOMBSTONE_RETENTION_DAYS.
+
+    python -m app.commands.prune_tombstones
+
+Run it periodically, e.g. daily from cron. Each owner's pruned_version
+records the newest tombstone removed, so a client whose sync cursor is older
+gets 410 from GET /food-items/changes and resyncs from scratch instead of
+silently missing deletions.
+"""
+import argparse
+import logging
+from typing import List, Optional
+
+from sqlalchemy import text
+
+from app.core.config import settings
+from app.db.session import engine
+
+logger = logging.getLogger(__name__)
+
+_PRUNE = """
+WITH pruned AS (
+    DELETE FROM fooditemtombstone WHERE deleted_at < now() - make_interval(days => :days)
+    RETURNING owner_id, change_id
+), owners AS (
+    UPDATE fooditemversion AS v
+    SET pruned_version = greatest(v.pruned_version, p.change_id)
+    FROM (SELECT owner_id, max(change_id) AS change_id FROM pruned GROUP BY owner_id) AS p
+    WHERE v.owner_id = p.owner_id
+)
+SELECT count(*) FROM pruned
+"""
+
+
+def prune(retention_days: int) -> int:
+    """
+    Delete tombstones older than `retention_days`, returning how many.
+    """
+    with engine.begin() as connection:
+        return connection.execute(text(_PRUNE), {"days": retention_days}).scalar()
+
+
+def main(argv: Optional[List[str]] = None) -> None:
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument(
+        "--retention-days",
+        type=int,
+        default=settings.FOOD_ITEM_TOMBSTONE_RETENTION_DAYS,
+        help="Keep tombstones of items deleted within this many days",
+    )
+    args = parser.parse_args(argv)
+
+    logging.basicConfig(level=logging.INFO, format="%(asctime)s %(message)s")
+    logger.info("Pruned %d tombstones", prune(args.retention_days))
+
+
+if __name__ == "__main__":
+    main()
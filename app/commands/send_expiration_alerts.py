@@ -0,0 +1,46 @@
+"""
+Run the expiration alert scheduler once.
+
+    python -m app.commands.send_expiration_alerts
+
+Processes every due shard and exits, for deployments that run it from cron
+with EXPIRATION_ALERT_SCHEDULER=false instead of in the API workers. Any
+number of copies can run at once; each shard is claimed by one of them.
+"""
+import argparse
+import asyncio
+import logging
+from typing import List, Optional
+
+from app.core.config import settings
+from app.core.expiration_alerts import expiration_alerts, load_notifiers
+from app.core.http import close_http_client, init_http_client
+
+logger = logging.getLogger(__name__)
+
+
+async def run(notifiers: str) -> int:
+    await init_http_client()
+    try:
+        expiration_alerts.notifiers = load_notifiers(notifiers)
+        await expiration_alerts.ensure_shards()
+        return await expiration_alerts.run_due()
+    finally:
+        await close_http_client()
+
+
+def main(argv: Optional[List[str]] = None) -> None:
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument(
+        "--notifiers",
+        default=settings.EXPIRATION_ALERT_NOTIFIERS,
+        help="Comma-separated notifier names or module:Class paths",
+    )
+    args = parser.parse_args(argv)
+
+    logging.basicConfig(level=logging.INFO, format="%(asctime)s %(message)s")
+    logger.info("Processed %d expiration alert shards", asyncio.run(run(args.notifiers)))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,37 @@
+"""
+Throwaway users for the benchmark and check commands.
+"""
+import uuid
+from contextlib import contextmanager
+from typing import Iterator, List
+
+from sqlalchemy import insert
+
+from app import crud
+from app.db.session import SessionLocal, engine
+from app.models.user import User
+
+
+@contextmanager
+def throwaway_users(label: str, count: int, *, keep: bool = False) -> Iterator[List[uuid.UUID]]:
+    """
+    Create `count` active users with unusable passwords, yield their ids,
+    and afterwards delete them together with everything they own (see
+    crud.user.remove) unless `keep` is given.
+    """
+    owners = [uuid.uuid4() for _ in range(count)]
+    with engine.begin() as connection:
+        connection.execute(
+            insert(User),
+            [
+                {"id": owner_id, "email": f"{label}-{owner_id}@example.com", "hashed_password": ""}
+                for owner_id in owners
+            ],
+        )
+    try:
+        yield owners
+    finally:
+        if not keep:
+            with SessionLocal() as db:
+                for owner_id in owners:
+                    crud.user.remove(db, id=owner_id)
@@ -0,0 +1,337 @@
+import asyncio
+import json
+import logging
+from datetime import datetime, timedelta
+from typing import Any, AsyncIterator, Dict, Iterable, List, Optional, Tuple, Union
+
+import httpx
+import redis
+from fastapi.concurrency import run_in_threadpool
+from fastapi.encoders import jsonable_encoder
+from prometheus_client import Counter
+from sqlalchemy.dialects.postgresql import insert
+from sqlalchemy.exc import SQLAlchemyError
+
+from app import crud
+from app.core import http
+from app.core.cache import MISSING, LRUCache
+from app.core.config import settings
+from app.core.redis import get_async_redis
+from app.core.singleflight import SingleFlight, shared_flight
+from app.db.session import SessionLocal
+from app.models.barcode_cache import BarcodeCacheEntry
+from app.schemas.food_item import FoodItemCreate
+
+logger = logging.getLogger(__name__)
+
+CACHE_LOOKUPS = Counter(
+    "barcode_cache_lookups_total",
+    "Barcode product cache lookups by tier and result",
+    ["tier", "result"],
+)
+UPSTREAM_REQUESTS = Counter(
+    "barcode_upstream_requests_total",
+    "Requests made to the Open Food Facts API",
+)
+
+
+class RedisTier:
+    prefix = "barcode:"
+
+    async def get(self, barcode: str) -> Any:
+        raw = await get_async_redis().get(self.prefix + barcode)
+        if raw is None:
+            return MISSING
+        return json.loads(raw)
+
+    async def set(self, barcode: str, item: Optional[dict], ttl: int) -> None:
+        await get_async_redis().set(self.prefix + barcode, json.dumps(item), ex=ttl)
+
+
+class PostgresTier:
+    async def get(self, barcode: str) -> Any:
+        return await run_in_threadpool(self._get, barcode)
+
+    async def set(self, barcode: str, item: Optional[dict], ttl: int) -> None:
+        await run_in_threadpool(self._set, barcode, item, ttl)
+
+    def _get(self, barcode: str) -> Any:
+        with SessionLocal() as db:
+            entry = (
+                db.query(BarcodeCacheEntry)
+                .filter(
+                    BarcodeCacheEntry.barcode == barcode,
+                    BarcodeCacheEntry.expires_at > datetime.utcnow(),
+                )
+                .first()
+            )
+            if entry is None:
+                return MISSING
+            return entry.item
+
+    def _set(self, barcode: str, item: Optional[dict], ttl: int) -> None:
+        expires_at = datetime.utcnow() + timedelta(seconds=ttl)
+        stmt = insert(BarcodeCacheEntry).values(
+            barcode=barcode, item=item, expires_at=expires_at
+        )
+        stmt = stmt.on_conflict_do_update(
+            index_elements=[BarcodeCacheEntry.barcode],
+            set_={"item": stmt.excluded.item, "expires_at": stmt.excluded.expires_at},
+        )
+        with SessionLocal() as db:
+            db.execute(stmt)
+            db.commit()
+
+
+def _shared_tier() -> Any:
+    tier = settings.BARCODE_CACHE_SHARED_TIER
+    if tier == "none":
+        return None
+    if tier == "redis" or (tier == "auto" and settings.REDIS_URL):
+        return RedisTier()
+    return PostgresTier()
+
+
+class BarcodeCache:
+    """
+    Two-tier product cache: an in-process LRU in front of a shared tier
+    (Redis or Postgres). A cached value of None means "product not found"
+    and is kept for BARCODE_CACHE_NEGATIVE_TTL_SECONDS only.
+    """
+
+    def __init__(self, shared: Any = None):
+        self.local = LRUCache(
+            maxsize=settings.BARCODE_CACHE_SIZE,
+            ttl=settings.BARCODE_CACHE_TTL_SECONDS,
+        )
+        self.shared = shared
+
+    @staticmethod
+    def _ttl(item: Optional[FoodItemCreate]) -> int:
+        if item is None:
+            return settings.BARCODE_CACHE_NEGATIVE_TTL_SECONDS
+        return settings.BARCODE_CACHE_TTL_SECONDS
+
+    @staticmethod
+    def _record(tier: str, value: Any, record: bool = True) -> None:
+        if not record:
+            return
+        if value is MISSING:
+            result = "miss"
+        elif value is None:
+            result = "negative_hit"
+        else:
+            result = "hit"
+        CACHE_LOOKUPS.labels(tier=tier, result=result).inc()
+
+    def get_local(self, barcode: str, *, record: bool = True) -> Any:
+        value = self.local.get(barcode)
+        self._record("local", value, record)
+        return value
+
+    async def get_shared(self, barcode: str, *, record: bool = True) -> Any:
+        if self.shared is None:
+            return MISSING
+        try:
+            data = await self.shared.get(barcode)
+        except (redis.RedisError, SQLAlchemyError):
+            logger.warning("Shared barcode cache unavailable", exc_info=True)
+            return MISSING
+        self._record("shared", data, record)
+        if data is MISSING:
+            return MISSING
+        value = FoodItemCreate(**data) if data is not None else None
+        self.local.set(barcode, value, ttl=self._ttl(value))
+        return value
+
+    async def get(self, barcode: str, *, record: bool = True) -> Any:
+        """
+        Return the cached FoodItemCreate, None for a cached "not found",
+        or MISSING when neither tier knows the barcode.
+        """
+        value = self.get_local(barcode, record=record)
+        if value is MISSING:
+            value = await self.get_shared(barcode, record=record)
+        return value
+
+    async def set(self, barcode: str, item: Optional[FoodItemCreate]) -> None:
+        ttl = self._ttl(item)
+        self.local.set(barcode, item, ttl=ttl)
+        if self.shared is None:
+            return
+        try:
+            await self.shared.set(
+                barcode, jsonable_encoder(item) if item is not None else None, ttl
+            )
+        except (redis.RedisError, SQLAlchemyError):
+            logger.warning("Shared barcode cache unavailable", exc_info=True)
+
+
+barcode_cache = BarcodeCache(shared=_shared_tier())
+
+
+def product_category(categories_tags: List[str]) -> str:
+    return categories_tags[0].replace("en:", "") if categories_tags else "unknown"
+
+
+def _catalog_lookup(barcodes: List[str]) -> Dict[str, FoodItemCreate]:
+    with SessionLocal() as db:
+        products = crud.product.get_multi_by_barcodes(db, barcodes=barcodes)
+    return {
+        barcode: FoodItemCreate(
+            name=product.name or "Unknown Product",
+            barcode=barcode,
+            category=product.category or "unknown",
+            image_url=product.image_url,
+            source="barcode"
+        )
+        for barcode, product in products.items()
+    }
+
+
+async def catalog_lookup(barcodes: List[str]) -> Dict[str, FoodItemCreate]:
+    """
+    Look barcodes up in the local product catalog (see app.commands.import_products).
+    """
+    if not settings.PRODUCT_CATALOG_ENABLED or not barcodes:
+        return {}
+    try:
+        found = await run_in_threadpool(_catalog_lookup, barcodes)
+    except SQLAlchemyError:
+        logger.warning("Product catalog unavailable", exc_info=True)
+        return {}
+    CACHE_LOOKUPS.labels(tier="catalog", result="hit").inc(len(found))
+    CACHE_LOOKUPS.labels(tier="catalog", result="miss").inc(len(barcodes) - len(found))
+    return found
+
+
+async def _lookup_known(barcodes: Iterable[str]) -> Dict[str, Optional[FoodItemCreate]]:
+    """
+    Resolve barcodes without going upstream: in-process cache first, then the
+    local catalog, then the shared cache tier. Unknown barcodes are left out.
+    """
+    known = {}
+    pending = []
+    for barcode in barcodes:
+        item = barcode_cache.get_local(barcode)
+        if item is MISSING:
+            pending.append(barcode)
+        else:
+            known[barcode] = item
+    for barcode, item in (await catalog_lookup(pending)).items():
+        barcode_cache.local.set(barcode, item)
+        known[barcode] = item
+    for barcode in pending:
+        if barcode not in known:
+            item = await barcode_cache.get_shared(barcode)
+            if item is not MISSING:
+                known[barcode] = item
+    return known
+
+
+async def fetch_product(barcode: str) -> Optional[FoodItemCreate]:
+    """
+    Fetch a product from Open Food Facts, returning None if it is unknown.
+    A response that cannot be parsed raises httpx.DecodingError.
+    """
+    UPSTREAM_REQUESTS.inc()
+    response = await http.get(
+        f"{settings.OPEN_FOOD_FACTS_API_URL}/product/{barcode}.json"
+    )
+    response.raise_for_status()
+    try:
+        data = response.json()
+
+        # Check if product was found
+        if data.get("status") != 1 or not data.get("product"):
+            return None
+
+        product = data["product"]
+
+        # Extract relevant information
+        return FoodItemCreate(
+            name=product.get("product_name", "Unknown Product"),
+            barcode=barcode,
+            category=product_category(product.get("categories_tags")),
+            image_url=product.get("image_url"),
+            source="barcode"
+        )
+    except (ValueError, TypeError, AttributeError, IndexError) as e:
+        # Not JSON, or not shaped like a product response
+        raise httpx.DecodingError(
+            f"Invalid response from barcode API: {e}", request=response.request
+        ) from e
+
+
+async def _fetch_and_cache(barcode: str) -> Optional[FoodItemCreate]:
+    item = await fetch_product(barcode)
+    await barcode_cache.set(barcode, item)
+    return item
+
+
+async def _fetch_coalesced(barcode: str) -> Optional[FoodItemCreate]:
+    if not (settings.BARCODE_SHARED_LOCK and isinstance(barcode_cache.shared, RedisTier)):
+        return await _fetch_and_cache(barcode)
+    return await shared_flight(
+        "barcode",
+        f"barcode:lock:{barcode}",
+        lambda: _fetch_and_cache(barcode),
+        lambda: barcode_cache.get(barcode, record=False),
+        ttl=settings.BARCODE_SHARED_LOCK_TTL_SECONDS,
+        poll_interval=settings.BARCODE_SHARED_LOCK_POLL_SECONDS,
+    )
+
+
+_inflight = SingleFlight("barcode")
+
+
+async def lookup_product(barcode: str) -> Optional[FoodItemCreate]:
+    """
+    Resolve a barcode through the product cache and the local catalog, falling
+    back to Open Food Facts. Concurrent misses for the same barcode share a
+    single upstream request. Upstream errors propagate as httpx.HTTPError and
+    are not cached.
+    """
+    known = await _lookup_known([barcode])
+    if barcode in known:
+        return known[barcode]
+    return await _inflight.do(barcode, lambda: _fetch_coalesced(barcode))
+
+
+async def lookup_products(
+    barcodes: Iterable[str],
+) -> AsyncIterator[Tuple[str, Union[FoodItemCreate, None, Exception]]]:
+    """
+    Resolve many barcodes at once, yielding (barcode, result) pairs as they
+    complete. Duplicates are dropped, cached and catalog barcodes are yielded
+    right away and misses are fetched with at most BARCODE_BATCH_CONCURRENCY
+    upstream requests in flight. Upstream errors, and any other error
+    resolving a single barcode, are yielded, not raised.
+    """
+    barcodes = list(dict.fromkeys(barcodes))
+    known = await _lookup_known(barcodes)
+    for barcode, item in known.items():
+        yield barcode, item
+    misses = [barcode for barcode in barcodes if barcode not in known]
+    if not misses:
+        return
+
+    slots = asyncio.Semaphore(settings.BARCODE_BATCH_CONCURRENCY)
+
+    async def resolve(barcode: str) -> Tuple[str, Union[FoodItemCreate, None, Exception]]:
+        async with slots:
+            try:
+                return barcode, await _inflight.do(barcode, lambda: _fetch_coalesced(barcode))
+            except Exception as e:
+                # One bad barcode must not abort the whole batch
+                if not isinstance(e, httpx.HTTPError):
+                    logger.exception("Barcode lookup failed for %s", barcode)
+                return barcode, e
+
+    tasks = [asyncio.ensure_future(resolve(barcode)) for barcode in misses]
+    try:
+        for next_done in asyncio.as_completed(tasks):
+            yield await next_done
+    finally:
+        for task in tasks:
+            task.cancel()
@@ -0,0 +1,64 @@
+import threading
+import time
+from collections import OrderedDict
+from typing import Any, Hashable, List, Optional, Tuple
+
+# Sentinel returned on a cache miss, so that ``None`` can be cached as a value
+MISSING = object()
+
+
+class LRUCache:
+    """
+    Thread-safe in-process LRU cache with a per-entry TTL.
+    **Parameters**
+    * `maxsize`: Maximum number of entries kept before evicting the least recently used
+    * `ttl`: Default time to live of an entry, in seconds
+    """
+
+    def __init__(self, maxsize: int, ttl: float):
+        self.maxsize = maxsize
+        self.ttl = ttl
+        self._data: "OrderedDict[Hashable, Tuple[float, Any]]" = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, key: Hashable, default: Any = MISSING) -> Any:
+        now = time.monotonic()
+        with self._lock:
+            entry = self._data.get(key)
+            if entry is None:
+                return default
+            expires_at, value = entry
+            if expires_at <= now:
+                del self._data[key]
+                return default
+            self._data.move_to_end(key)
+            return value
+
+    def set(self, key: Hashable, value: Any, ttl: Optional[float] = None) -> None:
+        expires_at = time.monotonic() + (self.ttl if ttl is None else ttl)
+        with self._lock:
+            self._data[key] = (expires_at, value)
+            self._data.move_to_end(key)
+            while len(self._data) > self.maxsize:
+                self._data.popitem(last=False)
+
+    def items(self) -> List[Tuple[Hashable, Any]]:
+        """
+        Snapshot of the live entries, least recently used first.
+        """
+        now = time.monotonic()
+        with self._lock:
+            return [
+                (key, value) for key, (expires_at, value) in self._data.items() if expires_at > now
+            ]
+
+    def delete(self, key: Hashable) -> None:
+        with self._lock:
+            self._data.pop(key, None)
+
+    def clear(self) -> None:
+        with self._lock:
+            self._data.clear()
+
+    def __len__(self) -> int:
+        return len(self._data)
@@ -0,0 +1,181 @@
+import asyncio
+import logging
+from typing import Dict, Optional, Set
+
+import redis
+from prometheus_client import Counter, Gauge
+
+from app.core.config import settings
+from app.core.redis import get_async_redis, get_redis
+
+logger = logging.getLogger(__name__)
+
+CHANNEL = "food-items:changes"
+
+SUBSCRIBERS = Gauge("change_stream_subscribers", "Open change stream subscriptions")
+EVENTS = Counter("change_stream_events_total", "Change events queued for subscribers")
+RESYNCS = Counter("change_stream_resyncs_total", "Subscriptions told to resync, by reason", ["reason"])
+
+
+class TooManySubscribers(Exception):
+    """
+    Raised when this process or the subscribing user has as many open
+    subscriptions as allowed.
+    """
+
+
+class Subscription:
+    """
+    One client's feed of an owner's change events, a bounded queue of
+    encoded events. A subscriber that falls CHANGE_STREAM_QUEUE_SIZE events
+    behind is not buffered for: its queue is replaced by a single None,
+    telling it to resync through GET /food-items/changes.
+    """
+
+    def __init__(self, owner_id: str):
+        self.owner_id = owner_id
+        self.queue: "asyncio.Queue[Optional[str]]" = asyncio.Queue(settings.CHANGE_STREAM_QUEUE_SIZE)
+        self.stale = False
+
+    def put(self, data: str) -> None:
+        if self.stale:
+            return
+        try:
+            self.queue.put_nowait(data)
+            EVENTS.inc()
+        except asyncio.QueueFull:
+            self.resync("lagging")
+
+    def resync(self, reason: str) -> None:
+        if self.stale:
+            return
+        self.stale = True
+        RESYNCS.labels(reason=reason).inc()
+        while not self.queue.empty():
+            self.queue.get_nowait()
+        self.queue.put_nowait(None)
+
+
+class ChangeFeed:
+    """
+    In-process pub/sub of food item changes by owner, fed by the
+    crud.food_item write paths after they commit.
+
+    With REDIS_URL set, changes are published to a Redis channel that every
+    process listens on, so subscribers see the writes of every worker. Each
+    process receives every change and only looks up whether it has
+    subscribers for the owner. Changes published while a process is cut
+    off from Redis are lost, so its subscribers are told to resync.
+    """
+
+    def __init__(self):
+        self.subscriptions: Dict[str, Set[Subscription]] = {}
+        self.count = 0
+        self._loop: Optional[asyncio.AbstractEventLoop] = None
+        self._task: Optional["asyncio.Task[None]"] = None
+
+    def subscribe(self, owner_id: str) -> Subscription:
+        """
+        Start receiving the owner's changes. Raises TooManySubscribers
+        beyond CHANGE_STREAM_MAX_SUBSCRIBERS per process or
+        CHANGE_STREAM_MAX_PER_USER per owner.
+        """
+        subscriptions = self.subscriptions.get(owner_id, set())
+        if self.count >= settings.CHANGE_STREAM_MAX_SUBSCRIBERS:
+            raise TooManySubscribers("Too many open change streams, try again later")
+        if len(subscriptions) >= settings.CHANGE_STREAM_MAX_PER_USER:
+            raise TooManySubscribers(
+                f"At most {settings.CHANGE_STREAM_MAX_PER_USER} change streams can be open per user"
+            )
+        subscription = Subscription(owner_id)
+        self.subscriptions.setdefault(owner_id, subscriptions).add(subscription)
+        self.count += 1
+        SUBSCRIBERS.inc()
+        return subscription
+
+    def unsubscribe(self, subscription: Subscription) -> None:
+        subscriptions = self.subscriptions.get(subscription.owner_id)
+        if subscriptions is None or subscription not in subscriptions:
+            return
+        subscriptions.discard(subscription)
+        if not subscriptions:
+            del self.subscriptions[subscription.owner_id]
+        self.count -= 1
+        SUBSCRIBERS.dec()
+
+    def publish(self, owner_id: str, data: str) -> None:
+        """
+        Publish an encoded change event of the owner. Safe to call from any
+        thread; it never raises, since the change itself is committed.
+        """
+        client = get_redis()
+        if client is not None:
+            try:
+                client.publish(CHANNEL, f"{owner_id} {data}")
+                return
+            except redis.RedisError:
+                # Still reaches the subscribers of this process
+                logger.warning("Failed to publish change of owner %s", owner_id, exc_info=True)
+        if self._loop is not None:
+            self._loop.call_soon_threadsafe(self._deliver, owner_id, data)
+
+    async def async_publish(self, owner_id: str, data: str) -> None:
+        """
+        publish() for the event loop, without blocking it on Redis.
+        """
+        client = get_async_redis()
+        if client is not None:
+            try:
+                await client.publish(CHANNEL, f"{owner_id} {data}")
+                return
+            except redis.RedisError:
+                logger.warning("Failed to publish change of owner %s", owner_id, exc_info=True)
+        self._deliver(owner_id, data)
+
+    def _deliver(self, owner_id: str, data: str) -> None:
+        for subscription in self.subscriptions.get(owner_id, ()):
+            subscription.put(data)
+
+    def resync_all(self, reason: str) -> None:
+        for subscriptions in self.subscriptions.values():
+            for subscription in subscriptions:
+                subscription.resync(reason)
+
+    async def start(self) -> None:
+        self._loop = asyncio.get_running_loop()
+        if get_async_redis() is not None:
+            self._task = asyncio.create_task(self._listen())
+
+    async def stop(self) -> None:
+        if self._task is not None:
+            self._task.cancel()
+            await asyncio.gather(self._task, return_exceptions=True)
+            self._task = None
+        # Lets open streams end, so that shutdown does not wait for them
+        self.resync_all("shutdown")
+        self._loop = None
+
+    async def _listen(self) -> None:
+        while True:
+            pubsub = get_async_redis().pubsub(ignore_subscribe_messages=True)
+            try:
+                await pubsub.subscribe(CHANNEL)
+                async for message in pubsub.listen():
+                    if message["type"] != "message":
+                        continue
+                    try:
+                        owner_id, _, data = message["data"].decode().partition(" ")
+                        self._deliver(owner_id, data)
+                    except Exception:
+                        logger.exception("Failed to deliver a change")
+            except asyncio.CancelledError:
+                raise
+            except redis.RedisError:
+                logger.warning("Change channel unavailable", exc_info=True)
+                self.resync_all("disconnected")
+                await asyncio.sleep(1.0)
+            finally:
+                await pubsub.aclose()
+
+
+change_feed = ChangeFeed()
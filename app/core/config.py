@@ -5,15 +5,43 @@ from pydantic import AnyHttpUrl, PostgresDsn, field_validator
 from pydantic_settings import BaseSettings
 
 
+def _asyncpg_uri(uri: str) -> str:
+    _, rest = uri.split("://", 1)
+    return f"postgresql+asyncpg://{rest}"
+
+
 class Settings(BaseSettings):
     API_V1_STR: str = "/api/v1"
     SECRET_KEY: str = secrets.token_urlsafe(32)
+    # Access tokens are short-lived and trusted without a database lookup;
+    # clients renew them with the refresh token from POST /auth/refresh
+    ACCESS_TOKEN_EXPIRE_MINUTES: int = 15
     # 60 minutes * 24 hours * 8 days = 8 days
-    ACCESS_TOKEN_EXPIRE_MINUTES: int = 60 * 24 * 8
+    REFRESH_TOKEN_EXPIRE_MINUTES: int = 60 * 24 * 8
     PROJECT_NAME: str = "MetaPantry AR"
     
     # JWT token settings
     ALGORITHM: str = "HS256"
+    # Embed is_active / is_superuser in access tokens so that authenticating
+    # a request needs no database lookup. Changes to those flags then only
+    # take effect once the user's outstanding tokens expire.
+    JWT_EMBED_CLAIMS: bool = False
+    # Otherwise they are cached per user id for a short while; crud.user.update
+    # drops the entry in the process that made the change
+    PRINCIPAL_CACHE_SIZE: int = 10000
+    PRINCIPAL_CACHE_TTL_SECONDS: float = 30.0
+    # Revoked tokens and users, kept until the tokens they cover expire. Once
+    # REVOCATION_CACHE_SIZE are held, logout and refresh answer 503; size it
+    # for the revocations of a refresh token lifetime. With REDIS_URL set,
+    # revocations reach every process within REVOCATION_SYNC_SECONDS.
+    REVOCATION_CACHE_SIZE: int = 100000
+    REVOCATION_SYNC_SECONDS: float = 2.0
+    # bcrypt cost factor. Stored hashes with a different cost are rehashed
+    # on the user's next successful login.
+    PASSWORD_HASH_ROUNDS: int = 12
+    # Dedicated pool for password hashing; requests get 429 when it is full
+    PASSWORD_WORKERS: int = 4
+    PASSWORD_QUEUE_SIZE: int = 32
     
     # BACKEND_CORS_ORIGINS is a comma-separated list of origins
     # e.g: "http://localhost,http://localhost:4200,http://localhost:3000"
@@ -49,9 +77,158 @@ class Settings(BaseSettings):
             path=f"{values.data.get('POSTGRES_DB') or ''}"
         )
 
+    @property
+    def SQLALCHEMY_ASYNC_DATABASE_URI(self) -> str:
+        # Same database through asyncpg; the sync URI stays in use for
+        # Alembic and command-line tools
+        return _asyncpg_uri(str(self.SQLALCHEMY_DATABASE_URI))
+
+    # Optional read replicas, a comma-separated list of postgresql:// URIs.
+    # Read-only endpoints use them round-robin, skipping replicas that failed
+    # their last health check, except for users who wrote within
+    # DB_READ_YOUR_WRITES_SECONDS, whose reads stay on the primary.
+    DB_REPLICA_URIS: str = ""
+    DB_REPLICA_HEALTH_CHECK_SECONDS: float = 5.0
+    DB_REPLICA_HEALTH_CHECK_TIMEOUT_SECONDS: float = 2.0
+    DB_READ_YOUR_WRITES_SECONDS: float = 5.0
+
+    @property
+    def SQLALCHEMY_ASYNC_REPLICA_URIS(self) -> List[str]:
+        return [_asyncpg_uri(uri.strip()) for uri in self.DB_REPLICA_URIS.split(",") if uri.strip()]
+
+    # Connection pool, per engine (the API's async engine and the sync engine
+    # used by threads and tools each hold up to DB_POOL_SIZE + DB_MAX_OVERFLOW)
+    DB_POOL_SIZE: int = 10
+    DB_MAX_OVERFLOW: int = 20
+    DB_POOL_TIMEOUT_SECONDS: float = 10.0
+    DB_POOL_RECYCLE_SECONDS: int = 30 * 60
+    # Liveness check on checkout: "always" pings every checkout, "idle" only
+    # connections unused for DB_POOL_PRE_PING_IDLE_SECONDS, "never" skips it
+    DB_POOL_PRE_PING: str = "idle"
+    DB_POOL_PRE_PING_IDLE_SECONDS: float = 30.0
+    # Connecting through PgBouncer in transaction mode: disable asyncpg's
+    # prepared statement cache
+    DB_PGBOUNCER: bool = False
+
     OPENAI_API_KEY: str = ""
+    # Point at a compatible server (e.g. a local fake) instead of api.openai.com
+    OPENAI_BASE_URL: Optional[str] = None
+    OPENAI_VISION_MODEL: str = "gpt-4-vision-preview"
+    OPENAI_TIMEOUT_SECONDS: float = 60.0
+
+    # Dedicated pool for image decoding/encoding
+    IMAGE_WORKERS: int = 2
+    IMAGE_QUEUE_SIZE: int = 16
+    # Uploads are downscaled to IMAGE_MAX_DIMENSION pixels on the longer side
+    # before the vision call; JPEGs already within bounds and smaller than
+    # IMAGE_PASSTHROUGH_MAX_BYTES are sent as uploaded
+    IMAGE_MAX_UPLOAD_BYTES: int = 15 * 1024 * 1024
+    IMAGE_MAX_DIMENSION: int = 1024
+    IMAGE_JPEG_QUALITY: int = 85
+    IMAGE_PASSTHROUGH_MAX_BYTES: int = 512 * 1024
+    # Vision results are cached by a hash of the preprocessed image; with
+    # IMAGE_CACHE_PERCEPTUAL, images whose dHash is within
+    # IMAGE_CACHE_MAX_DISTANCE bits of a cached one reuse its result too
+    # (single-item analysis only)
+    IMAGE_CACHE_SIZE: int = 1024
+    IMAGE_CACHE_TTL_SECONDS: int = 60 * 60 * 24 * 7
+    IMAGE_CACHE_PERCEPTUAL: bool = True
+    IMAGE_CACHE_MAX_DISTANCE: int = 4
     OPEN_FOOD_FACTS_API_URL: str = "https://world.openfoodfacts.org/api/v0"
 
+    # Check the local product catalog before going to Open Food Facts
+    PRODUCT_CATALOG_ENABLED: bool = True
+
+    # Background jobs (e.g. POST /image-analysis/?background=true). The
+    # "memory" backend keeps jobs in-process, "redis" shares them via REDIS_URL
+    JOB_BACKEND: str = "memory"
+    JOB_WORKERS: int = 4
+    JOB_QUEUE_MAX: int = 1000
+    JOB_MAX_ACTIVE_PER_USER: int = 5
+    JOB_MAX_ATTEMPTS: int = 3
+    JOB_RETRY_BACKOFF_SECONDS: float = 1.0
+    JOB_RESULT_TTL_SECONDS: int = 60 * 60
+    # With the redis backend, jobs of a worker process that stopped renewing
+    # its heartbeat for this long are requeued
+    JOB_LEASE_SECONDS: int = 60
+    # Webhook callbacks must be https to a public address; when set, only to
+    # these comma-separated hosts
+    JOB_CALLBACK_ALLOWED_HOSTS: str = ""
+
+    # Shared outbound HTTP client (Open Food Facts, webhooks, ...)
+    HTTP_MAX_CONNECTIONS: int = 100
+    HTTP_MAX_KEEPALIVE_CONNECTIONS: int = 20
+    HTTP_KEEPALIVE_EXPIRY_SECONDS: float = 30.0
+    HTTP_MAX_CONNECTIONS_PER_HOST: int = 10
+    HTTP_CONNECT_TIMEOUT_SECONDS: float = 3.0
+    HTTP_READ_TIMEOUT_SECONDS: float = 10.0
+    HTTP_POOL_TIMEOUT_SECONDS: float = 5.0
+
+    # Shared cache / broker, e.g. "redis://localhost:6379/0"
+    REDIS_URL: Optional[str] = None
+
+    # Barcode product cache. The shared tier is one of "auto" (Redis when
+    # REDIS_URL is set, otherwise Postgres), "redis" (needs REDIS_URL),
+    # "postgres" or "none".
+    BARCODE_CACHE_SIZE: int = 4096
+    BARCODE_CACHE_TTL_SECONDS: int = 60 * 60 * 24
+    BARCODE_CACHE_NEGATIVE_TTL_SECONDS: int = 60 * 60
+    BARCODE_CACHE_SHARED_TIER: str = "auto"
+
+    @field_validator("BARCODE_CACHE_SHARED_TIER")
+    def check_barcode_cache_shared_tier(cls, v: str, values: Dict[str, Any]) -> str:
+        if v not in ("auto", "redis", "postgres", "none"):
+            raise ValueError(f"Unknown barcode cache shared tier {v!r}")
+        if v == "redis" and not values.data.get("REDIS_URL"):
+            raise ValueError("The redis barcode cache shared tier needs REDIS_URL")
+        return v
+
+    # POST/PATCH/DELETE /food-items/bulk limit
+    FOOD_ITEM_BULK_MAX_SIZE: int = 500
+
+    # GET /food-items/changes: changes per request, and how long deletions
+    # are remembered (older cursors get 410 and must resync)
+    FOOD_ITEM_CHANGES_MAX_LIMIT: int = 1000
+    FOOD_ITEM_TOMBSTONE_RETENTION_DAYS: int = 30
+    # GET /food-items/search: results per request, time budget per query and
+    # the pg_trgm word similarity (0-1) a fuzzy match needs
+    FOOD_ITEM_SEARCH_MAX_LIMIT: int = 50
+    FOOD_ITEM_SEARCH_TIMEOUT_MS: int = 500
+    FOOD_ITEM_SEARCH_SIMILARITY: float = 0.4
+    # GET /food-items/stream: heartbeat interval, events a subscriber may
+    # fall behind before it is told to resync, and open streams per process
+    # and per user
+    CHANGE_STREAM_HEARTBEAT_SECONDS: float = 15.0
+    CHANGE_STREAM_QUEUE_SIZE: int = 100
+    CHANGE_STREAM_MAX_SUBSCRIBERS: int = 10000
+    CHANGE_STREAM_MAX_PER_USER: int = 20
+
+    # Expiration alerts. Every EXPIRATION_ALERT_INTERVAL_SECONDS, the
+    # scheduler in each API process (or app.commands.send_expiration_alerts
+    # from cron) claims shards of users, records alert rows for items
+    # expiring within EXPIRATION_ALERT_HORIZON_DAYS, which GET
+    # /food-items/expiring-soon/ then reads, and notifies users of items
+    # expiring within EXPIRATION_ALERT_NOTIFY_DAYS.
+    EXPIRATION_ALERT_SCHEDULER: bool = True
+    EXPIRATION_ALERT_INTERVAL_SECONDS: int = 60 * 60
+    EXPIRATION_ALERT_HORIZON_DAYS: int = 30
+    EXPIRATION_ALERT_NOTIFY_DAYS: int = 3
+    EXPIRATION_ALERT_SHARDS: int = 16
+    EXPIRATION_ALERT_BATCH_SIZE: int = 5000
+    # A worker that stops renewing its claim for this long loses the shard
+    EXPIRATION_ALERT_LEASE_SECONDS: int = 300
+    # Comma-separated: "log", "webhook" or "package.module:NotifierClass"
+    EXPIRATION_ALERT_NOTIFIERS: str = "log"
+    EXPIRATION_ALERT_WEBHOOK_URL: Optional[str] = None
+
+    # POST /barcode/batch limits
+    BARCODE_BATCH_MAX_SIZE: int = 100
+    BARCODE_BATCH_CONCURRENCY: int = 8
+    # Coalesce identical lookups across workers through a Redis lock
+    BARCODE_SHARED_LOCK: bool = False
+    BARCODE_SHARED_LOCK_TTL_SECONDS: float = 10.0
+    BARCODE_SHARED_LOCK_POLL_SECONDS: float = 0.05
+
     # First superuser
     FIRST_SUPERUSER: str = "admin@metapantry.com"
     FIRST_SUPERUSER_PASSWORD: str = "admin"
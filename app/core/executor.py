@@ -0,0 +1,81 @@
+import asyncio
+import threading
+import time
+from concurrent.futures import Future, ThreadPoolExecutor
+from typing import Any, Callable
+
+from prometheus_client import Gauge, Histogram
+
+QUEUE_TIME = Histogram(
+    "executor_queue_seconds",
+    "Time tasks wait in a bounded executor before a worker picks them up",
+    ["executor"],
+)
+RUN_TIME = Histogram(
+    "executor_run_seconds",
+    "Time tasks spend running in a bounded executor",
+    ["executor"],
+)
+IN_FLIGHT = Gauge(
+    "executor_tasks_in_flight",
+    "Tasks queued or running in a bounded executor",
+    ["executor"],
+)
+
+
+class ExecutorSaturated(Exception):
+    """
+    Raised when a bounded executor has no free worker or queue slot.
+    """
+
+
+class BoundedExecutor:
+    """
+    Dedicated thread pool for CPU-bound work with a bounded queue. Submitting
+    while `max_workers + max_queue` tasks are already in flight raises
+    ExecutorSaturated instead of queueing without limit.
+    **Parameters**
+    * `name`: Used for thread names and the `executor` metrics label
+    * `max_workers`: Number of worker threads
+    * `max_queue`: Number of tasks allowed to wait for a worker
+    """
+
+    def __init__(self, name: str, max_workers: int, max_queue: int):
+        self.name = name
+        self._pool = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix=name)
+        self._slots = threading.BoundedSemaphore(max_workers + max_queue)
+
+    def submit(self, fn: Callable[..., Any], *args: Any, **kwargs: Any) -> "Future[Any]":
+        if not self._slots.acquire(blocking=False):
+            raise ExecutorSaturated(f"{self.name} executor is saturated")
+        IN_FLIGHT.labels(executor=self.name).inc()
+        queued_at = time.perf_counter()
+
+        def run() -> Any:
+            started = time.perf_counter()
+            QUEUE_TIME.labels(executor=self.name).observe(started - queued_at)
+            try:
+                return fn(*args, **kwargs)
+            finally:
+                RUN_TIME.labels(executor=self.name).observe(time.perf_counter() - started)
+
+        def done(_: "Future[Any]") -> None:
+            IN_FLIGHT.labels(executor=self.name).dec()
+            self._slots.release()
+
+        try:
+            future = self._pool.submit(run)
+        except BaseException:
+            done(None)
+            raise
+        future.add_done_callback(done)
+        return future
+
+    async def run(self, fn: Callable[..., Any], *args: Any, **kwargs: Any) -> Any:
+        """
+        Run `fn` on the pool and await its result without blocking the event loop.
+        """
+        return await asyncio.wrap_future(self.submit(fn, *args, **kwargs))
+
+    def shutdown(self) -> None:
+        self._pool.shutdown(wait=False, cancel_futures=True)
@@ -0,0 +1,391 @@
+import asyncio
+import importlib
+import logging
+import os
+import socket
+import time
+import uuid
+from abc import ABC, abstractmethod
+from datetime import date, datetime, timedelta
+from typing import Any, Dict, List, Optional, Type
+
+from fastapi.encoders import jsonable_encoder
+from prometheus_client import Counter, Histogram
+from sqlalchemy import delete, distinct, func, select, text, update
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from app.core import http
+from app.core.config import settings
+from app.db.session import AsyncSessionLocal
+from app.models.expiration_alert import SHARD_LOCK, ExpirationAlert, ExpirationAlertShard
+from app.models.food_item import FoodItem
+from app.schemas.food_item import FoodItem as FoodItemSchema
+
+logger = logging.getLogger(__name__)
+
+SHARD_RUNS = Histogram("expiration_alert_shard_seconds", "Time spent processing one shard")
+SHARD_ERRORS = Counter("expiration_alert_shard_errors_total", "Shard runs that failed")
+NOTIFICATIONS = Counter(
+    "expiration_alert_notifications_total", "Expiration notifications by notifier and outcome",
+    ["notifier", "status"],
+)
+
+# How often an idle scheduler looks for due shards
+POLL_SECONDS = 60
+
+
+class Notifier(ABC):
+    """
+    Tells a user about items of theirs that expire soon. Subclass it and
+    list it in EXPIRATION_ALERT_NOTIFIERS as "package.module:Class" to add a
+    channel; each instance is created once per process.
+    """
+
+    name = "notifier"
+
+    @abstractmethod
+    async def notify(self, owner_id: uuid.UUID, items: List[FoodItemSchema]) -> None:
+        ...
+
+
+class LogNotifier(Notifier):
+    name = "log"
+
+    async def notify(self, owner_id: uuid.UUID, items: List[FoodItemSchema]) -> None:
+        logger.info(
+            "%d items of user %s expire soon: %s",
+            len(items), owner_id, ", ".join(f"{item.name} ({item.expiration_date})" for item in items),
+        )
+
+
+class WebhookNotifier(Notifier):
+    """
+    POSTs {"owner_id", "items"} to EXPIRATION_ALERT_WEBHOOK_URL.
+    """
+
+    name = "webhook"
+
+    async def notify(self, owner_id: uuid.UUID, items: List[FoodItemSchema]) -> None:
+        if not settings.EXPIRATION_ALERT_WEBHOOK_URL:
+            raise RuntimeError("EXPIRATION_ALERT_WEBHOOK_URL is not set")
+        response = await http.request(
+            "POST",
+            settings.EXPIRATION_ALERT_WEBHOOK_URL,
+            json=jsonable_encoder({"owner_id": owner_id, "items": items}),
+        )
+        response.raise_for_status()
+
+
+NOTIFIERS: Dict[str, Type[Notifier]] = {"log": LogNotifier, "webhook": WebhookNotifier}
+
+
+def load_notifiers(names: str) -> List[Notifier]:
+    notifiers = []
+    for name in filter(None, (name.strip() for name in names.split(","))):
+        if ":" in name:
+            module, _, attr = name.partition(":")
+            notifiers.append(getattr(importlib.import_module(module), attr)())
+        else:
+            notifiers.append(NOTIFIERS[name]())
+    return notifiers
+
+
+def shard_bounds(shards: int) -> List[Dict[str, uuid.UUID]]:
+    """
+    Split the id space into `shards` equal ranges, so that a shard's owners
+    are an index range of any owner_id index.
+    """
+    size = 2 ** 128
+    return [
+        {"lo": uuid.UUID(int=size * i // shards), "hi": uuid.UUID(int=size * (i + 1) // shards - 1)}
+        for i in range(shards)
+    ]
+
+
+# Alert rows for the next batch of the shard's items, in (expiration_date,
+# id) order, so that each batch is a range of ix_fooditem_expiration_date_id.
+# Returns the last key of the batch and its size.
+_SCAN = text("""
+WITH batch AS (
+    SELECT id, owner_id, expiration_date
+    FROM fooditem
+    WHERE expiration_date IS NOT NULL
+      AND (expiration_date, id) > (:after_date, :after_id)
+      AND expiration_date <= :until
+      AND owner_id BETWEEN :lo AND :hi
+    ORDER BY expiration_date, id
+    LIMIT :limit
+), added AS (
+    INSERT INTO expirationalert (food_item_id, owner_id, expiration_date)
+    SELECT id, owner_id, expiration_date FROM batch
+    ON CONFLICT (food_item_id) DO NOTHING
+)
+SELECT expiration_date, id, count(*) OVER () FROM batch ORDER BY expiration_date DESC, id DESC LIMIT 1
+""")
+
+
+class ShardLost(Exception):
+    """
+    Raised when another worker took over the shard after our claim expired.
+    """
+
+
+class ExpirationAlertScheduler:
+    """
+    Precomputes expiration alerts and sends notifications, shard by shard.
+
+    Owners are split by id into EXPIRATION_ALERT_SHARDS ranges. A worker
+    claims a due shard for EXPIRATION_ALERT_LEASE_SECONDS and renews the
+    claim with every batch, so any number of workers split the shards
+    between them and no shard is processed by two at once. A shard is due
+    EXPIRATION_ALERT_INTERVAL_SECONDS after its last run, or as soon as the
+    date changes.
+
+    Processing a shard moves its covered_until to today plus
+    EXPIRATION_ALERT_HORIZON_DAYS, adds alert rows for the items that
+    expire in the newly covered days in EXPIRATION_ALERT_BATCH_SIZE
+    batches, drops those of items that have expired, and notifies each
+    owner once of the items expiring within EXPIRATION_ALERT_NOTIFY_DAYS.
+    """
+
+    def __init__(self):
+        self.worker = f"{socket.gethostname()}:{os.getpid()}:{uuid.uuid4().hex[:8]}"
+        self.notifiers: List[Notifier] = []
+        self._task: Optional["asyncio.Task[None]"] = None
+
+    async def start(self) -> None:
+        if settings.EXPIRATION_ALERT_SCHEDULER:
+            self.notifiers = load_notifiers(settings.EXPIRATION_ALERT_NOTIFIERS)
+            self._task = asyncio.create_task(self._loop())
+
+    async def stop(self) -> None:
+        if self._task is not None:
+            self._task.cancel()
+            await asyncio.gather(self._task, return_exceptions=True)
+            self._task = None
+
+    async def ensure_shards(self) -> None:
+        """
+        Create the EXPIRATION_ALERT_SHARDS shards, replacing shards of
+        another count. New shards cover nothing until they are first
+        processed, and GET /food-items/expiring-soon/ queries fooditem
+        directly meanwhile.
+        """
+        count_shards = select(func.count()).select_from(ExpirationAlertShard)
+        async with AsyncSessionLocal() as db:
+            if await db.scalar(count_shards) == settings.EXPIRATION_ALERT_SHARDS:
+                return
+            # Workers starting together must not both replace the shards
+            await db.execute(text("LOCK TABLE expirationalertshard IN EXCLUSIVE MODE"))
+            if await db.scalar(count_shards) != settings.EXPIRATION_ALERT_SHARDS:
+                await db.execute(delete(ExpirationAlertShard))
+                await db.execute(
+                    ExpirationAlertShard.__table__.insert(),
+                    [
+                        {"id": i, **bounds}
+                        for i, bounds in enumerate(shard_bounds(settings.EXPIRATION_ALERT_SHARDS))
+                    ],
+                )
+            await db.commit()
+
+    async def run_due(self) -> int:
+        """
+        Process due shards until there are none left. Returns how many were
+        processed.
+        """
+        processed = 0
+        while True:
+            shard = await self._claim()
+            if shard is None:
+                return processed
+            started = time.perf_counter()
+            try:
+                await self._process(shard)
+                processed += 1
+            except ShardLost:
+                logger.warning("Lost the claim on expiration alert shard %d", shard.id)
+            except Exception:
+                SHARD_ERRORS.inc()
+                logger.exception("Failed to process expiration alert shard %d", shard.id)
+                await self._release(shard, finished=False)
+            finally:
+                SHARD_RUNS.observe(time.perf_counter() - started)
+
+    async def _loop(self) -> None:
+        while True:
+            try:
+                await self.ensure_shards()
+                await self.run_due()
+            except asyncio.CancelledError:
+                raise
+            except Exception:
+                logger.exception("Expiration alert scheduler failed")
+            await asyncio.sleep(min(POLL_SECONDS, settings.EXPIRATION_ALERT_INTERVAL_SECONDS))
+
+    async def _claim(self) -> Optional[ExpirationAlertShard]:
+        due = (
+            select(ExpirationAlertShard.id)
+            .where(
+                (ExpirationAlertShard.claimed_until.is_(None))
+                | (ExpirationAlertShard.claimed_until < func.now()),
+                (ExpirationAlertShard.last_run_at.is_(None))
+                | (ExpirationAlertShard.scanned_until < self._until())
+                | (
+                    ExpirationAlertShard.last_run_at
+                    <= func.now() - timedelta(seconds=settings.EXPIRATION_ALERT_INTERVAL_SECONDS)
+                ),
+            )
+            .order_by(ExpirationAlertShard.last_run_at.asc().nulls_first(), ExpirationAlertShard.id)
+            .limit(1)
+            .with_for_update(skip_locked=True)
+            .scalar_subquery()
+        )
+        async with AsyncSessionLocal() as db:
+            shard = await db.scalar(
+                update(ExpirationAlertShard)
+                .where(ExpirationAlertShard.id == due)
+                .values(claimed_by=self.worker, claimed_until=self._lease())
+                .returning(ExpirationAlertShard)
+            )
+            await db.commit()
+            return shard
+
+    def _until(self) -> date:
+        return date.today() + timedelta(days=settings.EXPIRATION_ALERT_HORIZON_DAYS)
+
+    def _lease(self) -> Any:
+        return func.now() + timedelta(seconds=settings.EXPIRATION_ALERT_LEASE_SECONDS)
+
+    async def _renew(self, db: AsyncSession, shard: ExpirationAlertShard, **values: Any) -> None:
+        # In the same transaction as the batch, which is rolled back when the
+        # claim was lost
+        renewed = await db.scalar(
+            update(ExpirationAlertShard)
+            .where(ExpirationAlertShard.id == shard.id, ExpirationAlertShard.claimed_by == self.worker)
+            .values(claimed_until=self._lease(), **values)
+            .returning(ExpirationAlertShard.id)
+        )
+        if renewed is None:
+            raise ShardLost()
+
+    async def _release(self, shard: ExpirationAlertShard, *, finished: bool) -> None:
+        values: Dict[str, Any] = {"claimed_by": None, "claimed_until": None}
+        if finished:
+            values["last_run_at"] = func.now()
+        async with AsyncSessionLocal() as db:
+            await db.execute(
+                update(ExpirationAlertShard)
+                .where(ExpirationAlertShard.id == shard.id, ExpirationAlertShard.claimed_by == self.worker)
+                .values(**values)
+            )
+            await db.commit()
+
+    async def _process(self, shard: ExpirationAlertShard) -> None:
+        today = date.today()
+        yesterday = today - timedelta(days=1)
+        until = max(self._until(), shard.covered_until or today)
+        # Days up to scanned_until were scanned before, or have passed
+        after = max(shard.scanned_until or yesterday, yesterday)
+        if shard.covered_until != until:
+            async with AsyncSessionLocal() as db:
+                # Waits for writes that saw the old covered_until to commit;
+                # later ones see the new one and add their own alert rows
+                await db.execute(select(func.pg_advisory_xact_lock(SHARD_LOCK, shard.id)))
+                await self._renew(db, shard, covered_until=until)
+                await db.commit()
+        if after < until:
+            await self._scan(shard, after, until)
+        async with AsyncSessionLocal() as db:
+            await db.execute(
+                delete(ExpirationAlert).where(
+                    ExpirationAlert.owner_id.between(shard.lo, shard.hi),
+                    ExpirationAlert.expiration_date < today,
+                )
+            )
+            await self._renew(db, shard, scanned_until=until)
+            await db.commit()
+        await self._notify(shard, today + timedelta(days=settings.EXPIRATION_ALERT_NOTIFY_DAYS))
+        await self._release(shard, finished=True)
+
+    async def _scan(self, shard: ExpirationAlertShard, after: date, until: date) -> None:
+        # uuid.UUID(int=max) sorts after every id, so the first batch starts
+        # right after the `after` date
+        key = (after, uuid.UUID(int=2 ** 128 - 1))
+        while True:
+            async with AsyncSessionLocal() as db:
+                last = (
+                    await db.execute(
+                        _SCAN,
+                        {
+                            "after_date": key[0], "after_id": key[1], "until": until,
+                            "lo": shard.lo, "hi": shard.hi, "limit": settings.EXPIRATION_ALERT_BATCH_SIZE,
+                        },
+                    )
+                ).first()
+                await self._renew(db, shard)
+                await db.commit()
+            if last is None or last[2] < settings.EXPIRATION_ALERT_BATCH_SIZE:
+                return
+            key = (last[0], last[1])
+
+    async def _notify(self, shard: ExpirationAlertShard, until: date) -> None:
+        """
+        Notify the shard's owners of their unnotified alerts expiring up to
+        `until`, EXPIRATION_ALERT_BATCH_SIZE owners at a time. Each batch is
+        marked notified, with the claim renewed, and committed before it is
+        sent, so a worker that lost the shard sends nothing and notifications
+        are never sent twice. Alerts stay marked whether or not a notifier
+        failed; failures are logged and counted rather than retried.
+        """
+        pending = (
+            ExpirationAlert.owner_id.between(shard.lo, shard.hi),
+            ExpirationAlert.notified_at.is_(None),
+            ExpirationAlert.expiration_date <= until,
+        )
+        after: Optional[uuid.UUID] = None
+        while True:
+            async with AsyncSessionLocal() as db:
+                owners = select(distinct(ExpirationAlert.owner_id)).where(*pending)
+                if after is not None:
+                    owners = owners.where(ExpirationAlert.owner_id > after)
+                owner_ids = (
+                    await db.scalars(
+                        owners.order_by(ExpirationAlert.owner_id).limit(settings.EXPIRATION_ALERT_BATCH_SIZE)
+                    )
+                ).all()
+                if not owner_ids:
+                    return
+                items = (
+                    await db.scalars(
+                        select(FoodItem)
+                        .join(ExpirationAlert, ExpirationAlert.food_item_id == FoodItem.id)
+                        .where(*pending, ExpirationAlert.owner_id.in_(owner_ids))
+                        .order_by(FoodItem.owner_id, FoodItem.expiration_date, FoodItem.id)
+                    )
+                ).all()
+                by_owner: Dict[uuid.UUID, List[FoodItemSchema]] = {}
+                for item in items:
+                    by_owner.setdefault(item.owner_id, []).append(FoodItemSchema.model_validate(item))
+                await db.execute(
+                    update(ExpirationAlert)
+                    .where(ExpirationAlert.food_item_id.in_([item.id for item in items]))
+                    .values(notified_at=datetime.utcnow())
+                )
+                await self._renew(db, shard)
+                await db.commit()
+            await asyncio.gather(
+                *(self._send(owner_id, owner_items) for owner_id, owner_items in by_owner.items())
+            )
+            after = owner_ids[-1]
+
+    async def _send(self, owner_id: uuid.UUID, items: List[FoodItemSchema]) -> None:
+        for notifier in self.notifiers:
+            try:
+                await notifier.notify(owner_id, items)
+                NOTIFICATIONS.labels(notifier=notifier.name, status="sent").inc()
+            except Exception:
+                NOTIFICATIONS.labels(notifier=notifier.name, status="failed").inc()
+                logger.warning("Notifier %s failed for user %s", notifier.name, owner_id, exc_info=True)
+
+
+expiration_alerts = ExpirationAlertScheduler()
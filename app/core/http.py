@@ -0,0 +1,70 @@
+import asyncio
+from typing import Any, Dict, Optional
+
+import httpx
+
+from app.core.config import settings
+
+_client: Optional[httpx.AsyncClient] = None
+_host_slots: Dict[str, asyncio.Semaphore] = {}
+
+
+async def init_http_client() -> None:
+    """
+    Create the shared outbound HTTP client. Called on application startup.
+    """
+    global _client
+    if _client is not None:
+        return
+    _client = httpx.AsyncClient(
+        limits=httpx.Limits(
+            max_connections=settings.HTTP_MAX_CONNECTIONS,
+            max_keepalive_connections=settings.HTTP_MAX_KEEPALIVE_CONNECTIONS,
+            keepalive_expiry=settings.HTTP_KEEPALIVE_EXPIRY_SECONDS,
+        ),
+        timeout=httpx.Timeout(
+            settings.HTTP_READ_TIMEOUT_SECONDS,
+            connect=settings.HTTP_CONNECT_TIMEOUT_SECONDS,
+            pool=settings.HTTP_POOL_TIMEOUT_SECONDS,
+        ),
+    )
+
+
+async def close_http_client() -> None:
+    """
+    Close the shared outbound HTTP client. Called on application shutdown.
+    """
+    global _client
+    if _client is not None:
+        await _client.aclose()
+        _client = None
+    _host_slots.clear()
+
+
+def get_http_client() -> httpx.AsyncClient:
+    if _client is None:
+        raise RuntimeError("HTTP client is not initialized")
+    return _client
+
+
+def _host_slot(host: str) -> asyncio.Semaphore:
+    slot = _host_slots.get(host)
+    if slot is None:
+        slot = _host_slots[host] = asyncio.Semaphore(
+            settings.HTTP_MAX_CONNECTIONS_PER_HOST
+        )
+    return slot
+
+
+async def request(method: str, url: str, **kwargs: Any) -> httpx.Response:
+    """
+    Send a request through the shared client, holding one of the
+    HTTP_MAX_CONNECTIONS_PER_HOST slots of the target host meanwhile.
+    """
+    client = get_http_client()
+    async with _host_slot(httpx.URL(url).host):
+        return await client.request(method, url, **kwargs)
+
+
+async def get(url: str, **kwargs: Any) -> httpx.Response:
+    return await request("GET", url, **kwargs)
@@ -0,0 +1,153 @@
+import hashlib
+import logging
+import time
+from dataclasses import dataclass, field
+from io import BytesIO
+from typing import Dict, Optional
+
+from PIL import Image, ImageOps
+from prometheus_client import Histogram
+
+from app.core.config import settings
+from app.core.executor import BoundedExecutor
+
+logger = logging.getLogger(__name__)
+
+# CPU-bound image work (decode, resize, re-encode) runs here so it never
+# blocks the event loop
+image_executor = BoundedExecutor(
+    "image",
+    max_workers=settings.IMAGE_WORKERS,
+    max_queue=settings.IMAGE_QUEUE_SIZE,
+)
+
+STAGE_TIME = Histogram(
+    "image_preprocess_seconds",
+    "Time spent per image preprocessing stage",
+    ["stage"],
+)
+IMAGE_BYTES = Histogram(
+    "image_preprocess_bytes",
+    "Image size before and after preprocessing",
+    ["direction"],
+    buckets=(16e3, 64e3, 128e3, 256e3, 512e3, 1e6, 2e6, 4e6, 8e6, 16e6),
+)
+
+EXIF_ORIENTATION = 0x0112
+
+
+class InvalidImage(ValueError):
+    pass
+
+
+@dataclass
+class PreprocessedImage:
+    data: bytes  # JPEG, at most IMAGE_MAX_DIMENSION pixels on its longer side
+    bytes_in: int
+    reencoded: bool
+    timings: Dict[str, float] = field(default_factory=dict)  # stage -> seconds
+    dhash: Optional[int] = None  # perceptual hash, see IMAGE_CACHE_PERCEPTUAL
+
+    @property
+    def bytes_out(self) -> int:
+        return len(self.data)
+
+    @property
+    def digest(self) -> str:
+        return hashlib.sha256(self.data).hexdigest()
+
+    def server_timing(self) -> str:
+        return ", ".join(
+            f"{stage};dur={seconds * 1000:.1f}" for stage, seconds in self.timings.items()
+        )
+
+
+def _passthrough(image: Image.Image, size: int) -> bool:
+    """
+    Small, upright RGB JPEGs are sent as uploaded.
+    """
+    return (
+        image.format == "JPEG"
+        and image.mode in ("RGB", "L")
+        and max(image.size) <= settings.IMAGE_MAX_DIMENSION
+        and size <= settings.IMAGE_PASSTHROUGH_MAX_BYTES
+        and image.getexif().get(EXIF_ORIENTATION, 1) == 1
+    )
+
+
+def dhash(image: Image.Image) -> int:
+    """
+    64-bit difference hash: one bit per horizontally adjacent pixel pair of
+    a 9x8 grayscale thumbnail. Near-identical images differ in a few bits.
+    """
+    pixels = list(image.convert("L").resize((9, 8)).getdata())
+    bits = 0
+    for row in range(8):
+        for col in range(8):
+            left = pixels[row * 9 + col]
+            right = pixels[row * 9 + col + 1]
+            bits = (bits << 1) | (left > right)
+    return bits
+
+
+def preprocess_image(contents: bytes) -> PreprocessedImage:
+    """
+    Bound an uploaded image before it is sent to the vision model: decode at
+    reduced size where the format allows it, apply the EXIF orientation,
+    downscale to IMAGE_MAX_DIMENSION and re-encode as JPEG at
+    IMAGE_JPEG_QUALITY. Raises InvalidImage if the upload cannot be decoded.
+    """
+    max_dimension = settings.IMAGE_MAX_DIMENSION
+    result = PreprocessedImage(data=contents, bytes_in=len(contents), reencoded=False)
+    clock = time.perf_counter()
+
+    def stage(name: str) -> None:
+        nonlocal clock
+        now = time.perf_counter()
+        result.timings[name] = now - clock
+        clock = now
+
+    try:
+        image = Image.open(BytesIO(contents))
+        if _passthrough(image, len(contents)):
+            if settings.IMAGE_CACHE_PERCEPTUAL:
+                # A grayscale decode at 1/8 scale is plenty for the hash
+                image.draft("L", (64, 64))
+                result.dhash = dhash(image)
+            stage("decode")
+        else:
+            # JPEGs are decoded straight at the smallest DCT scale that is
+            # still at least max_dimension, instead of at full resolution
+            image.draft("RGB", (max_dimension, max_dimension))
+            image.load()
+            stage("decode")
+
+            ImageOps.exif_transpose(image, in_place=True)
+            stage("orient")
+
+            image.thumbnail((max_dimension, max_dimension))
+            if image.mode != "RGB":
+                image = image.convert("RGB")
+            stage("resize")
+
+            buffer = BytesIO()
+            image.save(buffer, format="JPEG", quality=settings.IMAGE_JPEG_QUALITY)
+            result.data = buffer.getvalue()
+            result.reencoded = True
+            stage("encode")
+
+            if settings.IMAGE_CACHE_PERCEPTUAL:
+                result.dhash = dhash(image)
+                stage("hash")
+    except Exception as e:
+        raise InvalidImage(str(e)) from e
+
+    for name, seconds in result.timings.items():
+        STAGE_TIME.labels(stage=name).observe(seconds)
+    IMAGE_BYTES.labels(direction="in").observe(result.bytes_in)
+    IMAGE_BYTES.labels(direction="out").observe(result.bytes_out)
+    logger.debug(
+        "Preprocessed image: %d -> %d bytes (%s)",
+        result.bytes_in, result.bytes_out, result.server_timing(),
+    )
+    return result
@@ -0,0 +1,441 @@
+import asyncio
+import ipaddress
+import json
+import logging
+import os
+import socket
+import time
+import uuid
+from datetime import datetime
+from typing import Any, Awaitable, Callable, Dict, List, Optional, Tuple, Type
+
+import httpx
+import redis
+from fastapi.encoders import jsonable_encoder
+from prometheus_client import Counter, Gauge, Histogram
+
+from app.core import http
+from app.core.cache import MISSING, LRUCache
+from app.core.config import settings
+from app.core.redis import get_async_redis
+
+logger = logging.getLogger(__name__)
+
+QUEUE_DEPTH = Gauge("job_queue_depth", "Jobs waiting for a worker", ["queue"])
+WAIT_TIME = Histogram("job_wait_seconds", "Time from submission to first start", ["queue"])
+RUN_TIME = Histogram("job_run_seconds", "Time spent running one attempt", ["queue"])
+JOBS = Counter("jobs_total", "Finished jobs by outcome", ["queue", "status"])
+RETRIES = Counter("job_retries_total", "Job attempts that were retried", ["queue"])
+
+Handler = Callable[[Dict[str, Any], bytes], Awaitable[Dict[str, Any]]]
+
+
+class QueueFull(Exception):
+    """
+    Raised when the queue or the submitting user's job allowance is full.
+    """
+
+
+class InvalidCallbackUrl(ValueError):
+    """
+    Raised for a callback URL the server must not POST to.
+    """
+
+
+async def check_callback_url(url: str) -> None:
+    """
+    Raise InvalidCallbackUrl unless `url` is https, its host is in
+    JOB_CALLBACK_ALLOWED_HOSTS when that is set, and every address the host
+    resolves to is public: no loopback, private, link-local (cloud
+    metadata) or reserved addresses.
+    """
+    try:
+        parsed = httpx.URL(url)
+    except httpx.InvalidURL as e:
+        raise InvalidCallbackUrl("Invalid callback URL") from e
+    if parsed.scheme != "https" or not parsed.host:
+        raise InvalidCallbackUrl("Callback URL must be https")
+    allowed = {host.strip().lower() for host in settings.JOB_CALLBACK_ALLOWED_HOSTS.split(",") if host.strip()}
+    if allowed and parsed.host.lower() not in allowed:
+        raise InvalidCallbackUrl("Callback host is not allowed")
+    try:
+        addresses = await asyncio.get_running_loop().getaddrinfo(
+            parsed.host, parsed.port or 443, type=socket.SOCK_STREAM
+        )
+    except socket.gaierror as e:
+        raise InvalidCallbackUrl("Callback host does not resolve") from e
+    for *_, sockaddr in addresses:
+        address = ipaddress.ip_address(sockaddr[0].split("%")[0])
+        if not address.is_global:
+            raise InvalidCallbackUrl("Callback host resolves to a non-public address")
+
+
+class MemoryJobBackend:
+    """
+    In-process job storage and queue. Jobs only live as long as the worker
+    process, which makes this backend suitable for tests and single-process
+    deployments.
+    """
+
+    def __init__(self):
+        self.jobs = LRUCache(maxsize=100000, ttl=settings.JOB_RESULT_TTL_SECONDS)
+        self.payloads: Dict[str, bytes] = {}
+        self.active: Dict[str, int] = {}
+        self.queue: "asyncio.Queue[str]" = asyncio.Queue()
+
+    async def save(self, job: Dict[str, Any]) -> None:
+        self.jobs.set(job["id"], dict(job))
+
+    async def get(self, job_id: str) -> Optional[Dict[str, Any]]:
+        job = self.jobs.get(job_id)
+        return None if job is MISSING else dict(job)
+
+    async def save_payload(self, job_id: str, payload: bytes) -> None:
+        self.payloads[job_id] = payload
+
+    async def get_payload(self, job_id: str) -> Optional[bytes]:
+        return self.payloads.get(job_id)
+
+    async def delete_payload(self, job_id: str) -> None:
+        self.payloads.pop(job_id, None)
+
+    async def acquire_user_slot(self, owner_id: str, limit: int) -> bool:
+        if self.active.get(owner_id, 0) >= limit:
+            return False
+        self.active[owner_id] = self.active.get(owner_id, 0) + 1
+        return True
+
+    async def release_user_slot(self, owner_id: str) -> None:
+        remaining = self.active.get(owner_id, 0) - 1
+        if remaining > 0:
+            self.active[owner_id] = remaining
+        else:
+            self.active.pop(owner_id, None)
+
+    async def push(self, job_id: str) -> None:
+        self.queue.put_nowait(job_id)
+
+    async def pop(self, timeout: float) -> Optional[str]:
+        try:
+            return await asyncio.wait_for(self.queue.get(), timeout)
+        except asyncio.TimeoutError:
+            return None
+
+    async def ack(self, job_id: str) -> None:
+        pass
+
+    async def requeue(self, job_id: str) -> None:
+        await self.push(job_id)
+
+    async def heartbeat(self) -> None:
+        pass
+
+    async def reclaim(self) -> int:
+        return 0
+
+    async def leave(self) -> None:
+        pass
+
+    async def depth(self) -> int:
+        return self.queue.qsize()
+
+
+# Decrement a counter without letting it go below zero, e.g. after it expired
+_RELEASE = """
+local remaining = redis.call('DECR', KEYS[1])
+if remaining <= 0 then
+    redis.call('DEL', KEYS[1])
+end
+return remaining
+"""
+
+
+class RedisJobBackend:
+    """
+    Job storage and queue in Redis, shared by every worker process.
+
+    A popped job moves atomically to this process's processing list until it
+    is acknowledged. Each process keeps a heartbeat key alive for
+    JOB_LEASE_SECONDS; the jobs in the processing list of a process whose
+    heartbeat expired, i.e. that crashed, are moved back to the queue by the
+    others.
+    """
+
+    def __init__(self, name: str):
+        self.prefix = f"jobs:{name}:"
+        self.worker = f"{socket.gethostname()}:{os.getpid()}:{uuid.uuid4().hex[:8]}"
+
+    @property
+    def client(self) -> Any:
+        return get_async_redis()
+
+    async def save(self, job: Dict[str, Any]) -> None:
+        await self.client.set(
+            self.prefix + job["id"], json.dumps(job), ex=settings.JOB_RESULT_TTL_SECONDS
+        )
+
+    async def get(self, job_id: str) -> Optional[Dict[str, Any]]:
+        raw = await self.client.get(self.prefix + job_id)
+        return json.loads(raw) if raw is not None else None
+
+    async def save_payload(self, job_id: str, payload: bytes) -> None:
+        await self.client.set(
+            self.prefix + "payload:" + job_id, payload, ex=settings.JOB_RESULT_TTL_SECONDS
+        )
+
+    async def get_payload(self, job_id: str) -> Optional[bytes]:
+        return await self.client.get(self.prefix + "payload:" + job_id)
+
+    async def delete_payload(self, job_id: str) -> None:
+        await self.client.delete(self.prefix + "payload:" + job_id)
+
+    async def acquire_user_slot(self, owner_id: str, limit: int) -> bool:
+        key = self.prefix + "active:" + owner_id
+        active = await self.client.incr(key)
+        # Do not let a crashed worker pin the counter forever
+        await self.client.expire(key, settings.JOB_RESULT_TTL_SECONDS)
+        if active > limit:
+            await self.client.decr(key)
+            return False
+        return True
+
+    async def release_user_slot(self, owner_id: str) -> None:
+        await self.client.eval(_RELEASE, 1, self.prefix + "active:" + owner_id)
+
+    def _processing(self, worker: str) -> str:
+        return self.prefix + "processing:" + worker
+
+    def _heartbeat(self, worker: str) -> str:
+        return self.prefix + "worker:" + worker
+
+    async def push(self, job_id: str) -> None:
+        await self.client.rpush(self.prefix + "queue", job_id)
+
+    async def pop(self, timeout: float) -> Optional[str]:
+        item = await self.client.blmove(
+            self.prefix + "queue", self._processing(self.worker), timeout, "LEFT", "RIGHT"
+        )
+        return item.decode() if item is not None else None
+
+    async def ack(self, job_id: str) -> None:
+        await self.client.lrem(self._processing(self.worker), 1, job_id)
+
+    async def requeue(self, job_id: str) -> None:
+        async with self.client.pipeline(transaction=True) as pipe:
+            pipe.lrem(self._processing(self.worker), 1, job_id)
+            pipe.rpush(self.prefix + "queue", job_id)
+            await pipe.execute()
+
+    async def heartbeat(self) -> None:
+        await self.client.set(self._heartbeat(self.worker), 1, ex=settings.JOB_LEASE_SECONDS)
+        await self.client.sadd(self.prefix + "workers", self.worker)
+
+    async def reclaim(self) -> int:
+        """
+        Move the jobs of processes whose heartbeat expired back to the
+        queue. Returns how many were moved.
+        """
+        moved = 0
+        for raw in await self.client.smembers(self.prefix + "workers"):
+            worker = raw.decode()
+            if worker == self.worker or await self.client.exists(self._heartbeat(worker)):
+                continue
+            while await self.client.lmove(
+                self._processing(worker), self.prefix + "queue", "LEFT", "RIGHT"
+            ) is not None:
+                moved += 1
+            await self.client.srem(self.prefix + "workers", worker)
+        return moved
+
+    async def leave(self) -> None:
+        await self.client.delete(self._heartbeat(self.worker))
+        await self.client.srem(self.prefix + "workers", self.worker)
+
+    async def depth(self) -> int:
+        return await self.client.llen(self.prefix + "queue")
+
+
+class JobQueue:
+    """
+    Background jobs processed by a bounded set of worker tasks, with per-user
+    caps on active jobs, retries with exponential backoff and optional
+    webhook delivery of the finished job.
+    **Parameters**
+    * `name`: Queue name, used for Redis keys and metrics labels
+    * `handler`: Coroutine taking the job's params and payload and returning its result
+    * `retry_on`: Exception types that are retried; anything else fails the job
+    """
+
+    def __init__(self, name: str, handler: Handler, retry_on: Tuple[Type[BaseException], ...] = ()):
+        self.name = name
+        self.handler = handler
+        self.retry_on = retry_on
+        self.backend: Any = None
+        self._workers: List["asyncio.Task[None]"] = []
+        self._maintenance: Optional["asyncio.Task[None]"] = None
+
+    async def start(self) -> None:
+        if settings.JOB_BACKEND == "redis":
+            self.backend = RedisJobBackend(self.name)
+        else:
+            self.backend = MemoryJobBackend()
+        try:
+            await self.backend.heartbeat()
+        except redis.RedisError:
+            logger.warning("Job backend unavailable", exc_info=True)
+        self._maintenance = asyncio.create_task(self._maintain())
+        self._workers = [
+            asyncio.create_task(self._work()) for _ in range(settings.JOB_WORKERS)
+        ]
+
+    async def stop(self) -> None:
+        for worker in self._workers:
+            worker.cancel()
+        await asyncio.gather(*self._workers, return_exceptions=True)
+        self._workers = []
+        if self._maintenance is not None:
+            self._maintenance.cancel()
+            await asyncio.gather(self._maintenance, return_exceptions=True)
+            self._maintenance = None
+        try:
+            await self.backend.leave()
+        except redis.RedisError:
+            logger.warning("Job backend unavailable", exc_info=True)
+
+    async def submit(
+        self,
+        *,
+        owner_id: str,
+        params: Dict[str, Any],
+        payload: bytes,
+        callback_url: Optional[str] = None,
+    ) -> Dict[str, Any]:
+        """
+        Queue a job and return its record. Raises QueueFull when the queue
+        holds JOB_QUEUE_MAX jobs or the user has JOB_MAX_ACTIVE_PER_USER
+        jobs queued or running, and InvalidCallbackUrl (see
+        check_callback_url).
+        """
+        if callback_url is not None:
+            await check_callback_url(callback_url)
+        if await self.backend.depth() >= settings.JOB_QUEUE_MAX:
+            raise QueueFull("Too many jobs are queued, try again later")
+        if not await self.backend.acquire_user_slot(owner_id, settings.JOB_MAX_ACTIVE_PER_USER):
+            raise QueueFull(
+                f"At most {settings.JOB_MAX_ACTIVE_PER_USER} jobs can be queued or running per user"
+            )
+        job = {
+            "id": uuid.uuid4().hex,
+            "owner_id": owner_id,
+            "status": "queued",
+            "attempts": 0,
+            "params": params,
+            "callback_url": callback_url,
+            "created_at": datetime.utcnow().isoformat(),
+            "started_at": None,
+            "finished_at": None,
+            "result": None,
+            "error": None,
+        }
+        try:
+            await self.backend.save_payload(job["id"], payload)
+            await self.backend.save(job)
+            await self.backend.push(job["id"])
+        except BaseException:
+            await self.backend.release_user_slot(owner_id)
+            raise
+        QUEUE_DEPTH.labels(queue=self.name).set(await self.backend.depth())
+        return job
+
+    async def get(self, job_id: str) -> Optional[Dict[str, Any]]:
+        return await self.backend.get(job_id)
+
+    async def _work(self) -> None:
+        while True:
+            try:
+                job_id = await self.backend.pop(timeout=1.0)
+                if job_id is None:
+                    continue
+                QUEUE_DEPTH.labels(queue=self.name).set(await self.backend.depth())
+                job = await self.backend.get(job_id)
+                if job is not None and job["finished_at"] is None:
+                    await self._run(job)
+                await self.backend.ack(job_id)
+            except asyncio.CancelledError:
+                raise
+            except redis.RedisError:
+                logger.warning("Job backend unavailable", exc_info=True)
+                await asyncio.sleep(1.0)
+            except Exception:
+                logger.exception("Job worker failed")
+
+    async def _maintain(self) -> None:
+        # Keep this process's jobs claimed and take back those of crashed ones
+        while True:
+            await asyncio.sleep(settings.JOB_LEASE_SECONDS / 3)
+            try:
+                await self.backend.heartbeat()
+                reclaimed = await self.backend.reclaim()
+                if reclaimed:
+                    logger.warning("Requeued %d jobs of crashed workers", reclaimed)
+            except asyncio.CancelledError:
+                raise
+            except redis.RedisError:
+                logger.warning("Job backend unavailable", exc_info=True)
+
+    async def _run(self, job: Dict[str, Any]) -> None:
+        payload = await self.backend.get_payload(job["id"])
+        if job["started_at"] is None:
+            job["started_at"] = datetime.utcnow().isoformat()
+            WAIT_TIME.labels(queue=self.name).observe(
+                (datetime.utcnow() - datetime.fromisoformat(job["created_at"])).total_seconds()
+            )
+        job["status"] = "running"
+        await self.backend.save(job)
+        try:
+            await self._attempt(job, payload)
+        except asyncio.CancelledError:
+            # Shutting down: hand the job back to the queue
+            job["status"] = "queued"
+            await self.backend.save(job)
+            await self.backend.requeue(job["id"])
+            raise
+        job["finished_at"] = datetime.utcnow().isoformat()
+        JOBS.labels(queue=self.name, status=job["status"]).inc()
+        await self.backend.save(job)
+        await self.backend.delete_payload(job["id"])
+        await self.backend.release_user_slot(job["owner_id"])
+        if job["callback_url"]:
+            await self._notify(job)
+
+    async def _attempt(self, job: Dict[str, Any], payload: Optional[bytes]) -> None:
+        while True:
+            job["attempts"] += 1
+            started = time.perf_counter()
+            try:
+                if payload is None:
+                    raise LookupError("Job payload expired")
+                job["result"] = jsonable_encoder(await self.handler(job["params"], payload))
+                job["status"] = "succeeded"
+                return
+            except self.retry_on as e:
+                if job["attempts"] >= settings.JOB_MAX_ATTEMPTS:
+                    job["status"], job["error"] = "failed", str(e)
+                    return
+                RETRIES.labels(queue=self.name).inc()
+            except Exception as e:
+                job["status"], job["error"] = "failed", str(e)
+                return
+            finally:
+                RUN_TIME.labels(queue=self.name).observe(time.perf_counter() - started)
+            await asyncio.sleep(settings.JOB_RETRY_BACKOFF_SECONDS * 2 ** (job["attempts"] - 1))
+
+    async def _notify(self, job: Dict[str, Any]) -> None:
+        body = {key: value for key, value in job.items() if key not in ("owner_id", "params")}
+        try:
+            # Again, as the host may resolve differently by now
+            await check_callback_url(job["callback_url"])
+            response = await http.request("POST", job["callback_url"], json=body)
+            response.raise_for_status()
+        except Exception:
+            logger.warning("Webhook delivery failed for job %s", job["id"], exc_info=True)
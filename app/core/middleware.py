@@ -0,0 +1,45 @@
+from starlette.exceptions import HTTPException
+from starlette.responses import JSONResponse
+from starlette.types import ASGIApp, Message, Receive, Scope, Send
+
+BODY_TOO_LARGE = "Request body too large"
+
+
+class BodySizeLimitMiddleware:
+    """
+    Reject request bodies larger than `max_bytes` on paths starting with
+    `path_prefix` with 413, before they are parsed or spooled to disk. The
+    Content-Length header is checked up front and chunked bodies are counted
+    while they stream in.
+    """
+
+    def __init__(self, app: ASGIApp, *, max_bytes: int, path_prefix: str):
+        self.app = app
+        self.max_bytes = max_bytes
+        self.path_prefix = path_prefix
+
+    async def __call__(self, scope: Scope, receive: Receive, send: Send) -> None:
+        if scope["type"] != "http" or not scope["path"].startswith(self.path_prefix):
+            await self.app(scope, receive, send)
+            return
+
+        content_length = dict(scope["headers"]).get(b"content-length")
+        if content_length is not None and content_length.isdigit() and int(content_length) > self.max_bytes:
+            response = JSONResponse({"detail": BODY_TOO_LARGE}, status_code=413)
+            await response(scope, receive, send)
+            return
+
+        received = 0
+
+        async def limited_receive() -> Message:
+            nonlocal received
+            message = await receive()
+            if message["type"] == "http.request":
+                received += len(message.get("body", b""))
+                if received > self.max_bytes:
+                    # Raised while the endpoint parses its body, so it is
+                    # rendered by the regular HTTPException handler
+                    raise HTTPException(status_code=413, detail=BODY_TOO_LARGE)
+            return message
+
+        await self.app(scope, limited_receive, send)
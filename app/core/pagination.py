@@ -0,0 +1,36 @@
+import base64
+import json
+from typing import Any, Callable, Sequence, Tuple
+
+from fastapi.encoders import jsonable_encoder
+
+
+class InvalidCursor(ValueError):
+    pass
+
+
+def encode_cursor(order: str, *values: Any) -> str:
+    """
+    Opaque cursor pointing just past a row with the given sort key values.
+    `order` names the ordering, so a cursor cannot be replayed against a
+    listing sorted differently.
+    """
+    raw = json.dumps([order, *jsonable_encoder(list(values))], separators=(",", ":"))
+    return base64.urlsafe_b64encode(raw.encode()).decode().rstrip("=")
+
+
+def decode_cursor(cursor: str, order: str, types: Sequence[Callable[[str], Any]]) -> Tuple[Any, ...]:
+    """
+    Sort key values encoded in `cursor`, each parsed with the matching entry
+    of `types`. Raises InvalidCursor.
+    """
+    try:
+        raw = base64.urlsafe_b64decode(cursor + "=" * (-len(cursor) % 4))
+        cursor_order, *values = json.loads(raw)
+        if cursor_order != order or len(values) != len(types):
+            raise InvalidCursor("Cursor does not belong to this listing")
+        return tuple(parse(value) for parse, value in zip(types, values))
+    except InvalidCursor:
+        raise
+    except (TypeError, ValueError) as e:
+        raise InvalidCursor("Invalid cursor") from e
@@ -0,0 +1,52 @@
+from dataclasses import dataclass
+from typing import Any, Dict, Optional
+from uuid import UUID
+
+from app.core.cache import MISSING, LRUCache
+from app.core.config import settings
+
+
+@dataclass(frozen=True)
+class Principal:
+    """
+    The authenticated caller as far as authorization is concerned. Endpoints
+    that only need the caller's id and flags depend on this instead of a
+    full models.User, so no database session is needed to authenticate them.
+    """
+
+    id: UUID
+    is_active: bool
+    is_superuser: bool
+
+    @classmethod
+    def from_user(cls, user: Any) -> "Principal":
+        return cls(id=user.id, is_active=bool(user.is_active), is_superuser=bool(user.is_superuser))
+
+    def claims(self) -> Dict[str, Any]:
+        return {"active": self.is_active, "superuser": self.is_superuser}
+
+
+class PrincipalCache:
+    """
+    Principals by user id with a short TTL. Entries are dropped when a user
+    is updated; other worker processes pick the change up within the TTL.
+    """
+
+    def __init__(self):
+        self.entries = LRUCache(
+            maxsize=settings.PRINCIPAL_CACHE_SIZE,
+            ttl=settings.PRINCIPAL_CACHE_TTL_SECONDS,
+        )
+
+    def get(self, user_id: UUID) -> Optional[Principal]:
+        principal = self.entries.get(user_id)
+        return None if principal is MISSING else principal
+
+    def set(self, principal: Principal) -> None:
+        self.entries.set(principal.id, principal)
+
+    def invalidate(self, user_id: UUID) -> None:
+        self.entries.delete(user_id)
+
+
+principal_cache = PrincipalCache()
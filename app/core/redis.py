@@ -0,0 +1,35 @@
+from functools import lru_cache
+from typing import Optional
+
+import redis
+import redis.asyncio
+
+from app.core.config import settings
+
+
+@lru_cache()
+def get_redis() -> Optional[redis.Redis]:
+    """
+    Shared Redis client, or None when REDIS_URL is not configured.
+    """
+    if not settings.REDIS_URL:
+        return None
+    return redis.Redis.from_url(settings.REDIS_URL)
+
+
+@lru_cache()
+def get_async_redis() -> Optional[redis.asyncio.Redis]:
+    """
+    Shared asyncio Redis client, or None when REDIS_URL is not configured.
+    """
+    if not settings.REDIS_URL:
+        return None
+    return redis.asyncio.Redis.from_url(settings.REDIS_URL)
+
+
+async def close_redis() -> None:
+    if get_async_redis.cache_info().currsize:
+        client = get_async_redis()
+        if client is not None:
+            await client.aclose()
+        get_async_redis.cache_clear()
@@ -0,0 +1,185 @@
+import asyncio
+import logging
+import threading
+import time
+from typing import Dict, List, Optional, Tuple
+
+import redis
+
+from app.core.config import settings
+from app.core.redis import get_async_redis, get_redis
+
+logger = logging.getLogger(__name__)
+
+STREAM = "auth:revocations"
+# Prefix of the keys that mark single-use tokens as used
+USED = "auth:used:"
+
+
+def _max_token_lifetime() -> int:
+    return 60 * max(settings.ACCESS_TOKEN_EXPIRE_MINUTES, settings.REFRESH_TOKEN_EXPIRE_MINUTES)
+
+
+class RevocationStoreFull(Exception):
+    """
+    Raised when a revocation cannot be recorded without forgetting one whose
+    tokens are still valid.
+    """
+
+
+class RevocationStore:
+    """
+    Revoked token ids and per-user revocation cutoffs, checked in O(1) in
+    process. Entries are dropped once the tokens they cover have expired,
+    and never before: forgetting one would un-revoke its tokens. When
+    REVOCATION_CACHE_SIZE unexpired entries are held, new token revocations
+    raise RevocationStoreFull instead. User cutoffs, which only follow
+    account changes, are always recorded.
+
+    With REDIS_URL set, revocations are also appended to a Redis stream that
+    every process tails, so they take effect everywhere within
+    REVOCATION_SYNC_SECONDS. The stream is trimmed to the longest token
+    lifetime, so a starting process replays exactly the revocations that
+    still matter. A revocation from the stream that does not fit fails
+    closed: every token is treated as revoked until it would have expired.
+    """
+
+    def __init__(self):
+        self.entries: Dict[Tuple[str, str], Tuple[float, float]] = {}
+        self.closed_until = 0.0
+        self._lock = threading.RLock()
+        self._last_id = "0-0"
+        self._task: Optional[asyncio.Task] = None
+
+    def is_revoked(self, *, jti: Optional[str], user_id: str, issued_at: Optional[float]) -> bool:
+        now = time.time()
+        if now < self.closed_until:
+            return True
+        if jti is not None and self._get("token", jti, now) is not None:
+            return True
+        cutoff = self._get("user", user_id, now)
+        # Tokens without an iat predate revocation support. Whole-second iats
+        # of older tokens are revoked within the cutoff's second
+        return cutoff is not None and (issued_at is None or issued_at <= cutoff)
+
+    def revoke_token(self, jti: str, expires_at: int) -> None:
+        """
+        Revoke a single token until it expires. Raises RevocationStoreFull.
+        """
+        if not self._apply("token", jti, 0, expires_at):
+            raise RevocationStoreFull()
+        self._publish("token", jti, 0, expires_at)
+
+    def consume_token(self, jti: str, expires_at: int) -> bool:
+        """
+        Revoke a single-use token, returning False when it was already used.
+        With REDIS_URL set, the check and the revocation are one atomic step
+        across processes; otherwise within this process. Raises
+        RevocationStoreFull.
+        """
+        client = get_redis()
+        if client is not None:
+            try:
+                if not client.set(f"{USED}{jti}", 1, nx=True, exat=expires_at):
+                    return False
+            except redis.RedisError:
+                logger.warning("Failed to mark token %s used, checking this process only", jti, exc_info=True)
+        with self._lock:
+            if self._get("token", jti, time.time()) is not None:
+                return False
+            if not self._apply("token", jti, 0, expires_at):
+                raise RevocationStoreFull()
+        self._publish("token", jti, 0, expires_at)
+        return True
+
+    def revoke_user(self, user_id: str) -> None:
+        """
+        Revoke every token issued to a user so far, e.g. after they were
+        deactivated. Tokens issued afterwards are not affected.
+        """
+        cutoff = time.time()
+        expires_at = int(cutoff) + _max_token_lifetime()
+        self._apply("user", str(user_id), cutoff, expires_at)
+        self._publish("user", str(user_id), cutoff, expires_at)
+
+    def _get(self, kind: str, key: str, now: float) -> Optional[float]:
+        entry = self.entries.get((kind, key))
+        if entry is None or entry[0] <= now:
+            return None
+        return entry[1]
+
+    def _apply(self, kind: str, key: str, value: float, expires_at: float) -> bool:
+        """
+        Record a revocation, returning False for a token revocation when the
+        store is full of unexpired ones.
+        """
+        now = time.time()
+        if expires_at <= now:
+            return True
+        with self._lock:
+            if (
+                kind == "token"
+                and (kind, key) not in self.entries
+                and len(self.entries) >= settings.REVOCATION_CACHE_SIZE
+            ):
+                self.entries = {k: entry for k, entry in self.entries.items() if entry[0] > now}
+                if len(self.entries) >= settings.REVOCATION_CACHE_SIZE:
+                    return False
+            self.entries[(kind, key)] = (expires_at, value)
+            return True
+
+    def _publish(self, kind: str, key: str, value: float, expires_at: int) -> None:
+        client = get_redis()
+        if client is None:
+            return
+        oldest = int((time.time() - _max_token_lifetime()) * 1000)
+        try:
+            client.xadd(
+                STREAM,
+                {"kind": kind, "key": key, "value": value, "expires_at": expires_at},
+                minid=oldest,
+                approximate=True,
+            )
+        except redis.RedisError:
+            # Still effective in this process; others miss it until it expires
+            logger.warning("Failed to publish revocation of %s %s", kind, key, exc_info=True)
+
+    async def start(self) -> None:
+        if get_async_redis() is not None:
+            self._task = asyncio.create_task(self._sync())
+
+    async def stop(self) -> None:
+        if self._task is not None:
+            self._task.cancel()
+            await asyncio.gather(self._task, return_exceptions=True)
+            self._task = None
+
+    async def _sync(self) -> None:
+        block_ms = int(settings.REVOCATION_SYNC_SECONDS * 1000)
+        while True:
+            try:
+                streams: List = await get_async_redis().xread(
+                    {STREAM: self._last_id}, count=1000, block=block_ms
+                )
+                for _, messages in streams or []:
+                    for message_id, fields in messages:
+                        self._last_id = message_id
+                        fields = {k.decode(): v.decode() for k, v in fields.items()}
+                        expires_at = int(fields["expires_at"])
+                        if not self._apply(fields["kind"], fields["key"], float(fields["value"]), expires_at):
+                            self.closed_until = max(self.closed_until, expires_at)
+                            logger.error(
+                                "Revocation store is full, rejecting every token until %s; "
+                                "raise REVOCATION_CACHE_SIZE", expires_at,
+                            )
+            except asyncio.CancelledError:
+                raise
+            except redis.RedisError:
+                logger.warning("Revocation stream unavailable", exc_info=True)
+                await asyncio.sleep(settings.REVOCATION_SYNC_SECONDS)
+            except Exception:
+                logger.exception("Failed to apply revocations")
+                await asyncio.sleep(settings.REVOCATION_SYNC_SECONDS)
+
+
+revocation_store = RevocationStore()
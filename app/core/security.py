@@ -1,16 +1,37 @@
+import time
+import uuid
 from datetime import datetime, timedelta
-from typing import Any, Union
+from typing import Any, Dict, Optional, Tuple, Union
 
 from jose import jwt
 from passlib.context import CryptContext
 
 from app.core.config import settings
+from app.core.executor import BoundedExecutor
 
-pwd_context = CryptContext(schemes=["bcrypt"], deprecated="auto")
+# Pinning the desired rounds to PASSWORD_HASH_ROUNDS makes
+# verify_and_update() flag hashes made with any other cost
+pwd_context = CryptContext(
+    schemes=["bcrypt"],
+    deprecated="auto",
+    bcrypt__default_rounds=settings.PASSWORD_HASH_ROUNDS,
+    bcrypt__min_desired_rounds=settings.PASSWORD_HASH_ROUNDS,
+    bcrypt__max_desired_rounds=settings.PASSWORD_HASH_ROUNDS,
+)
+
+# bcrypt releases the GIL, so a thread pool of its own keeps a login burst
+# from starving the shared threadpool
+password_executor = BoundedExecutor(
+    "password",
+    max_workers=settings.PASSWORD_WORKERS,
+    max_queue=settings.PASSWORD_QUEUE_SIZE,
+)
 
 
 def create_access_token(
-    subject: Union[str, Any], expires_delta: timedelta = None
+    subject: Union[str, Any],
+    expires_delta: timedelta = None,
+    claims: Optional[Dict[str, Any]] = None,
 ) -> str:
     if expires_delta:
         expire = datetime.utcnow() + expires_delta
@@ -18,14 +39,55 @@ def create_access_token(
         expire = datetime.utcnow() + timedelta(
             minutes=settings.ACCESS_TOKEN_EXPIRE_MINUTES
         )
-    to_encode = {"exp": expire, "sub": str(subject)}
+    to_encode = {
+        **(claims or {}),
+        "exp": expire,
+        # Sub-second, so that a token issued right after a revoke_user cutoff
+        # is told apart from one issued right before it
+        "iat": time.time(),
+        "jti": uuid.uuid4().hex,
+        "type": "access",
+        "sub": str(subject),
+    }
     encoded_jwt = jwt.encode(to_encode, settings.SECRET_KEY, algorithm=settings.ALGORITHM)
     return encoded_jwt
 
 
+def create_refresh_token(subject: Union[str, Any]) -> str:
+    to_encode = {
+        "exp": datetime.utcnow() + timedelta(minutes=settings.REFRESH_TOKEN_EXPIRE_MINUTES),
+        "iat": time.time(),
+        "jti": uuid.uuid4().hex,
+        "type": "refresh",
+        "sub": str(subject),
+    }
+    return jwt.encode(to_encode, settings.SECRET_KEY, algorithm=settings.ALGORITHM)
+
+
 def verify_password(plain_password: str, hashed_password: str) -> bool:
     return pwd_context.verify(plain_password, hashed_password)
 
 
 def get_password_hash(password: str) -> str:
-    return pwd_context.hash(password)
\ No newline at end of file
+    return pwd_context.hash(password)
+
+
+async def hash_password(password: str) -> str:
+    """
+    get_password_hash on the password pool. Raises ExecutorSaturated when
+    the pool is full.
+    """
+    return await password_executor.run(get_password_hash, password)
+
+
+async def verify_and_update_password(
+    plain_password: str, hashed_password: str
+) -> Tuple[bool, Optional[str]]:
+    """
+    Verify a password on the password pool. Also returns a new hash when the
+    stored one was made with outdated settings, e.g. another bcrypt cost.
+    Raises ExecutorSaturated when the pool is full.
+    """
+    return await password_executor.run(
+        pwd_context.verify_and_update, plain_password, hashed_password
+    )
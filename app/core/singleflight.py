@@ -0,0 +1,112 @@
+import asyncio
+import logging
+import time
+import uuid
+from typing import Any, Awaitable, Callable, Dict, Hashable
+
+import redis
+from prometheus_client import Counter
+
+from app.core.cache import MISSING
+from app.core.redis import get_async_redis
+
+logger = logging.getLogger(__name__)
+
+COALESCED = Counter(
+    "singleflight_coalesced_total",
+    "Calls that reused another caller's in-flight work instead of doing it",
+    ["name", "scope"],
+)
+
+# Delete the lock only if we still own it
+_RELEASE_SCRIPT = """
+if redis.call("get", KEYS[1]) == ARGV[1] then
+    return redis.call("del", KEYS[1])
+end
+return 0
+"""
+
+
+class SingleFlight:
+    """
+    Coalesce concurrent calls with the same key inside one event loop: the
+    first caller runs the work, later callers await the same result or error.
+    **Parameters**
+    * `name`: Label used in the coalescing metrics
+    """
+
+    def __init__(self, name: str):
+        self.name = name
+        self._calls: Dict[Hashable, "asyncio.Task[Any]"] = {}
+
+    async def do(self, key: Hashable, fn: Callable[[], Awaitable[Any]]) -> Any:
+        task = self._calls.get(key)
+        if task is not None:
+            COALESCED.labels(name=self.name, scope="local").inc()
+        else:
+            # Run as a task so a cancelled caller does not cancel the others
+            task = asyncio.ensure_future(fn())
+            self._calls[key] = task
+            task.add_done_callback(lambda t: self._done(key, t))
+        return await asyncio.shield(task)
+
+    def _done(self, key: Hashable, task: "asyncio.Task[Any]") -> None:
+        self._calls.pop(key, None)
+        if not task.cancelled():
+            task.exception()  # mark as retrieved when every caller went away
+
+    def __len__(self) -> int:
+        return len(self._calls)
+
+
+async def shared_flight(
+    name: str,
+    lock_key: str,
+    fn: Callable[[], Awaitable[Any]],
+    check: Callable[[], Awaitable[Any]],
+    *,
+    ttl: float,
+    poll_interval: float,
+) -> Any:
+    """
+    Coalesce work across processes through a short-lived Redis lock. The lock
+    holder runs `fn`, which is expected to publish its result where `check`
+    can see it; everybody else polls `check` until it returns something other
+    than MISSING, and runs `fn` themselves if the lock expires or disappears
+    without a result. Falls back to `fn` when Redis is unavailable.
+    """
+    client = get_async_redis()
+    if client is None:
+        return await fn()
+    token = uuid.uuid4().hex
+    try:
+        acquired = await client.set(lock_key, token, nx=True, px=int(ttl * 1000))
+    except redis.RedisError:
+        logger.warning("Shared lock unavailable", exc_info=True)
+        return await fn()
+    if acquired:
+        try:
+            return await fn()
+        finally:
+            try:
+                await client.eval(_RELEASE_SCRIPT, 1, lock_key, token)
+            except redis.RedisError:
+                logger.warning("Failed to release shared lock", exc_info=True)
+
+    COALESCED.labels(name=name, scope="shared").inc()
+    deadline = time.monotonic() + ttl
+    try:
+        while time.monotonic() < deadline:
+            await asyncio.sleep(poll_interval)
+            value = await check()
+            if value is not MISSING:
+                return value
+            if not await client.exists(lock_key):
+                # The holder may have published right before releasing
+                value = await check()
+                if value is not MISSING:
+                    return value
+                break
+    except redis.RedisError:
+        logger.warning("Shared lock unavailable", exc_info=True)
+    return await fn()
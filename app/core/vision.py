@@ -0,0 +1,251 @@
+import base64
+import json
+from datetime import datetime, timedelta
+from functools import lru_cache
+from typing import Any, Dict, List, Optional, Tuple
+
+import openai
+from prometheus_client import Counter
+
+from app.core.cache import MISSING, LRUCache
+from app.core.config import settings
+from app.core.image_processing import PreprocessedImage
+from app.core.jobs import JobQueue
+from app.schemas.food_item import BoundingBox, DetectedFoodItem, FoodItemCreate
+
+CACHE_LOOKUPS = Counter(
+    "image_analysis_cache_lookups_total",
+    "Image analysis result cache lookups by result",
+    ["result"],
+)
+
+PROMPT = """
+Analyze this food item image and extract the following information in JSON format:
+1. name: The name of the food item
+2. category: The category (e.g., Dairy, Produce, Meat, etc.)
+3. estimated_expiration_days: Estimated days until expiration (integer)
+
+Only respond with valid JSON. Do not include any explanations or notes.
+"""
+
+MULTI_PROMPT = """
+This image shows a shelf, fridge or pantry. List every distinct food item you can see
+as a JSON array, with one object per item containing:
+1. name: The name of the food item
+2. category: The category (e.g., Dairy, Produce, Meat, etc.)
+3. estimated_expiration_days: Estimated days until expiration (integer)
+4. quantity: How many of this item are visible (integer)
+5. bounding_box: {"x": ..., "y": ..., "width": ..., "height": ...} enclosing the item,
+   as fractions (0 to 1) of the image width and height from the top-left corner
+
+Only respond with a valid JSON array. Do not include any explanations or notes.
+"""
+
+
+class InvalidResponse(ValueError):
+    pass
+
+
+@lru_cache()
+def get_openai_client() -> openai.AsyncOpenAI:
+    return openai.AsyncOpenAI(
+        api_key=settings.OPENAI_API_KEY,
+        base_url=settings.OPENAI_BASE_URL,
+        timeout=settings.OPENAI_TIMEOUT_SECONDS,
+    )
+
+
+async def close_openai_client() -> None:
+    if get_openai_client.cache_info().currsize:
+        await get_openai_client().close()
+        get_openai_client.cache_clear()
+
+
+def parse_response(content: str, start_char: str = '{', end_char: str = '}') -> Any:
+    try:
+        return json.loads(content)
+    except json.JSONDecodeError:
+        pass
+    # If not valid JSON, try to extract JSON from the response
+    start = content.find(start_char)
+    end = content.rfind(end_char)
+    if start != -1 and end != -1:
+        try:
+            return json.loads(content[start:end+1])
+        except json.JSONDecodeError:
+            pass
+    raise InvalidResponse("Failed to parse AI response")
+
+
+def parse_items(content: str) -> List[Dict[str, Any]]:
+    result = parse_response(content, '[', ']')
+    if isinstance(result, dict):
+        result = result.get("items", [result])
+    if not isinstance(result, list):
+        raise InvalidResponse("Failed to parse AI response")
+    return [item for item in result if isinstance(item, dict)]
+
+
+def to_food_item(result: Dict[str, Any]) -> FoodItemCreate:
+    # Calculate expiration date if provided
+    expiration_date = None
+    if "estimated_expiration_days" in result and result["estimated_expiration_days"]:
+        try:
+            days = int(result["estimated_expiration_days"])
+            expiration_date = (datetime.now() + timedelta(days=days)).date()
+        except (TypeError, ValueError, OverflowError):
+            # e.g. "about 5"; the item is still worth returning without a date
+            pass
+
+    return FoodItemCreate(
+        name=result.get("name", "Unknown Food Item"),
+        category=result.get("category", "Unknown"),
+        expiration_date=expiration_date,
+        source="vision"
+    )
+
+
+def to_detected_item(result: Dict[str, Any]) -> DetectedFoodItem:
+    food_item = to_food_item(result)
+    try:
+        quantity = max(int(result.get("quantity") or 1), 1)
+    except (TypeError, ValueError):
+        quantity = 1
+    try:
+        bounding_box = BoundingBox(**result["bounding_box"])
+    except (KeyError, TypeError, ValueError):
+        bounding_box = None
+    return DetectedFoodItem(**{**food_item.dict(), "quantity": quantity, "bounding_box": bounding_box})
+
+
+class ImageResultCache:
+    """
+    Parsed vision results keyed by the analysis mode and the SHA-256 of the
+    preprocessed image. Entries also remember the image's dHash, so that a
+    near-identical re-upload can reuse the result of the closest cached image.
+    Multi-item results are only reused for identical images: on a shelf
+    photo, one item added or taken away is a small change of the whole
+    image but a different answer.
+    """
+
+    def __init__(self):
+        self.entries = LRUCache(
+            maxsize=settings.IMAGE_CACHE_SIZE,
+            ttl=settings.IMAGE_CACHE_TTL_SECONDS,
+        )
+
+    def get(self, image: PreprocessedImage, mode: str = "single") -> Any:
+        entry = self.entries.get((mode, image.digest))
+        if entry is not MISSING:
+            CACHE_LOOKUPS.labels(result="hit").inc()
+            return entry[1]
+        if image.dhash is not None and mode != "multi":
+            best_distance, best = settings.IMAGE_CACHE_MAX_DISTANCE + 1, None
+            for (entry_mode, _), (dhash, result) in self.entries.items():
+                if entry_mode != mode or dhash is None:
+                    continue
+                distance = bin(dhash ^ image.dhash).count("1")
+                if distance < best_distance:
+                    best_distance, best = distance, result
+            if best is not None:
+                CACHE_LOOKUPS.labels(result="near_hit").inc()
+                return best
+        CACHE_LOOKUPS.labels(result="miss").inc()
+        return None
+
+    def set(self, image: PreprocessedImage, result: Any, mode: str = "single") -> None:
+        self.entries.set((mode, image.digest), (image.dhash, result))
+
+
+image_result_cache = ImageResultCache()
+
+
+async def analyze_image(image: PreprocessedImage) -> Tuple[FoodItemCreate, bool]:
+    """
+    Identify a food item on a preprocessed image, returning the item and
+    whether it was served from the result cache rather than the vision model.
+    Raises InvalidResponse or openai.OpenAIError.
+    """
+    result = image_result_cache.get(image)
+    if result is not None:
+        return to_food_item(result), True
+    result = parse_response(await request_analysis(image.data, PROMPT, max_tokens=300))
+    food_item = to_food_item(result)
+    image_result_cache.set(image, result)
+    return food_item, False
+
+
+async def analyze_image_items(image: PreprocessedImage) -> Tuple[List[DetectedFoodItem], bool]:
+    """
+    Identify every food item on a preprocessed shelf or fridge photo, returning
+    the items with their bounding boxes and whether they came from the cache.
+    Raises InvalidResponse or openai.OpenAIError.
+    """
+    results = image_result_cache.get(image, mode="multi")
+    if results is not None:
+        return [to_detected_item(result) for result in results], True
+    results = parse_items(await request_analysis(image.data, MULTI_PROMPT, max_tokens=2000))
+    items = [to_detected_item(result) for result in results]
+    image_result_cache.set(image, results, mode="multi")
+    return items, False
+
+
+async def request_analysis(jpeg: bytes, prompt: str, *, max_tokens: int) -> str:
+    """
+    Ask the OpenAI Vision API about a JPEG image and return its raw answer.
+    """
+    base64_image = base64.b64encode(jpeg).decode("utf-8")
+
+    response = await get_openai_client().chat.completions.create(
+        model=settings.OPENAI_VISION_MODEL,
+        messages=[
+            {
+                "role": "user",
+                "content": [
+                    {"type": "text", "text": prompt},
+                    {
+                        "type": "image_url",
+                        "image_url": {"url": f"data:image/jpeg;base64,{base64_image}"}
+                    }
+                ]
+            }
+        ],
+        max_tokens=max_tokens
+    )
+    return response.choices[0].message.content
+
+
+async def _run_analysis_job(params: Dict[str, Any], payload: bytes) -> Dict[str, Any]:
+    image = PreprocessedImage(
+        data=payload,
+        bytes_in=params["bytes_in"],
+        reencoded=params["reencoded"],
+        dhash=params["dhash"],
+    )
+    food_item, cached = await analyze_image(image)
+    return {"item": food_item, "cached": cached}
+
+
+# Background analysis for POST /image-analysis/?background=true
+analysis_jobs = JobQueue(
+    "image_analysis",
+    _run_analysis_job,
+    retry_on=(
+        openai.APIConnectionError,
+        openai.APITimeoutError,
+        openai.RateLimitError,
+        openai.InternalServerError,
+        InvalidResponse,
+    ),
+)
+
+
+async def submit_analysis_job(
+    image: PreprocessedImage, *, owner_id: str, callback_url: Optional[str] = None
+) -> Dict[str, Any]:
+    return await analysis_jobs.submit(
+        owner_id=owner_id,
+        params={"bytes_in": image.bytes_in, "reencoded": image.reencoded, "dhash": image.dhash},
+        payload=image.data,
+        callback_url=callback_url,
+    )
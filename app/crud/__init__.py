@@ -1,2 +1,3 @@
-from app.crud.crud_food_item import food_item
-from app.crud.crud_user import user
\ No newline at end of file
+from app.crud.crud_food_item import async_food_item, food_item
+from app.crud.crud_product import product
+from app.crud.crud_user import async_user, user
@@ -1,7 +1,8 @@
 from typing import Any, Dict, Generic, List, Optional, Type, TypeVar, Union
 
-from fastapi.encoders import jsonable_encoder
 from pydantic import BaseModel
+from sqlalchemy import delete, insert, select
+from sqlalchemy.ext.asyncio import AsyncSession
 from sqlalchemy.orm import Session
 
 from app.db.base_class import Base
@@ -11,6 +12,18 @@ CreateSchemaType = TypeVar("CreateSchemaType", bound=BaseModel)
 UpdateSchemaType = TypeVar("UpdateSchemaType", bound=BaseModel)
 
 
+def update_data(obj_in: Union[BaseModel, Dict[str, Any]]) -> Dict[str, Any]:
+    if isinstance(obj_in, dict):
+        return obj_in
+    return obj_in.dict(exclude_unset=True)
+
+
+def apply_update(db_obj: Any, data: Dict[str, Any]) -> None:
+    for field in db_obj.__table__.columns.keys():
+        if field in data:
+            setattr(db_obj, field, data[field])
+
+
 class CRUDBase(Generic[ModelType, CreateSchemaType, UpdateSchemaType]):
     def __init__(self, model: Type[ModelType]):
         """
@@ -25,32 +38,69 @@ class CRUDBase(Generic[ModelType, CreateSchemaType, UpdateSchemaType]):
         return db.query(self.model).filter(self.model.id == id).first()
 
     def get_multi(self, db: Session, *, skip: int = 0, limit: int = 100) -> List[ModelType]:
-        return db.query(self.model).offset(skip).limit(limit).all()
+        return db.query(self.model).order_by(self.model.id).offset(skip).limit(limit).all()
+
+    # Writes use INSERT/UPDATE/DELETE ... RETURNING, and sessions do not
+    # expire objects on commit, so no write needs a follow-up SELECT
 
     def create(self, db: Session, *, obj_in: CreateSchemaType) -> ModelType:
-        obj_in_data = jsonable_encoder(obj_in)
-        db_obj = self.model(**obj_in_data)
-        db.add(db_obj)
+        db_obj = db.scalar(insert(self.model).values(**obj_in.dict()).returning(self.model))
         db.commit()
-        db.refresh(db_obj)
         return db_obj
 
     def update(self, db: Session, *, db_obj: ModelType, obj_in: Union[UpdateSchemaType, Dict[str, Any]]) -> ModelType:
-        obj_data = jsonable_encoder(db_obj)
-        if isinstance(obj_in, dict):
-            update_data = obj_in
-        else:
-            update_data = obj_in.dict(exclude_unset=True)
-        for field in obj_data:
-            if field in update_data:
-                setattr(db_obj, field, update_data[field])
+        apply_update(db_obj, update_data(obj_in))
         db.add(db_obj)
         db.commit()
-        db.refresh(db_obj)
         return db_obj
 
-    def remove(self, db: Session, *, id: Any) -> ModelType:
-        obj = db.query(self.model).get(id)
-        db.delete(obj)
+    def remove(self, db: Session, *, id: Any) -> Optional[ModelType]:
+        obj = db.scalar(
+            delete(self.model)
+            .where(self.model.id == id)
+            .returning(self.model)
+            .execution_options(synchronize_session=False)
+        )
         db.commit()
         return obj
+
+
+class AsyncCRUDBase(Generic[ModelType, CreateSchemaType, UpdateSchemaType]):
+    def __init__(self, model: Type[ModelType]):
+        """
+        Counterpart of CRUDBase for an AsyncSession, with the same methods
+        as coroutines.
+        **Parameters**
+        * `model`: A SQLAlchemy model class
+        """
+        self.model = model
+
+    async def get(self, db: AsyncSession, id: Any) -> Optional[ModelType]:
+        return await db.get(self.model, id)
+
+    async def get_multi(self, db: AsyncSession, *, skip: int = 0, limit: int = 100) -> List[ModelType]:
+        stmt = select(self.model).order_by(self.model.id).offset(skip).limit(limit)
+        return (await db.scalars(stmt)).all()
+
+    async def create(self, db: AsyncSession, *, obj_in: CreateSchemaType) -> ModelType:
+        db_obj = await db.scalar(insert(self.model).values(**obj_in.dict()).returning(self.model))
+        await db.commit()
+        return db_obj
+
+    async def update(
+        self, db: AsyncSession, *, db_obj: ModelType, obj_in: Union[UpdateSchemaType, Dict[str, Any]]
+    ) -> ModelType:
+        apply_update(db_obj, update_data(obj_in))
+        db.add(db_obj)
+        await db.commit()
+        return db_obj
+
+    async def remove(self, db: AsyncSession, *, id: Any) -> Optional[ModelType]:
+        obj = await db.scalar(
+            delete(self.model)
+            .where(self.model.id == id)
+            .returning(self.model)
+            .execution_options(synchronize_session=False)
+        )
+        await db.commit()
+        return obj
@@ -1,54 +1,695 @@
-from typing import List, Optional, Dict, Any, Union
+import re
+from datetime import date, datetime, timedelta
+from typing import List, Optional, Dict, Any, Sequence, Tuple, Union
 from uuid import UUID
 
-from sqlalchemy.orm import Session
+from sqlalchemy import (
+    BigInteger,
+    Delete,
+    Select,
+    Update,
+    case,
+    cast,
+    column,
+    delete,
+    func,
+    insert,
+    literal_column,
+    or_,
+    select,
+    text,
+    tuple_,
+    union_all,
+    update,
+    values,
+)
+from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy.orm import Session, aliased
 
-from app.crud.base import CRUDBase
-from app.models.food_item import FoodItem
-from app.models.user import User
-from app.schemas.food_item import FoodItemCreate, FoodItemUpdate
+from app.core.change_feed import change_feed
+from app.core.config import settings
+from app.crud.base import AsyncCRUDBase, CRUDBase, update_data
+from app.models.expiration_alert import ExpirationAlert, ExpirationAlertShard
+from app.models.food_item import SEARCH_DOCUMENT, SEARCH_VECTOR, FoodItem
+from app.models.food_item_stats import FoodItemStats
+from app.models.food_item_sync import FoodItemTombstone, FoodItemVersion
+from app.schemas.food_item import (
+    FoodItem as FoodItemSchema,
+    FoodItemBulkUpdateItem,
+    FoodItemChangeEvent,
+    FoodItemCreate,
+    FoodItemUpdate,
+)
+
+# Stable orderings for listings; `after` cursors hold these columns
+ORDER_BY_ADDED = (FoodItem.added_at, FoodItem.id)
+ORDER_BY_EXPIRATION = (FoodItem.expiration_date, FoodItem.id)
+# Same order, from the trigger-maintained copy of the expiration date
+ORDER_BY_ALERT = (ExpirationAlert.expiration_date, ExpirationAlert.food_item_id)
+
+# Statements shared by the sync and async CRUD objects below
+
+
+def _paginate(
+    stmt: Select, order_by: Tuple[Any, ...], *, skip: int, limit: int, after: Optional[Tuple[Any, ...]]
+) -> Select:
+    """
+    Page through `stmt` in the stable `order_by` order, either by offset or,
+    when `after` holds the sort key of the previous page's last row, by
+    keyset (which stays fast on deep pages).
+    """
+    stmt = stmt.order_by(*order_by)
+    if after is not None:
+        stmt = stmt.where(tuple_(*order_by) > tuple_(*after))
+    else:
+        stmt = stmt.offset(skip)
+    return stmt.limit(limit)
+
+
+def _by_barcode(barcode: str, owner_id: UUID) -> Select:
+    return select(FoodItem).where(FoodItem.barcode == barcode, FoodItem.owner_id == owner_id).limit(1)
+
+
+def _by_category(
+    category: str, owner_id: UUID, skip: int, limit: int, after: Optional[Tuple[datetime, UUID]]
+) -> Select:
+    stmt = select(FoodItem).where(FoodItem.category == category, FoodItem.owner_id == owner_id)
+    return _paginate(stmt, ORDER_BY_ADDED, skip=skip, limit=limit, after=after)
+
+
+def _expiring_soon(
+    days: int, owner_id: UUID, skip: int, limit: int, after: Optional[Tuple[date, UUID]]
+) -> Select:
+    """
+    The owner's items expiring within `days`, in one statement of two
+    branches of which only one runs. When the expiration alert scheduler
+    has scanned the owner's shard up to the last of those days, they are a
+    range of expirationalert's (owner_id, expiration_date) index, and each
+    item is fetched by primary key. Otherwise fooditem is queried directly.
+    """
+    today = datetime.now().date()
+    expiry_date = today + timedelta(days=days)
+    # Uncorrelated, so Postgres evaluates it once and skips the other branch
+    covered = (
+        select(ExpirationAlertShard.id)
+        .where(
+            ExpirationAlertShard.lo <= owner_id,
+            ExpirationAlertShard.hi >= owner_id,
+            ExpirationAlertShard.scanned_until >= expiry_date,
+        )
+        .exists()
+    )
+    precomputed = _paginate(
+        select(FoodItem)
+        .join(ExpirationAlert, ExpirationAlert.food_item_id == FoodItem.id)
+        .where(
+            ExpirationAlert.owner_id == owner_id,
+            ExpirationAlert.expiration_date >= today,
+            ExpirationAlert.expiration_date <= expiry_date,
+            covered,
+        ),
+        ORDER_BY_ALERT,
+        skip=skip,
+        limit=limit,
+        after=after,
+    )
+    live = _paginate(
+        select(FoodItem).where(
+            FoodItem.expiration_date <= expiry_date,
+            FoodItem.expiration_date >= today,
+            FoodItem.owner_id == owner_id,
+            ~covered,
+        ),
+        ORDER_BY_EXPIRATION,
+        skip=skip,
+        limit=limit,
+        after=after,
+    )
+    items = aliased(FoodItem, union_all(precomputed, live).subquery())
+    return select(items).order_by(items.expiration_date, items.id)
+
+
+def _by_owner(owner_id: UUID, skip: int, limit: int, after: Optional[Tuple[datetime, UUID]]) -> Select:
+    stmt = select(FoodItem).where(FoodItem.owner_id == owner_id)
+    return _paginate(stmt, ORDER_BY_ADDED, skip=skip, limit=limit, after=after)
+
+
+def _search(q: str, owner_id: UUID, limit: int) -> Select:
+    """
+    An owner's items whose name or category matches `q`, best first: every
+    word of `q` as a prefix of a word (full-text, with English stemming), or
+    `q` close to some word by trigram similarity, which tolerates typos.
+    """
+    document = literal_column(SEARCH_DOCUMENT)
+    vector = literal_column(SEARCH_VECTOR)
+    conditions = [document.op("%>")(q)]
+    rank = func.word_similarity(q, document)
+    words = re.findall(r"\w+", q.lower())
+    if words:
+        query = func.to_tsquery(
+            literal_column("'english'::regconfig"), " & ".join(f"{word}:*" for word in words)
+        )
+        conditions.append(vector.op("@@")(query))
+        rank = rank + func.ts_rank(vector, query)
+    return (
+        select(FoodItem)
+        .where(FoodItem.owner_id == owner_id, or_(*conditions))
+        .order_by(rank.desc(), FoodItem.id)
+        .limit(limit)
+    )
+
+
+# Applies to the rest of the transaction, i.e. the search that follows
+_SEARCH_LIMITS = text(
+    "SELECT set_config('statement_timeout', :timeout, true),"
+    " set_config('pg_trgm.word_similarity_threshold', :similarity, true)"
+)
+
+
+def _search_limits() -> Dict[str, str]:
+    return {
+        "timeout": str(settings.FOOD_ITEM_SEARCH_TIMEOUT_MS),
+        "similarity": str(settings.FOOD_ITEM_SEARCH_SIMILARITY),
+    }
+
+
+def _version(owner_id: UUID) -> Select:
+    return select(FoodItemVersion.version, FoodItemVersion.pruned_version).where(
+        FoodItemVersion.owner_id == owner_id
+    )
+
+
+def _after(change_id: Any, id: Any, since: Tuple[int, Optional[UUID], int]) -> Any:
+    # Only rows that predate version tracking share a version (0), so ids
+    # break ties within a page; a cursor without an id is past the version
+    version, after_id, _ = since
+    if after_id is None:
+        return change_id > version
+    return tuple_(change_id, id) > tuple_(version, after_id)
+
+
+def _upserted_since(owner_id: UUID, since: Optional[Tuple[int, Optional[UUID], int]], limit: int) -> Select:
+    stmt = select(FoodItem).where(FoodItem.owner_id == owner_id)
+    if since is not None:
+        stmt = stmt.where(_after(FoodItem.change_id, FoodItem.id, since))
+    return stmt.order_by(FoodItem.change_id, FoodItem.id).limit(limit + 1)
+
+
+def _deleted_since(owner_id: UUID, since: Tuple[int, Optional[UUID], int], limit: int) -> Select:
+    return (
+        select(FoodItemTombstone.change_id, FoodItemTombstone.id)
+        .where(
+            FoodItemTombstone.owner_id == owner_id,
+            _after(FoodItemTombstone.change_id, FoodItemTombstone.id, since),
+        )
+        .order_by(FoodItemTombstone.change_id, FoodItemTombstone.id)
+        .limit(limit + 1)
+    )
+
+
+def _changes(
+    version: Optional[Tuple[int, int]],
+    since: Optional[Tuple[int, Optional[UUID], int]],
+    upserts: List[FoodItem],
+    deletes: List[Tuple[int, UUID]],
+    limit: int,
+) -> Dict[str, Any]:
+    """
+    Merge the upserts and deletes read from one snapshot into the first
+    `limit` changes in (version, id) order. The returned cursor is the last
+    change of a full page, otherwise the owner's version as of the snapshot,
+    which every visible change is at or below.
+
+    Cursors also carry the version from which the client needs tombstones:
+    its position for an incremental sync, but the version a full sync
+    started at for the pages of that full sync, which replaces every item
+    the client had. A cursor is too old when that version is below
+    pruned_version.
+    """
+    current, pruned = version or (0, 0)
+    # A full sync needs no tombstones from before it started
+    needed = since[2] if since is not None else current
+    changes = sorted(
+        [(item.change_id, item.id, item) for item in upserts]
+        + [(change_id, id, id) for change_id, id in deletes],
+        key=lambda change: change[:2],
+    )
+    page, has_more = changes[:limit], len(changes) > limit
+    return {
+        "upserts": [change for _, _, change in page if isinstance(change, FoodItem)],
+        "deletes": [change for _, _, change in page if not isinstance(change, FoodItem)],
+        "cursor": (*page[-1][:2], max(page[-1][0], needed)) if has_more else (current, None, current),
+        "has_more": has_more,
+        "pruned_version": pruned,
+    }
+
+
+def _recently_added(owner_id: UUID, limit: int) -> Select:
+    return (
+        select(FoodItem)
+        .where(FoodItem.owner_id == owner_id)
+        .order_by(FoodItem.added_at.desc(), FoodItem.id.desc())
+        .limit(limit)
+    )
+
+
+def _stats(owner_id: UUID, days: int) -> Select:
+    """
+    An owner's FoodItemStats rows added up per category and expiry bucket:
+    "expired", "expiring_soon" (as get_expiring_soon with the same `days`),
+    "later" or "none". At most four rows per category reach the
+    application, however many distinct expiration dates there are; the
+    per-date rows are only read from the primary key index.
+    """
+    today = datetime.now().date()
+    bucket = case(
+        (FoodItemStats.expiration_date == text("'infinity'::date"), "none"),
+        (FoodItemStats.expiration_date < today, "expired"),
+        (FoodItemStats.expiration_date <= today + timedelta(days=days), "expiring_soon"),
+        else_="later",
+    ).label("bucket")
+    return (
+        select(
+            func.nullif(FoodItemStats.category, ""),
+            bucket,
+            cast(func.sum(FoodItemStats.item_count), BigInteger),
+            cast(func.sum(FoodItemStats.total_quantity), BigInteger),
+        )
+        .where(FoodItemStats.owner_id == owner_id)
+        .group_by(FoodItemStats.category, "bucket")
+    )
+
+
+def _summarize(stats: List[Tuple[Any, ...]], recently_added: List[FoodItem]) -> Dict[str, Any]:
+    """
+    Fold an owner's _stats rows into the FoodItemSummary fields.
+    """
+    categories: Dict[Optional[str], Dict[str, Any]] = {}
+    summary = {"total_items": 0, "total_quantity": 0, "expired": 0, "expiring_soon": 0, "no_expiration": 0}
+    for category, bucket, item_count, total_quantity in stats:
+        counts = categories.setdefault(category, {"category": category, "items": 0, "quantity": 0})
+        counts["items"] += item_count
+        counts["quantity"] += total_quantity
+        summary["total_items"] += item_count
+        summary["total_quantity"] += total_quantity
+        if bucket == "none":
+            summary["no_expiration"] += item_count
+        elif bucket != "later":
+            summary[bucket] += item_count
+    summary["categories"] = sorted(categories.values(), key=lambda counts: -counts["items"])
+    summary["recently_added"] = recently_added
+    return summary
+
+
+def _change_event(upserts: Sequence[FoodItem] = (), deletes: Sequence[FoodItem] = ()) -> str:
+    """
+    A committed write as encoded for the change feed; encoded once however
+    many subscribers receive it.
+    """
+    return FoodItemChangeEvent(
+        upserts=[FoodItemSchema.model_validate(item) for item in upserts],
+        deletes=[item.id for item in deletes],
+    ).model_dump_json()
+
+
+def _update_by_owner(id: UUID, owner_id: UUID, data: Dict[str, Any]) -> Union[Select, Update]:
+    if not data:
+        return select(FoodItem).where(FoodItem.id == id, FoodItem.owner_id == owner_id)
+    return (
+        update(FoodItem)
+        .where(FoodItem.id == id, FoodItem.owner_id == owner_id)
+        .values(**data)
+        .returning(FoodItem)
+        .execution_options(synchronize_session=False, populate_existing=True)
+    )
+
+
+def _remove_by_owner(id: UUID, owner_id: UUID) -> Delete:
+    return (
+        delete(FoodItem)
+        .where(FoodItem.id == id, FoodItem.owner_id == owner_id)
+        .returning(FoodItem)
+        .execution_options(synchronize_session=False)
+    )
+
+
+def _update_multi(objs_in: List[FoodItemBulkUpdateItem], owner_id: UUID) -> List[Union[Select, Update]]:
+    """
+    One UPDATE ... FROM (VALUES ...) RETURNING per distinct set of updated
+    fields.
+    """
+    groups: Dict[Tuple[str, ...], List[Dict[str, Any]]] = {}
+    for obj_in in objs_in:
+        data = obj_in.dict(exclude_unset=True)
+        fields = tuple(sorted(field for field in data if field != "id"))
+        groups.setdefault(fields, []).append(data)
+
+    table = FoodItem.__table__
+    stmts: List[Union[Select, Update]] = []
+    for fields, rows in groups.items():
+        if not fields:
+            # Nothing to change, but still report the items that exist
+            stmts.append(
+                select(FoodItem).where(
+                    FoodItem.id.in_([row["id"] for row in rows]), FoodItem.owner_id == owner_id
+                )
+            )
+            continue
+        columns = ("id",) + fields
+        new = values(
+            *(column(name, table.c[name].type) for name in columns), name="new"
+        ).data([tuple(row.get(name) for name in columns) for row in rows])
+        stmts.append(
+            update(FoodItem)
+            .where(FoodItem.id == new.c.id, FoodItem.owner_id == owner_id)
+            # Postgres types a VALUES column of nothing but NULLs as text
+            .values({name: cast(new.c[name], table.c[name].type) for name in fields})
+            .returning(FoodItem)
+            .execution_options(synchronize_session=False)
+        )
+    return stmts
+
+
+def _remove_multi(ids: List[UUID], owner_id: UUID) -> Delete:
+    return (
+        delete(FoodItem)
+        .where(FoodItem.id.in_(ids), FoodItem.owner_id == owner_id)
+        .returning(FoodItem)
+        .execution_options(synchronize_session=False)
+    )
 
 
 class CRUDFoodItem(CRUDBase[FoodItem, FoodItemCreate, FoodItemUpdate]):
     def get_by_barcode(self, db: Session, *, barcode: str, owner_id: UUID) -> Optional[FoodItem]:
-        return db.query(FoodItem).filter(FoodItem.barcode == barcode, FoodItem.owner_id == owner_id).first()
-
-    def get_by_category(self, db: Session, *, category: str, owner_id: UUID, skip: int = 0, limit: int = 100) -> List[FoodItem]:
-        return db.query(FoodItem).filter(FoodItem.category == category, FoodItem.owner_id == owner_id).offset(skip).limit(limit).all()
-
-    def get_expiring_soon(self, db: Session, *, days: int = 7, owner_id: UUID, skip: int = 0, limit: int = 100) -> List[FoodItem]:
-        from datetime import datetime, timedelta
-        expiry_date = datetime.now().date() + timedelta(days=days)
-        return (
-            db.query(FoodItem)
-            .filter(FoodItem.expiration_date <= expiry_date)
-            .filter(FoodItem.expiration_date >= datetime.now().date())
-            .filter(FoodItem.owner_id == owner_id)
-            .offset(skip)
-            .limit(limit)
-            .all()
-        )
-    
+        return db.scalar(_by_barcode(barcode, owner_id))
+
+    def get_by_category(
+        self,
+        db: Session,
+        *,
+        category: str,
+        owner_id: UUID,
+        skip: int = 0,
+        limit: int = 100,
+        after: Optional[Tuple[datetime, UUID]] = None,
+    ) -> List[FoodItem]:
+        return db.scalars(_by_category(category, owner_id, skip, limit, after)).all()
+
+    def get_expiring_soon(
+        self,
+        db: Session,
+        *,
+        days: int = 7,
+        owner_id: UUID,
+        skip: int = 0,
+        limit: int = 100,
+        after: Optional[Tuple[date, UUID]] = None,
+    ) -> List[FoodItem]:
+        """
+        The owner's items expiring within `days`, soonest first, read from
+        the precomputed expiration alerts when they cover the window (see
+        _expiring_soon).
+        """
+        return db.scalars(_expiring_soon(days, owner_id, skip, limit, after)).all()
+
+    def search(self, db: Session, *, q: str, owner_id: UUID, limit: int = 20) -> List[FoodItem]:
+        """
+        Search an owner's items by name and category (see _search). The
+        query runs with FOOD_ITEM_SEARCH_TIMEOUT_MS as statement_timeout, so
+        a pathological query fails with a DBAPIError instead of running on.
+        """
+        db.execute(_SEARCH_LIMITS, _search_limits())
+        return db.scalars(_search(q, owner_id, limit)).all()
+
+    def get_version(self, db: Session, *, owner_id: UUID) -> int:
+        """
+        The owner's change counter, which grows with every write to their items.
+        """
+        version = db.execute(_version(owner_id)).first()
+        return version[0] if version else 0
+
+    def get_changes(
+        self,
+        db: Session,
+        *,
+        owner_id: UUID,
+        since: Optional[Tuple[int, Optional[UUID], int]] = None,
+        limit: int = 500,
+    ) -> Dict[str, Any]:
+        """
+        Up to `limit` of the owner's changes after the (version, id, needed
+        version) cursor `since`, oldest first, or all of their items when
+        `since` is None.
+        Reads one REPEATABLE READ snapshot, so that no change can slip
+        between the queries. Returns upserts, deleted ids, the next cursor,
+        has_more and the version up to which tombstones were pruned.
+        """
+        db.connection(execution_options={"isolation_level": "REPEATABLE READ"})
+        version = db.execute(_version(owner_id)).first()
+        upserts = db.scalars(_upserted_since(owner_id, since, limit)).all()
+        deletes = db.execute(_deleted_since(owner_id, since, limit)).all() if since is not None else []
+        return _changes(version, since, upserts, deletes, limit)
+
+    def get_summary(self, db: Session, *, owner_id: UUID, days: int = 7, recent: int = 5) -> Dict[str, Any]:
+        """
+        Inventory overview of one owner from the trigger-maintained
+        FoodItemStats rows (see _stats), so its cost grows with the owner's
+        distinct categories and expiration dates rather than with the
+        number of items, plus the `recent` most recently added items.
+        """
+        stats = db.execute(_stats(owner_id, days)).all()
+        return _summarize(stats, db.scalars(_recently_added(owner_id, recent)).all())
+
     def get_multi_by_owner(
-        self, db: Session, *, owner_id: UUID, skip: int = 0, limit: int = 100
-    ) -> List[FoodItem]:
-        return (
-            db.query(self.model)
-            .filter(FoodItem.owner_id == owner_id)
-            .offset(skip)
-            .limit(limit)
-            .all()
-        )
-    
+        self,
+        db: Session,
+        *,
+        owner_id: UUID,
+        skip: int = 0,
+        limit: int = 100,
+        after: Optional[Tuple[datetime, UUID]] = None,
+    ) -> List[FoodItem]:
+        return db.scalars(_by_owner(owner_id, skip, limit, after)).all()
+
     def create_with_owner(
         self, db: Session, *, obj_in: FoodItemCreate, owner_id: UUID
     ) -> FoodItem:
-        obj_in_data = obj_in.dict()
-        db_obj = self.model(**obj_in_data, owner_id=owner_id)
-        db.add(db_obj)
+        db_obj = db.scalar(
+            insert(FoodItem).values(**obj_in.dict(), owner_id=owner_id).returning(FoodItem)
+        )
+        db.commit()
+        change_feed.publish(str(owner_id), _change_event(upserts=[db_obj]))
+        return db_obj
+
+    def update_by_owner(
+        self,
+        db: Session,
+        *,
+        id: UUID,
+        owner_id: UUID,
+        obj_in: Union[FoodItemUpdate, Dict[str, Any]],
+    ) -> Optional[FoodItem]:
+        """
+        Update one of the owner's items with a single
+        UPDATE ... WHERE id AND owner_id RETURNING. Returns None when the item
+        does not exist or belongs to someone else.
+        """
+        db_obj = db.scalar(_update_by_owner(id, owner_id, update_data(obj_in)))
         db.commit()
-        db.refresh(db_obj)
+        if db_obj is not None:
+            change_feed.publish(str(owner_id), _change_event(upserts=[db_obj]))
         return db_obj
 
+    def remove_by_owner(self, db: Session, *, id: UUID, owner_id: UUID) -> Optional[FoodItem]:
+        """
+        Delete one of the owner's items with a single DELETE ... RETURNING.
+        Returns None when the item does not exist or belongs to someone else.
+        """
+        db_obj = db.scalar(_remove_by_owner(id, owner_id))
+        db.commit()
+        if db_obj is not None:
+            change_feed.publish(str(owner_id), _change_event(deletes=[db_obj]))
+        return db_obj
+
+    def create_multi_with_owner(
+        self, db: Session, *, objs_in: List[FoodItemCreate], owner_id: UUID
+    ) -> List[FoodItem]:
+        """
+        Insert many items in one transaction with a single multi-row
+        INSERT ... RETURNING.
+        """
+        if not objs_in:
+            return []
+        rows = [{**obj_in.dict(), "owner_id": owner_id} for obj_in in objs_in]
+        db_objs = db.scalars(insert(FoodItem).returning(FoodItem), rows).all()
+        db.commit()
+        change_feed.publish(str(owner_id), _change_event(upserts=db_objs))
+        return db_objs
+
+    def update_multi_with_owner(
+        self, db: Session, *, objs_in: List[FoodItemBulkUpdateItem], owner_id: UUID
+    ) -> List[FoodItem]:
+        """
+        Update many of the owner's items in one transaction with
+        UPDATE ... FROM (VALUES ...) RETURNING, one statement per distinct set
+        of updated fields. Ids that do not exist or belong to someone else are
+        left out of the result.
+        """
+        db_objs: List[FoodItem] = []
+        for stmt in _update_multi(objs_in, owner_id):
+            db_objs.extend(db.scalars(stmt).all())
+        db.commit()
+        if db_objs:
+            change_feed.publish(str(owner_id), _change_event(upserts=db_objs))
+        return db_objs
+
+    def remove_multi_by_owner(
+        self, db: Session, *, ids: List[UUID], owner_id: UUID
+    ) -> List[FoodItem]:
+        """
+        Delete many of the owner's items with one DELETE ... RETURNING. Ids
+        that do not exist or belong to someone else are left out of the result.
+        """
+        db_objs = db.scalars(_remove_multi(ids, owner_id)).all()
+        db.commit()
+        if db_objs:
+            change_feed.publish(str(owner_id), _change_event(deletes=db_objs))
+        return db_objs
+
+
+class AsyncCRUDFoodItem(AsyncCRUDBase[FoodItem, FoodItemCreate, FoodItemUpdate]):
+    """
+    CRUDFoodItem for an AsyncSession; see there for the semantics of each method.
+    """
+
+    async def get_by_barcode(self, db: AsyncSession, *, barcode: str, owner_id: UUID) -> Optional[FoodItem]:
+        return await db.scalar(_by_barcode(barcode, owner_id))
+
+    async def get_by_category(
+        self,
+        db: AsyncSession,
+        *,
+        category: str,
+        owner_id: UUID,
+        skip: int = 0,
+        limit: int = 100,
+        after: Optional[Tuple[datetime, UUID]] = None,
+    ) -> List[FoodItem]:
+        return (await db.scalars(_by_category(category, owner_id, skip, limit, after))).all()
+
+    async def get_expiring_soon(
+        self,
+        db: AsyncSession,
+        *,
+        days: int = 7,
+        owner_id: UUID,
+        skip: int = 0,
+        limit: int = 100,
+        after: Optional[Tuple[date, UUID]] = None,
+    ) -> List[FoodItem]:
+        return (await db.scalars(_expiring_soon(days, owner_id, skip, limit, after))).all()
+
+    async def search(self, db: AsyncSession, *, q: str, owner_id: UUID, limit: int = 20) -> List[FoodItem]:
+        await db.execute(_SEARCH_LIMITS, _search_limits())
+        return (await db.scalars(_search(q, owner_id, limit))).all()
+
+    async def get_version(self, db: AsyncSession, *, owner_id: UUID) -> int:
+        version = (await db.execute(_version(owner_id))).first()
+        return version[0] if version else 0
+
+    async def get_changes(
+        self,
+        db: AsyncSession,
+        *,
+        owner_id: UUID,
+        since: Optional[Tuple[int, Optional[UUID], int]] = None,
+        limit: int = 500,
+    ) -> Dict[str, Any]:
+        await db.connection(execution_options={"isolation_level": "REPEATABLE READ"})
+        version = (await db.execute(_version(owner_id))).first()
+        upserts = (await db.scalars(_upserted_since(owner_id, since, limit))).all()
+        deletes = (await db.execute(_deleted_since(owner_id, since, limit))).all() if since is not None else []
+        return _changes(version, since, upserts, deletes, limit)
+
+    async def get_summary(
+        self, db: AsyncSession, *, owner_id: UUID, days: int = 7, recent: int = 5
+    ) -> Dict[str, Any]:
+        stats = (await db.execute(_stats(owner_id, days))).all()
+        return _summarize(stats, (await db.scalars(_recently_added(owner_id, recent))).all())
+
+    async def get_multi_by_owner(
+        self,
+        db: AsyncSession,
+        *,
+        owner_id: UUID,
+        skip: int = 0,
+        limit: int = 100,
+        after: Optional[Tuple[datetime, UUID]] = None,
+    ) -> List[FoodItem]:
+        return (await db.scalars(_by_owner(owner_id, skip, limit, after))).all()
+
+    async def create_with_owner(
+        self, db: AsyncSession, *, obj_in: FoodItemCreate, owner_id: UUID
+    ) -> FoodItem:
+        db_obj = await db.scalar(
+            insert(FoodItem).values(**obj_in.dict(), owner_id=owner_id).returning(FoodItem)
+        )
+        await db.commit()
+        await change_feed.async_publish(str(owner_id), _change_event(upserts=[db_obj]))
+        return db_obj
+
+    async def update_by_owner(
+        self,
+        db: AsyncSession,
+        *,
+        id: UUID,
+        owner_id: UUID,
+        obj_in: Union[FoodItemUpdate, Dict[str, Any]],
+    ) -> Optional[FoodItem]:
+        db_obj = await db.scalar(_update_by_owner(id, owner_id, update_data(obj_in)))
+        await db.commit()
+        if db_obj is not None:
+            await change_feed.async_publish(str(owner_id), _change_event(upserts=[db_obj]))
+        return db_obj
+
+    async def remove_by_owner(self, db: AsyncSession, *, id: UUID, owner_id: UUID) -> Optional[FoodItem]:
+        db_obj = await db.scalar(_remove_by_owner(id, owner_id))
+        await db.commit()
+        if db_obj is not None:
+            await change_feed.async_publish(str(owner_id), _change_event(deletes=[db_obj]))
+        return db_obj
+
+    async def create_multi_with_owner(
+        self, db: AsyncSession, *, objs_in: List[FoodItemCreate], owner_id: UUID
+    ) -> List[FoodItem]:
+        if not objs_in:
+            return []
+        rows = [{**obj_in.dict(), "owner_id": owner_id} for obj_in in objs_in]
+        db_objs = (await db.scalars(insert(FoodItem).returning(FoodItem), rows)).all()
+        await db.commit()
+        await change_feed.async_publish(str(owner_id), _change_event(upserts=db_objs))
+        return db_objs
+
+    async def update_multi_with_owner(
+        self, db: AsyncSession, *, objs_in: List[FoodItemBulkUpdateItem], owner_id: UUID
+    ) -> List[FoodItem]:
+        db_objs: List[FoodItem] = []
+        for stmt in _update_multi(objs_in, owner_id):
+            db_objs.extend((await db.scalars(stmt)).all())
+        await db.commit()
+        if db_objs:
+            await change_feed.async_publish(str(owner_id), _change_event(upserts=db_objs))
+        return db_objs
+
+    async def remove_multi_by_owner(
+        self, db: AsyncSession, *, ids: List[UUID], owner_id: UUID
+    ) -> List[FoodItem]:
+        db_objs = (await db.scalars(_remove_multi(ids, owner_id))).all()
+        await db.commit()
+        if db_objs:
+            await change_feed.async_publish(str(owner_id), _change_event(deletes=db_objs))
+        return db_objs
+
 
-food_item = CRUDFoodItem(FoodItem)
\ No newline at end of file
+food_item = CRUDFoodItem(FoodItem)
+async_food_item = AsyncCRUDFoodItem(FoodItem)
@@ -0,0 +1,19 @@
+from typing import Dict, List, Optional
+
+from sqlalchemy.orm import Session
+
+from app.models.product import Product
+
+
+class CRUDProduct:
+    def get_by_barcode(self, db: Session, *, barcode: str) -> Optional[Product]:
+        return db.query(Product).filter(Product.barcode == barcode).first()
+
+    def get_multi_by_barcodes(self, db: Session, *, barcodes: List[str]) -> Dict[str, Product]:
+        if not barcodes:
+            return {}
+        products = db.query(Product).filter(Product.barcode.in_(barcodes)).all()
+        return {product.barcode: product for product in products}
+
+
+product = CRUDProduct()
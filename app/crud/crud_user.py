@@ -1,42 +1,92 @@
-from typing import Any, Dict, Optional, Union
-from uuid import UUID
+from typing import Any, Dict, List, Optional, Tuple, Union
 
+from fastapi.concurrency import run_in_threadpool
+from sqlalchemy import Delete, Insert, delete, insert, select
+from sqlalchemy.ext.asyncio import AsyncSession
 from sqlalchemy.orm import Session
 
+from app.core.principal import principal_cache
+from app.core.revocation import revocation_store
 from app.core.security import get_password_hash, verify_password
-from app.crud.base import CRUDBase
+from app.crud.base import AsyncCRUDBase, CRUDBase, update_data
+from app.models.food_item import FoodItem
+from app.models.food_item_stats import FoodItemStats
+from app.models.food_item_sync import FoodItemTombstone, FoodItemVersion
 from app.models.user import User
 from app.schemas.user import UserCreate, UserUpdate
 
 
-class CRUDUser(CRUDBase[User, UserCreate, UserUpdate]):
-    def get_by_email(self, db: Session, *, email: str) -> Optional[User]:
-        return db.query(User).filter(User.email == email).first()
-
-    def create(self, db: Session, *, obj_in: UserCreate) -> User:
-        db_obj = User(
+def _insert(obj_in: UserCreate, hashed_password: Optional[str]) -> Insert:
+    return (
+        insert(User)
+        .values(
             email=obj_in.email,
-            hashed_password=get_password_hash(obj_in.password),
+            hashed_password=hashed_password or get_password_hash(obj_in.password),
             full_name=obj_in.full_name,
             is_superuser=obj_in.is_superuser,
         )
-        db.add(db_obj)
+        .returning(User)
+    )
+
+
+def _delete_owned(id: Any) -> List[Delete]:
+    """
+    Statements deleting everything that belongs to a user, to run before
+    the user row itself. remove() deletes with a plain DELETE, which skips
+    the ORM cascade on User.food_items. Items go first, because their
+    delete triggers write the owner's stats, version and tombstones.
+    """
+    return [
+        delete(model).where(model.owner_id == id).execution_options(synchronize_session=False)
+        for model in (FoodItem, FoodItemStats, FoodItemTombstone, FoodItemVersion)
+    ]
+
+
+def _prepare_update(db_obj: User, obj_in: Union[UserUpdate, Dict[str, Any]]) -> Tuple[Dict[str, Any], bool]:
+    """
+    Update data with any plain password hashed, and whether it changes the
+    user's is_active or is_superuser flags.
+    """
+    data = dict(update_data(obj_in))
+    if data.get("password"):
+        data["hashed_password"] = get_password_hash(data.pop("password"))
+    flags_changed = any(
+        field in data and data[field] != getattr(db_obj, field)
+        for field in ("is_active", "is_superuser")
+    )
+    return data, flags_changed
+
+
+class CRUDUser(CRUDBase[User, UserCreate, UserUpdate]):
+    def get_by_email(self, db: Session, *, email: str) -> Optional[User]:
+        return db.query(User).filter(User.email == email).first()
+
+    def create(
+        self, db: Session, *, obj_in: UserCreate, hashed_password: Optional[str] = None
+    ) -> User:
+        db_obj = db.scalar(_insert(obj_in, hashed_password))
         db.commit()
-        db.refresh(db_obj)
         return db_obj
 
     def update(
         self, db: Session, *, db_obj: User, obj_in: Union[UserUpdate, Dict[str, Any]]
     ) -> User:
-        if isinstance(obj_in, dict):
-            update_data = obj_in
-        else:
-            update_data = obj_in.dict(exclude_unset=True)
-        if update_data.get("password"):
-            hashed_password = get_password_hash(update_data["password"])
-            del update_data["password"]
-            update_data["hashed_password"] = hashed_password
-        return super().update(db, db_obj=db_obj, obj_in=update_data)
+        data, flags_changed = _prepare_update(db_obj, obj_in)
+        user = super().update(db, db_obj=db_obj, obj_in=data)
+        principal_cache.invalidate(user.id)
+        if flags_changed:
+            # Outstanding tokens may carry the old flags (see JWT_EMBED_CLAIMS)
+            revocation_store.revoke_user(user.id)
+        return user
+
+    def remove(self, db: Session, *, id: Any) -> Optional[User]:
+        for statement in _delete_owned(id):
+            db.execute(statement)
+        user = super().remove(db, id=id)
+        if user is not None:
+            principal_cache.invalidate(user.id)
+            revocation_store.revoke_user(user.id)
+        return user
 
     def authenticate(self, db: Session, *, email: str, password: str) -> Optional[User]:
         user = self.get_by_email(db, email=email)
@@ -53,4 +103,47 @@ class CRUDUser(CRUDBase[User, UserCreate, UserUpdate]):
         return user.is_superuser
 
 
-user = CRUDUser(User)
\ No newline at end of file
+class AsyncCRUDUser(AsyncCRUDBase[User, UserCreate, UserUpdate]):
+    """
+    CRUDUser for an AsyncSession. Pass precomputed password hashes (see
+    security.hash_password); plain passwords are hashed inline.
+    """
+
+    async def get_by_email(self, db: AsyncSession, *, email: str) -> Optional[User]:
+        return await db.scalar(select(User).where(User.email == email).limit(1))
+
+    async def create(
+        self, db: AsyncSession, *, obj_in: UserCreate, hashed_password: Optional[str] = None
+    ) -> User:
+        db_obj = await db.scalar(_insert(obj_in, hashed_password))
+        await db.commit()
+        return db_obj
+
+    async def update(
+        self, db: AsyncSession, *, db_obj: User, obj_in: Union[UserUpdate, Dict[str, Any]]
+    ) -> User:
+        data, flags_changed = _prepare_update(db_obj, obj_in)
+        user = await super().update(db, db_obj=db_obj, obj_in=data)
+        principal_cache.invalidate(user.id)
+        if flags_changed:
+            await run_in_threadpool(revocation_store.revoke_user, user.id)
+        return user
+
+    async def remove(self, db: AsyncSession, *, id: Any) -> Optional[User]:
+        for statement in _delete_owned(id):
+            await db.execute(statement)
+        user = await super().remove(db, id=id)
+        if user is not None:
+            principal_cache.invalidate(user.id)
+            await run_in_threadpool(revocation_store.revoke_user, user.id)
+        return user
+
+    def is_active(self, user: User) -> bool:
+        return user.is_active
+
+    def is_superuser(self, user: User) -> bool:
+        return user.is_superuser
+
+
+user = CRUDUser(User)
+async_user = AsyncCRUDUser(User)
\ No newline at end of file
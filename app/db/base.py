@@ -2,3 +2,8 @@
 # imported by Alembic
 from app.db.base_class import Base  # noqa
 from app.models.food_item import FoodItem  # noqa
+from app.models.expiration_alert import ExpirationAlert, ExpirationAlertShard  # noqa
+from app.models.food_item_stats import FoodItemStats  # noqa
+from app.models.food_item_sync import FoodItemTombstone, FoodItemVersion  # noqa
+from app.models.barcode_cache import BarcodeCacheEntry  # noqa
+from app.models.product import Product, ProductImport  # noqa
@@ -0,0 +1,117 @@
+import time
+from typing import Any, Dict
+from uuid import uuid4
+
+from prometheus_client import Counter, Gauge, Histogram
+from sqlalchemy import event, exc
+from sqlalchemy.engine import Engine
+from sqlalchemy.pool import AsyncAdaptedQueuePool, QueuePool
+
+from app.core.config import settings
+
+CHECKOUT_WAIT = Histogram(
+    "db_pool_checkout_wait_seconds",
+    "Time spent waiting for a connection from the pool",
+    ["pool"],
+    buckets=(0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30),
+)
+CHECKOUT_TIMEOUTS = Counter(
+    "db_pool_checkout_timeouts_total",
+    "Checkouts that gave up after DB_POOL_TIMEOUT_SECONDS",
+    ["pool"],
+)
+CONNECTIONS = Gauge(
+    "db_pool_connections",
+    "Pooled database connections by state",
+    ["pool", "state"],
+)
+PINGS = Counter(
+    "db_pool_pings_total",
+    "Liveness checks of idle connections on checkout by result",
+    ["pool", "result"],
+)
+
+
+class _TimedCheckout:
+    """
+    Records how long each checkout waited for a free connection (or for a
+    new one to be opened), labelled with the pool's logging name.
+    """
+
+    def _do_get(self) -> Any:
+        started = time.perf_counter()
+        try:
+            return super()._do_get()
+        except exc.TimeoutError:
+            CHECKOUT_TIMEOUTS.labels(pool=self.logging_name).inc()
+            raise
+        finally:
+            CHECKOUT_WAIT.labels(pool=self.logging_name).observe(time.perf_counter() - started)
+
+
+class TimedQueuePool(_TimedCheckout, QueuePool):
+    pass
+
+
+class TimedAsyncQueuePool(_TimedCheckout, AsyncAdaptedQueuePool):
+    pass
+
+
+def engine_options(name: str, *, is_async: bool = False) -> Dict[str, Any]:
+    """
+    Keyword arguments for create_engine / create_async_engine from the
+    DB_POOL_* and DB_PGBOUNCER settings.
+    """
+    options: Dict[str, Any] = {
+        "poolclass": TimedAsyncQueuePool if is_async else TimedQueuePool,
+        "pool_logging_name": name,
+        "pool_size": settings.DB_POOL_SIZE,
+        "max_overflow": settings.DB_MAX_OVERFLOW,
+        "pool_timeout": settings.DB_POOL_TIMEOUT_SECONDS,
+        "pool_recycle": settings.DB_POOL_RECYCLE_SECONDS,
+        "pool_pre_ping": settings.DB_POOL_PRE_PING == "always",
+    }
+    if settings.DB_PGBOUNCER and is_async:
+        # PgBouncer in transaction mode hands each transaction a different
+        # server connection, so asyncpg must not cache prepared statements
+        # and the ones it does create need names that cannot collide
+        options["connect_args"] = {
+            "statement_cache_size": 0,
+            "prepared_statement_cache_size": 0,
+            "prepared_statement_name_func": _statement_name,
+        }
+    return options
+
+
+def _statement_name() -> str:
+    return f"__asyncpg_{uuid4()}__"
+
+
+def instrument_engine(engine: Engine, name: str) -> None:
+    """
+    Export the engine's in-use and idle connection counts and, with
+    DB_POOL_PRE_PING="idle", ping connections that sat idle for longer than
+    DB_POOL_PRE_PING_IDLE_SECONDS before handing them out.
+    """
+    CONNECTIONS.labels(pool=name, state="in_use").set_function(lambda: engine.pool.checkedout())
+    CONNECTIONS.labels(pool=name, state="idle").set_function(lambda: engine.pool.checkedin())
+
+    if settings.DB_POOL_PRE_PING != "idle":
+        return
+
+    @event.listens_for(engine, "checkin")
+    def _record_checkin(dbapi_connection: Any, connection_record: Any) -> None:
+        connection_record.info["checked_in_at"] = time.monotonic()
+
+    @event.listens_for(engine, "checkout")
+    def _ping_idle(dbapi_connection: Any, connection_record: Any, connection_proxy: Any) -> None:
+        checked_in_at = connection_record.info.pop("checked_in_at", None)
+        if checked_in_at is None or time.monotonic() - checked_in_at < settings.DB_POOL_PRE_PING_IDLE_SECONDS:
+            return
+        try:
+            engine.dialect.do_ping(dbapi_connection)
+        except Exception as e:
+            PINGS.labels(pool=name, result="failed").inc()
+            # The pool discards this connection and retries with a new one
+            raise exc.DisconnectionError() from e
+        PINGS.labels(pool=name, result="ok").inc()
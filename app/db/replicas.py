@@ -0,0 +1,167 @@
+import asyncio
+import itertools
+import logging
+from typing import List, Optional, Set
+
+import redis
+from prometheus_client import Counter, Gauge
+from sqlalchemy import event, text
+from sqlalchemy.ext.asyncio import AsyncEngine, create_async_engine
+from sqlalchemy.orm import Session
+
+from app.core.cache import MISSING, LRUCache
+from app.core.config import settings
+from app.core.redis import get_async_redis, get_redis
+from app.db.pool import engine_options, instrument_engine
+from app.db.session import async_engine
+
+logger = logging.getLogger(__name__)
+
+REPLICA_HEALTHY = Gauge("db_replica_healthy", "Whether a read replica passed its last health check", ["replica"])
+READ_SESSIONS = Counter("db_read_sessions_total", "Read-only sessions by the database they went to", ["target"])
+
+
+class RecentWriters:
+    """
+    Users who committed a write within DB_READ_YOUR_WRITES_SECONDS, whose
+    reads must not go to a replica that may not have replayed it yet. With
+    REDIS_URL set the window is shared by every process.
+    """
+
+    def __init__(self):
+        self.entries = LRUCache(maxsize=100000, ttl=settings.DB_READ_YOUR_WRITES_SECONDS)
+        self._sharing: Set["asyncio.Task[None]"] = set()
+
+    def mark(self, user_id: str) -> None:
+        """
+        Record a write by the user. Called from a commit hook, so on the
+        event loop the shared marker is set by a task once the commit has
+        returned rather than by a blocking Redis call.
+        """
+        self.entries.set(user_id, True)
+        try:
+            loop: Optional[asyncio.AbstractEventLoop] = asyncio.get_running_loop()
+        except RuntimeError:
+            loop = None
+        if loop is not None:
+            if get_async_redis() is not None:
+                task = loop.create_task(self._share(user_id))
+                self._sharing.add(task)
+                task.add_done_callback(self._sharing.discard)
+            return
+        # Sync sessions run in worker threads or commands, off the event loop
+        client = get_redis()
+        if client is None:
+            return
+        try:
+            client.set(self._key(user_id), 1, px=self._ttl_ms())
+        except redis.RedisError:
+            logger.warning("Failed to share write marker of user %s", user_id, exc_info=True)
+
+    async def _share(self, user_id: str) -> None:
+        try:
+            await get_async_redis().set(self._key(user_id), 1, px=self._ttl_ms())
+        except redis.RedisError:
+            logger.warning("Failed to share write marker of user %s", user_id, exc_info=True)
+
+    def _key(self, user_id: str) -> str:
+        return f"db:wrote:{user_id}"
+
+    def _ttl_ms(self) -> int:
+        return int(settings.DB_READ_YOUR_WRITES_SECONDS * 1000)
+
+    async def wrote_recently(self, user_id: str) -> bool:
+        if self.entries.get(user_id) is not MISSING:
+            return True
+        client = get_async_redis()
+        if client is None:
+            return False
+        try:
+            return bool(await client.exists(self._key(user_id)))
+        except redis.RedisError:
+            # Without the shared marker, the primary is the safe choice
+            return True
+
+
+class ReplicaSet:
+    """
+    Async engines for the replicas in DB_REPLICA_URIS, handed out
+    round-robin among those that passed their last health check. Health is
+    checked every DB_REPLICA_HEALTH_CHECK_SECONDS once started.
+    """
+
+    def __init__(self, uris: List[str]):
+        self.engines: List[AsyncEngine] = []
+        for i, uri in enumerate(uris):
+            name = f"replica{i}"
+            engine = create_async_engine(uri, **engine_options(name, is_async=True))
+            instrument_engine(engine.sync_engine, name)
+            self.engines.append(engine)
+        self.healthy: List[AsyncEngine] = list(self.engines)
+        self.recent_writers = RecentWriters()
+        self._turn = itertools.count()
+        self._task: Optional["asyncio.Task[None]"] = None
+
+    async def route(self, user_id: str) -> AsyncEngine:
+        """
+        Engine for a read-only session of the given user: the next healthy
+        replica, or the primary when there is none or the user wrote recently.
+        """
+        healthy = self.healthy
+        if healthy and not await self.recent_writers.wrote_recently(user_id):
+            READ_SESSIONS.labels(target="replica").inc()
+            return healthy[next(self._turn) % len(healthy)]
+        READ_SESSIONS.labels(target="primary").inc()
+        return async_engine
+
+    async def start(self) -> None:
+        if self.engines:
+            await self.check()
+            self._task = asyncio.create_task(self._watch())
+
+    async def stop(self) -> None:
+        if self._task is not None:
+            self._task.cancel()
+            await asyncio.gather(self._task, return_exceptions=True)
+            self._task = None
+        for engine in self.engines:
+            await engine.dispose()
+
+    async def check(self) -> None:
+        results = await asyncio.gather(*(self._ping(engine) for engine in self.engines))
+        self.healthy = [engine for engine, ok in zip(self.engines, results) if ok]
+        for i, ok in enumerate(results):
+            REPLICA_HEALTHY.labels(replica=f"replica{i}").set(int(ok))
+
+    async def _ping(self, engine: AsyncEngine) -> bool:
+        async def ping() -> None:
+            async with engine.connect() as connection:
+                await connection.execute(text("SELECT 1"))
+
+        try:
+            await asyncio.wait_for(ping(), settings.DB_REPLICA_HEALTH_CHECK_TIMEOUT_SECONDS)
+            return True
+        except Exception:
+            logger.warning("Read replica %s failed its health check", engine.url.host, exc_info=True)
+            return False
+
+    async def _watch(self) -> None:
+        while True:
+            await asyncio.sleep(settings.DB_REPLICA_HEALTH_CHECK_SECONDS)
+            try:
+                await self.check()
+            except asyncio.CancelledError:
+                raise
+            except Exception:
+                logger.exception("Read replica health check failed")
+
+
+replicas = ReplicaSet(settings.SQLALCHEMY_ASYNC_REPLICA_URIS)
+
+
+@event.listens_for(Session, "after_commit")
+def _mark_writer(session: Session) -> None:
+    # Sessions from deps.get_write_db carry the id of the user they write for
+    user_id = session.info.get("user_id")
+    if user_id is not None and replicas.engines:
+        replicas.recent_writers.mark(user_id)
@@ -1,11 +1,23 @@
 from sqlalchemy import create_engine
+from sqlalchemy.ext.asyncio import async_sessionmaker, create_async_engine
 from sqlalchemy.ext.declarative import declarative_base
 from sqlalchemy.orm import sessionmaker
 
 from app.core.config import settings
+from app.db.pool import engine_options, instrument_engine
 
-engine = create_engine(settings.SQLALCHEMY_DATABASE_URI, pool_pre_ping=True)
-SessionLocal = sessionmaker(autocommit=False, autoflush=False, bind=engine)
+# Sync engine for Alembic, command-line tools and code running in threads
+engine = create_engine(str(settings.SQLALCHEMY_DATABASE_URI), **engine_options("sync"))
+instrument_engine(engine, "sync")
+# Objects stay loaded after commit; CRUD writes return fresh rows via RETURNING
+SessionLocal = sessionmaker(autocommit=False, autoflush=False, expire_on_commit=False, bind=engine)
+
+# Async engine used by the API endpoints
+async_engine = create_async_engine(
+    settings.SQLALCHEMY_ASYNC_DATABASE_URI, **engine_options("async", is_async=True)
+)
+instrument_engine(async_engine.sync_engine, "async")
+AsyncSessionLocal = async_sessionmaker(async_engine, autoflush=False, expire_on_commit=False)
 
 
 def get_db():
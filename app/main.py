@@ -1,25 +1,70 @@
+from contextlib import asynccontextmanager
+
 from fastapi import FastAPI, Depends
 from fastapi.middleware.cors import CORSMiddleware
+from prometheus_client import make_asgi_app
 from app.api.api_v1.api import api_router
+from app.core.change_feed import change_feed
 from app.core.config import settings
+from app.core.expiration_alerts import expiration_alerts
+from app.core.http import close_http_client, init_http_client
+from app.core.middleware import BodySizeLimitMiddleware
+from app.core.redis import close_redis
+from app.core.revocation import revocation_store
+from app.core.vision import analysis_jobs, close_openai_client
+from app.db.replicas import replicas
+
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    await init_http_client()
+    await analysis_jobs.start()
+    await revocation_store.start()
+    await replicas.start()
+    await change_feed.start()
+    await expiration_alerts.start()
+    yield
+    await expiration_alerts.stop()
+    await change_feed.stop()
+    await replicas.stop()
+    await revocation_store.stop()
+    await analysis_jobs.stop()
+    await close_http_client()
+    await close_redis()
+    await close_openai_client()
+
 
 app = FastAPI(
     title=settings.PROJECT_NAME,
     openapi_url=f"{settings.API_V1_STR}/openapi.json",
-    version="0.1.0"
+    version="0.1.0",
+    lifespan=lifespan,
+)
+
+# Reject oversized image uploads before they are parsed. Added before
+# CORSMiddleware, which wraps it, so that browsers can read its 413s
+app.add_middleware(
+    BodySizeLimitMiddleware,
+    max_bytes=settings.IMAGE_MAX_UPLOAD_BYTES,
+    path_prefix=f"{settings.API_V1_STR}/image-analysis",
 )
 
 # Set all CORS enabled origins
 app.add_middleware(
     CORSMiddleware,
-    allow_origins=[str(origin) for origin in settings.BACKEND_CORS_ORIGINS],
+    # AnyHttpUrl adds a trailing slash that Origin headers never have
+    allow_origins=[str(origin).rstrip("/") for origin in settings.BACKEND_CORS_ORIGINS],
     allow_credentials=True,
     allow_methods=["*"],
     allow_headers=["*"],
+    expose_headers=["X-Next-Cursor", "ETag"],
 )
 
 app.include_router(api_router, prefix=settings.API_V1_STR)
 
+# Prometheus metrics (cache hit rates, upstream calls, ...)
+app.mount("/metrics", make_asgi_app())
+
 @app.get("/")
 def root():
     return {"message": "Welcome to MetaPantry AR API"}
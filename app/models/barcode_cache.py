@@ -0,0 +1,10 @@
+from sqlalchemy import Column, String, DateTime
+from sqlalchemy.dialects.postgresql import JSONB
+
+from app.db.base_class import Base
+
+
+class BarcodeCacheEntry(Base):
+    barcode = Column(String, primary_key=True)
+    item = Column(JSONB, nullable=True)  # NULL caches "product not found"
+    expires_at = Column(DateTime, nullable=False, index=True)
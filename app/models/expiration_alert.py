@@ -0,0 +1,51 @@
+from sqlalchemy import Column, Date, DateTime, ForeignKey, Index, Integer, String, text
+from sqlalchemy.dialects.postgresql import UUID
+
+from app.db.base_class import Base
+
+# Two-int advisory lock class of a shard, with the shard id as the second
+# key. The fooditem trigger (migration 010) holds it shared while it reads
+# the shard's covered_until; the scheduler takes it exclusively to move it.
+SHARD_LOCK = 10010
+
+
+class ExpirationAlert(Base):
+    """
+    An item expiring on or before the covered_until of its owner's shard.
+    Rows are added by the expiration alert scheduler as the window moves on
+    and kept current by a trigger on fooditem in between; notified_at is
+    reset when the expiration date changes.
+    """
+    food_item_id = Column(
+        UUID(as_uuid=True), ForeignKey("fooditem.id", ondelete="CASCADE"), primary_key=True
+    )
+    owner_id = Column(UUID(as_uuid=True), nullable=False)
+    expiration_date = Column(Date, nullable=False)
+    notified_at = Column(DateTime, nullable=True)
+
+    __table_args__ = (
+        Index("ix_expirationalert_owner_id_expiration_date", "owner_id", "expiration_date", "food_item_id"),
+        Index(
+            "ix_expirationalert_pending",
+            "owner_id",
+            "expiration_date",
+            postgresql_where=text("notified_at IS NULL"),
+        ),
+    )
+
+
+class ExpirationAlertShard(Base):
+    """
+    The owners with ids in [lo, hi], processed by one scheduler worker at a
+    time: the one whose claim has not expired. Alert rows exist for every
+    item expiring up to scanned_until; the trigger already adds them up to
+    covered_until while the scan catches up.
+    """
+    id = Column(Integer, primary_key=True)
+    lo = Column(UUID(as_uuid=True), nullable=False)
+    hi = Column(UUID(as_uuid=True), nullable=False)
+    covered_until = Column(Date, nullable=True)
+    scanned_until = Column(Date, nullable=True)
+    last_run_at = Column(DateTime, nullable=True)
+    claimed_by = Column(String, nullable=True)
+    claimed_until = Column(DateTime, nullable=True)
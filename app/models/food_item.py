@@ -1,4 +1,4 @@
-from sqlalchemy import Column, String, Integer, Date, DateTime, func, ForeignKey
+from sqlalchemy import BigInteger, Column, String, Integer, Date, DateTime, func, ForeignKey, Index, text
 from sqlalchemy.dialects.postgresql import UUID
 from sqlalchemy.orm import relationship
 import uuid
@@ -6,6 +6,12 @@ import uuid
 from app.db.base_class import Base
 
 
+# Text matched by GET /food-items/search. Queries must spell these exactly
+# like the search indexes (migration 008) for the planner to use them.
+SEARCH_DOCUMENT = "(name || ' ' || coalesce(category, ''))"
+SEARCH_VECTOR = f"to_tsvector('english'::regconfig, {SEARCH_DOCUMENT})"
+
+
 class FoodItem(Base):
     id = Column(UUID(as_uuid=True), primary_key=True, default=uuid.uuid4)
     name = Column(String, nullable=False, index=True)
@@ -16,7 +22,47 @@ class FoodItem(Base):
     image_url = Column(String, nullable=True)
     source = Column(String, nullable=False)  # barcode|vision|manual
     added_at = Column(DateTime, default=func.now())
+    # Both maintained by a trigger (migration 009): updated_at on every
+    # update, change_id from the owner's FoodItemVersion on every write
+    updated_at = Column(DateTime, default=func.now())
+    change_id = Column(BigInteger, nullable=False, server_default="0")
     
     # User relationship
     owner_id = Column(UUID(as_uuid=True), ForeignKey("user.id"))
-    owner = relationship("User", back_populates="food_items")
\ No newline at end of file
+    owner = relationship("User", back_populates="food_items")
+
+    # Every listing is scoped to one owner, so lead with owner_id and follow
+    # with the keyset sort columns (ORDER_BY_* in app.crud.crud_food_item)
+    __table_args__ = (
+        Index("ix_fooditem_owner_id_added_at", "owner_id", "added_at", "id"),
+        Index("ix_fooditem_owner_id_category", "owner_id", "category", "added_at", "id"),
+        Index("ix_fooditem_owner_id_barcode", "owner_id", "barcode"),
+        Index("ix_fooditem_owner_id_change_id", "owner_id", "change_id"),
+        Index(
+            "ix_fooditem_owner_id_expiration_date",
+            "owner_id",
+            "expiration_date",
+            "id",
+            postgresql_where=text("expiration_date IS NOT NULL"),
+        ),
+        # Days newly covered by the expiration alert scheduler, across owners
+        Index(
+            "ix_fooditem_expiration_date_id",
+            "expiration_date",
+            "id",
+            postgresql_where=text("expiration_date IS NOT NULL"),
+        ),
+        # GIN, with owner_id through btree_gin
+        Index(
+            "ix_fooditem_owner_id_search_trgm",
+            "owner_id",
+            text(f"{SEARCH_DOCUMENT} gin_trgm_ops"),
+            postgresql_using="gin",
+        ),
+        Index(
+            "ix_fooditem_owner_id_search_tsv",
+            "owner_id",
+            text(f"({SEARCH_VECTOR})"),
+            postgresql_using="gin",
+        ),
+    )
@@ -0,0 +1,18 @@
+from sqlalchemy import BigInteger, Column, Date, ForeignKey, Integer, String
+from sqlalchemy.dialects.postgresql import UUID
+
+from app.db.base_class import Base
+
+
+class FoodItemStats(Base):
+    """
+    Number and total quantity of each owner's food items per category and
+    expiration date. Maintained by triggers on fooditem (see migration 007),
+    never written by the application. Items without a category or an
+    expiration date are counted under '' and 'infinity'.
+    """
+    owner_id = Column(UUID(as_uuid=True), ForeignKey("user.id"), primary_key=True)
+    category = Column(String, primary_key=True)
+    expiration_date = Column(Date, primary_key=True)
+    item_count = Column(Integer, nullable=False)
+    total_quantity = Column(BigInteger, nullable=False)
@@ -0,0 +1,33 @@
+from sqlalchemy import BigInteger, Column, DateTime, ForeignKey, Index
+from sqlalchemy.dialects.postgresql import UUID
+
+from app.db.base_class import Base
+
+# Both tables are written by triggers on fooditem (see migration 009), never
+# by the application
+
+
+class FoodItemVersion(Base):
+    """
+    Per-owner change counter. Every insert, update and delete of one of the
+    owner's items takes the next version; tombstones up to pruned_version
+    have been pruned.
+    """
+    owner_id = Column(UUID(as_uuid=True), ForeignKey("user.id"), primary_key=True)
+    version = Column(BigInteger, nullable=False, server_default="0")
+    pruned_version = Column(BigInteger, nullable=False, server_default="0")
+
+
+class FoodItemTombstone(Base):
+    """
+    A deleted food item, kept for FOOD_ITEM_TOMBSTONE_RETENTION_DAYS so that
+    syncing clients learn about the deletion.
+    """
+    id = Column(UUID(as_uuid=True), primary_key=True)
+    owner_id = Column(UUID(as_uuid=True), nullable=False)
+    change_id = Column(BigInteger, nullable=False)
+    deleted_at = Column(DateTime, nullable=False, index=True)
+
+    __table_args__ = (
+        Index("ix_fooditemtombstone_owner_id_change_id", "owner_id", "change_id"),
+    )
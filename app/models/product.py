@@ -0,0 +1,25 @@
+from sqlalchemy import Column, String, BigInteger, Boolean, DateTime, func
+
+from app.db.base_class import Base
+
+
+class Product(Base):
+    """
+    Local copy of the Open Food Facts catalog, loaded by app.commands.import_products.
+    """
+    barcode = Column(String, primary_key=True)
+    name = Column(String, nullable=True)
+    category = Column(String, nullable=True)
+    image_url = Column(String, nullable=True)
+    last_modified = Column(BigInteger, nullable=True)  # Open Food Facts last_modified_t
+
+
+class ProductImport(Base):
+    """
+    Progress of a catalog import, one row per dump or delta file.
+    """
+    source = Column(String, primary_key=True)
+    records_done = Column(BigInteger, nullable=False, default=0)
+    rows_loaded = Column(BigInteger, nullable=False, default=0)
+    completed = Column(Boolean, nullable=False, default=False)
+    updated_at = Column(DateTime, default=func.now(), onupdate=func.now())
@@ -0,0 +1,20 @@
+from typing import Dict, List, Optional
+
+from pydantic import BaseModel, Field
+
+from app.schemas.food_item import FoodItemCreate
+
+
+class BarcodeBatchRequest(BaseModel):
+    barcodes: List[str] = Field(..., min_length=1)
+
+
+class BarcodeLookupResult(BaseModel):
+    barcode: str
+    status_code: int = 200
+    item: Optional[FoodItemCreate] = None
+    error: Optional[str] = None
+
+
+class BarcodeBatchResponse(BaseModel):
+    results: Dict[str, BarcodeLookupResult]
@@ -1,5 +1,5 @@
-from pydantic import BaseModel, Field
-from typing import Optional
+from pydantic import BaseModel, Field, field_validator
+from typing import Any, Dict, List, Optional
 from datetime import date, datetime
 import uuid
 
@@ -18,6 +18,18 @@ class FoodItemCreate(FoodItemBase):
     pass
 
 
+class BoundingBox(BaseModel):
+    # Fractions of the image width/height, from the top-left corner
+    x: float = Field(..., ge=0, le=1)
+    y: float = Field(..., ge=0, le=1)
+    width: float = Field(..., ge=0, le=1)
+    height: float = Field(..., ge=0, le=1)
+
+
+class DetectedFoodItem(FoodItemCreate):
+    bounding_box: Optional[BoundingBox] = None
+
+
 class FoodItemUpdate(BaseModel):
     name: Optional[str] = None
     barcode: Optional[str] = None
@@ -26,10 +38,81 @@ class FoodItemUpdate(BaseModel):
     expiration_date: Optional[date] = None
     image_url: Optional[str] = None
 
+    @field_validator("name", "quantity")
+    @classmethod
+    def not_null(cls, v: Any) -> Any:
+        # Only runs for fields that were given; an explicit null would be
+        # written as is into a NOT NULL column
+        if v is None:
+            raise ValueError("may not be null")
+        return v
+
 
 class FoodItem(FoodItemBase):
     id: uuid.UUID
     added_at: datetime
+    updated_at: Optional[datetime] = None
 
     class Config:
         from_attributes = True
+
+
+class FoodItemChanges(BaseModel):
+    upserts: List[FoodItem]  # created or updated since the cursor
+    deletes: List[uuid.UUID]  # ids of items deleted since the cursor
+    cursor: str  # `since` of the next request
+    has_more: bool  # another request with `cursor` returns more changes right away
+
+
+class FoodItemChangeEvent(BaseModel):
+    # Data of a `changes` event on GET /food-items/stream: one committed write
+    upserts: List[FoodItem]
+    deletes: List[uuid.UUID]
+
+
+class FoodItemCategoryCount(BaseModel):
+    category: Optional[str] = None
+    items: int
+    quantity: int
+
+
+class FoodItemSummary(BaseModel):
+    total_items: int
+    total_quantity: int
+    categories: List[FoodItemCategoryCount]  # most items first
+    expired: int
+    expiring_soon: int  # within `days` from today, as GET /food-items/expiring-soon/
+    no_expiration: int
+    recently_added: List[FoodItem]
+
+
+# Bulk endpoints take raw rows so that each one is validated on its own and
+# a bad row is reported instead of rejecting the whole request
+class FoodItemBulkCreate(BaseModel):
+    items: List[Dict[str, Any]] = Field(..., min_length=1, description="FoodItemCreate objects")
+
+
+class FoodItemBulkUpdateItem(FoodItemUpdate):
+    id: uuid.UUID
+
+
+class FoodItemBulkUpdate(BaseModel):
+    items: List[Dict[str, Any]] = Field(
+        ..., min_length=1, description="FoodItemUpdate objects with the id of the item to update"
+    )
+
+
+class FoodItemBulkDelete(BaseModel):
+    ids: List[uuid.UUID] = Field(..., min_length=1)
+
+
+class FoodItemBulkError(BaseModel):
+    index: int  # position of the row in the request
+    id: Optional[uuid.UUID] = None
+    status_code: int
+    detail: str
+
+
+class FoodItemBulkResult(BaseModel):
+    items: List[FoodItem]
+    errors: List[FoodItemBulkError] = []
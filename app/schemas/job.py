@@ -0,0 +1,23 @@
+from datetime import datetime
+from typing import Optional
+
+from pydantic import BaseModel
+
+from app.schemas.food_item import FoodItemCreate
+
+
+class ImageAnalysisResult(BaseModel):
+    item: FoodItemCreate
+    cached: bool = False
+
+
+class ImageAnalysisJob(BaseModel):
+    id: str
+    status: str  # queued|running|succeeded|failed
+    attempts: int = 0
+    callback_url: Optional[str] = None
+    created_at: datetime
+    started_at: Optional[datetime] = None
+    finished_at: Optional[datetime] = None
+    result: Optional[ImageAnalysisResult] = None
+    error: Optional[str] = None
@@ -1,5 +1,4 @@
 from typing import Optional
-from uuid import UUID
 
 from pydantic import BaseModel
 
@@ -7,7 +6,16 @@ from pydantic import BaseModel
 class Token(BaseModel):
     access_token: str
     token_type: str
+    refresh_token: Optional[str] = None
+    expires_in: Optional[int] = None  # access token lifetime, in seconds
 
 
 class TokenPayload(BaseModel):
-    sub: Optional[str] = None
\ No newline at end of file
+    sub: Optional[str] = None
+    jti: Optional[str] = None
+    type: Optional[str] = None  # "access" or "refresh"; absent on older tokens
+    iat: Optional[float] = None  # sub-second on newer tokens
+    exp: Optional[int] = None
+    # Only present when settings.JWT_EMBED_CLAIMS is enabled
+    active: Optional[bool] = None
+    superuser: Optional[bool] = None
\ No newline at end of file
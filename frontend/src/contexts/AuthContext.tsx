@@ -1,5 +1,6 @@
 import React, { createContext, useState, useContext, useEffect } from 'react';
 import axios from 'axios';
+import { authApi, clearTokens, setTokens } from '../services/api';
 
 interface User {
   id: string;
@@ -23,10 +24,11 @@ export const AuthProvider: React.FC<{ children: React.ReactNode }> = ({ children
   const [loading, setLoading] = useState(true);
   
   useEffect(() => {
-    // Check if user is already logged in
+    // Check if user is already logged in; an expired access token is
+    // renewed with the refresh token by the axios interceptor
     const token = localStorage.getItem('token');
     if (token) {
-      axios.defaults.headers.common['Authorization'] = `Bearer ${token}`;
+      setTokens(token);
       fetchUserData();
     } else {
       setLoading(false);
@@ -40,8 +42,7 @@ export const AuthProvider: React.FC<{ children: React.ReactNode }> = ({ children
       setLoading(false);
     } catch (error) {
       console.error('Error fetching user data:', error);
-      localStorage.removeItem('token');
-      delete axios.defaults.headers.common['Authorization'];
+      clearTokens();
       setLoading(false);
     }
   };
@@ -57,9 +58,8 @@ export const AuthProvider: React.FC<{ children: React.ReactNode }> = ({ children
         },
       });
       
-      const { access_token } = response.data;
-      localStorage.setItem('token', access_token);
-      axios.defaults.headers.common['Authorization'] = `Bearer ${access_token}`;
+      const { access_token, refresh_token } = response.data;
+      setTokens(access_token, refresh_token);
       
       await fetchUserData();
     } catch (error) {
@@ -85,9 +85,14 @@ export const AuthProvider: React.FC<{ children: React.ReactNode }> = ({ children
   };
   
   const logout = () => {
-    localStorage.removeItem('token');
-    delete axios.defaults.headers.common['Authorization'];
+    const token = localStorage.getItem('token');
+    const refreshToken = localStorage.getItem('refresh_token');
+    clearTokens();
     setUser(null);
+    // Revoke the tokens server-side too, without holding up the sign-out
+    if (token || refreshToken) {
+      authApi.logout(token, refreshToken).catch((error) => console.error('Logout error:', error));
+    }
   };
   
   return (
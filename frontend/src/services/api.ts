@@ -1,8 +1,48 @@
-import axios from 'axios';
+import axios, { AxiosError, InternalAxiosRequestConfig } from 'axios';
 import { FoodItem, FoodItemCreate } from '../types/foodItem';
 
 const API_URL = '/api/v1';
 
+// Tokens
+export const setTokens = (accessToken: string, refreshToken?: string) => {
+  localStorage.setItem('token', accessToken);
+  if (refreshToken) {
+    localStorage.setItem('refresh_token', refreshToken);
+  }
+  axios.defaults.headers.common['Authorization'] = `Bearer ${accessToken}`;
+};
+
+export const clearTokens = () => {
+  localStorage.removeItem('token');
+  localStorage.removeItem('refresh_token');
+  delete axios.defaults.headers.common['Authorization'];
+};
+
+// Access tokens are short-lived; requests that fail on an expired one are
+// retried once with a token from /auth/refresh. Refresh tokens are single
+// use, so concurrent failures share one refresh.
+let refreshing: Promise<string> | null = null;
+
+const refreshAccessToken = (): Promise<string> => {
+  if (!refreshing) {
+    const refreshToken = localStorage.getItem('refresh_token');
+    refreshing = (refreshToken
+      ? axios.post(`${API_URL}/auth/refresh`, { refresh_token: refreshToken }).then((response) => {
+          setTokens(response.data.access_token, response.data.refresh_token);
+          return response.data.access_token as string;
+        })
+      : Promise.reject(new Error('No refresh token'))
+    ).finally(() => {
+      refreshing = null;
+    });
+  }
+  return refreshing;
+};
+
+const isExpiredToken = (error: AxiosError<{ detail?: string }>) =>
+  error.response?.status === 401 ||
+  (error.response?.status === 403 && error.response.data?.detail === 'Could not validate credentials');
+
 // Configure axios
 axios.interceptors.request.use(
   (config) => {
@@ -15,6 +55,37 @@ axios.interceptors.request.use(
   (error) => Promise.reject(error)
 );
 
+axios.interceptors.response.use(
+  (response) => response,
+  async (error: AxiosError<{ detail?: string }>) => {
+    const config = error.config as (InternalAxiosRequestConfig & { _retried?: boolean }) | undefined;
+    if (config && !config._retried && !config.url?.includes('/auth/') && isExpiredToken(error)) {
+      config._retried = true;
+      try {
+        const token = await refreshAccessToken();
+        config.headers['Authorization'] = `Bearer ${token}`;
+        return axios(config);
+      } catch {
+        clearTokens();
+      }
+    }
+    return Promise.reject(error);
+  }
+);
+
+// Auth API
+export const authApi = {
+  // The refresh token authenticates the call on its own, so it is revoked
+  // even when the access token has already expired
+  logout: async (accessToken: string | null, refreshToken: string | null): Promise<void> => {
+    await axios.post(
+      `${API_URL}/auth/logout`,
+      { refresh_token: refreshToken },
+      { headers: accessToken ? { Authorization: `Bearer ${accessToken}` } : {} },
+    );
+  },
+};
+
 // Food Items API
 export const foodItemsApi = {
   getAll: async (skip = 0, limit = 100): Promise<FoodItem[]> => {